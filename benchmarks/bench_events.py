@@ -0,0 +1,74 @@
+"""
+    microbenchmark of api gateway event synthesis (request -> lambda event)
+        python benchmarks/bench_events.py [-n 20000]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from starlette.requests import Request
+
+from sapimo.mock.executer.invoke_info import ApiInfo, ApiV2Info
+
+HEADERS = [
+    (b"host", b"127.0.0.1:8000"),
+    (b"user-agent", b"python-httpx/0.23.0"),
+    (b"accept", b"application/json"),
+    (b"accept-encoding", b"gzip, deflate"),
+    (b"content-type", b"application/json"),
+    (b"x-forwarded-for", b"10.0.0.1"),
+    (b"cookie", b"session=abc; theme=dark"),
+    (b"authorization", b"Bearer dummy"),
+]
+BODY = json.dumps({"name": "sapimo", "items": list(range(10))}).encode()
+
+
+class Route:
+    path = "/items/{item_id}"
+
+
+def make_request() -> Request:
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST",
+        "scheme": "http", "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 50000), "root_path": "",
+        "path": "/items/42", "raw_path": b"/items/42",
+        "query_string": b"a=1&b=2&b=3", "headers": HEADERS,
+        "path_params": {"item_id": "42"}, "route": Route(),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": BODY, "more_body": False}
+    return Request(scope, receive)
+
+
+def api_info(cls, auth="NONE"):
+    return cls(Route.path, "post", {"Properties": {
+        "CodeUri": "app/", "Handler": "app.handler", "AuthType": auth}})
+
+
+async def measure(props, n: int) -> float:
+    """ events/s """
+    for _ in range(100):  # warm up
+        await props.to_event(make_request())
+    started = time.perf_counter()
+    for _ in range(n):
+        await props.to_event(make_request())
+    return n / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+    for name, props in [("v1", api_info(ApiInfo)),
+                        ("v1 (AWS_IAM)", api_info(ApiInfo, "AWS_IAM")),
+                        ("v2", api_info(ApiV2Info)),
+                        ("v2 (AWS_IAM)", api_info(ApiV2Info, "AWS_IAM"))]:
+        rate = asyncio.run(measure(props, args.n))
+        print(f"{name:<14} {rate:>10,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
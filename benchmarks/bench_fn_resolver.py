@@ -0,0 +1,125 @@
+"""
+    benchmark of template parsing (FnResolver) on a large synthetic template
+        python benchmarks/bench_fn_resolver.py [--resources 3000] [-n 3]
+
+    each function has environment variables with Ref, GetAtt, Sub,
+    Join, FindInMap and If, referring to buckets/tables/queues
+
+        pyyaml : awscli's yaml_parse (pure python loader)
+        load   : parse_template (libyaml loader if available)
+        cached : load_cached of unchanged template (pickle on disk)
+        resolve: SamParser without load (load_template returns parsed dict)
+"""
+import argparse
+import gc
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+from awscli.customizations.cloudformation.yamlhelper import yaml_parse
+
+from sapimo.parser import fn_resolver, loader
+from sapimo.parser.sam_parser import SamParser
+
+
+def create_template(path: Path, resources: int):
+    """ resources/4 each of bucket, table, queue and function """
+    groups = max(1, resources // 4)
+    res = {}
+    for i in range(groups):
+        res[f"Bucket{i}"] = {
+            "Type": "AWS::S3::Bucket",
+            "Properties": {"BucketName": {"Fn::Join": ["-", [
+                {"Ref": "AWS::StackName"}, "bucket", str(i)]]}}}
+        res[f"Table{i}"] = {
+            "Type": "AWS::DynamoDB::Table",
+            "Properties": {
+                "TableName": {"Fn::Sub": "${AWS::StackName}-table-" + str(i)},
+                "AttributeDefinitions": [
+                    {"AttributeName": "pk", "AttributeType": "S"}],
+                "KeySchema": [{"AttributeName": "pk", "KeyType": "HASH"}],
+                "BillingMode": "PAY_PER_REQUEST"}}
+        res[f"Queue{i}"] = {
+            "Type": "AWS::SQS::Queue",
+            "Properties": {"QueueName": f"queue-{i}"}}
+        res[f"Function{i}"] = {
+            "Type": "AWS::Serverless::Function",
+            "Properties": {
+                "CodeUri": "fn/", "Handler": "app.handler",
+                "Environment": {"Variables": {
+                    "BUCKET": {"Ref": f"Bucket{i}"},
+                    "TABLE": {"Ref": f"Table{i}"},
+                    "TABLE_ARN": {"Fn::GetAtt": [f"Table{i}", "Arn"]},
+                    "QUEUE": {"Fn::Sub": "${Queue%d.QueueUrl}" % i},
+                    "SIZE": {"Fn::FindInMap": ["Env", "dev", "Size"]},
+                    "MODE": {"Fn::If": ["IsDev", "debug", "release"]},
+                    # refers to other groups
+                    "PREV_TABLE": {"Ref": f"Table{(i - 1) % groups}"},
+                    "NEXT_BUCKET": {"Ref": f"Bucket{(i + 1) % groups}"},
+                }},
+                "Events": {"Get": {"Type": "Api", "Properties": {
+                    "Path": f"/r{i}/{{item_id}}", "Method": "get"}}}}}
+    template = {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Transform": "AWS::Serverless-2016-10-31",
+        "Mappings": {"Env": {"dev": {"Size": "small"}}},
+        "Conditions": {"IsDev": {"Fn::Equals": [
+            {"Ref": "AWS::Region"}, "us-east-1"]}},
+        "Globals": {"Function": {"Timeout": 10, "Runtime": "python3.11"}},
+        "Resources": res,
+    }
+    with open(path, "w") as f:
+        yaml.safe_dump(template, f, sort_keys=False)
+
+
+def timed(func) -> tuple[float, object]:
+    gc.collect()
+    started = time.perf_counter()
+    res = func()
+    return time.perf_counter() - started, res
+
+
+def measure(path: Path, n: int, cache_dir: Path) -> dict[str, list[float]]:
+    """ times of each step [s] """
+    text = path.read_text()
+    times = {"pyyaml": [], "load": [], "cached": [], "resolve": []}
+    load_template = fn_resolver.load_template
+    for _ in range(n):
+        times["pyyaml"].append(timed(lambda: yaml_parse(text))[0])
+        elapsed, parsed = timed(lambda: loader.parse_template(text))
+        times["load"].append(elapsed)
+
+        loader.load_cached(path, loader.parse_template, cache_dir)
+        loader._memory.clear()  # restored from file like the next run
+        times["cached"].append(timed(lambda: loader.load_cached(
+            path, loader.parse_template, cache_dir))[0])
+
+        fn_resolver.load_template = lambda _: parsed
+        try:
+            times["resolve"].append(timed(
+                lambda: SamParser(path)._get_config_dict())[0])
+        finally:
+            fn_resolver.load_template = load_template
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, nargs="+",
+                        default=[400, 2000, 8000])
+    parser.add_argument("-n", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for resources in args.resources:
+            path = Path(tmp) / f"template_{resources}.yaml"
+            create_template(path, resources)
+            times = measure(path, args.n, Path(tmp) / "cache")
+            print(f"resources={resources:<6}" + "".join(
+                f" {step} {statistics.median(values) * 1000:8.1f} ms"
+                for step, values in times.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+    compare two results of run.py
+        python benchmarks/compare.py BASELINE.json CURRENT.json
+"""
+import argparse
+import json
+
+# (key path, higher is better)
+METRICS = [
+    (("throughput_rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("total_s",), False),
+    (("start_s",), False),
+    (("no_change_ms", "p50"), False),
+    (("changed_ms",), False),
+]
+
+
+def _dig(d: dict, keys: tuple):
+    for key in keys:
+        if not isinstance(d, dict) or key not in d:
+            return None
+        d = d[key]
+    return d
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    """
+        rows of (size, scenario, metric, baseline, current, change, regressed)
+        change: relative change (+ is better)
+    """
+    rows = []
+    for size, scenarios in current["results"].items():
+        for scenario, result in scenarios.items():
+            base = _dig(baseline["results"], (size, scenario))
+            if base is None:
+                continue
+            for keys, higher_is_better in METRICS:
+                old = _dig(base, keys)
+                new = _dig(result, keys)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if not higher_is_better:
+                    change = -change
+                rows.append((size, scenario, ".".join(keys), old, new, change,
+                             change < -threshold))
+    return rows
+
+
+def print_rows(rows: list):
+    for size, scenario, metric, old, new, change, regressed in rows:
+        mark = "  <- regression" if regressed else ""
+        print(f"{size:<8} {scenario:<8} {metric:<16} {old:>12.3f}"
+              f" -> {new:>12.3f} {change:>+8.1%}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change regarded as regression")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    print(f"{baseline['meta'].get('commit')} -> "
+          f"{current['meta'].get('commit')}")
+    print_rows(rows)
+    if any(row[-1] for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
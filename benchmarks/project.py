@@ -0,0 +1,112 @@
+"""
+    sample SAM project for benchmarks
+        - 'routes' api routes (one lambda function each, same code)
+        - s3 fixture of 's3_bytes' bytes in total
+        - dynamodb table of 'dynamo_rows' items
+        - sqs queue of 'sqs_depth' messages
+"""
+import json
+import shutil
+from pathlib import Path
+
+import yaml
+
+SIZES = {
+    "small": {"routes": 5, "s3_bytes": 1024 * 1024, "dynamo_rows": 1000,
+              "sqs_depth": 100},
+    "medium": {"routes": 50, "s3_bytes": 16 * 1024 * 1024,
+               "dynamo_rows": 20000, "sqs_depth": 1000},
+    "large": {"routes": 200, "s3_bytes": 128 * 1024 * 1024,
+              "dynamo_rows": 100000, "sqs_depth": 5000},
+}
+
+BUCKET = "sapimo-bench-bucket"
+TABLE = "sapimo-bench-table"
+QUEUE = "BenchQueue"  # logical id (local dir name of sqs)
+
+HANDLER = '''import json
+import os
+
+
+def handler(event, context):
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"path": event["path"] if "path" in event
+                            else event["rawPath"],
+                            "query": event["queryStringParameters"],
+                            "table": os.environ.get("TABLE")})
+    }
+'''
+
+
+def route_path(i: int) -> str:
+    return f"/r{i}/{{item_id}}"
+
+
+def template(routes: int) -> dict:
+    resources = {
+        "BenchBucket": {"Type": "AWS::S3::Bucket",
+                        "Properties": {"BucketName": BUCKET}},
+        "BenchTable": {"Type": "AWS::DynamoDB::Table", "Properties": {
+            "TableName": TABLE,
+            "AttributeDefinitions": [
+                {"AttributeName": "pk", "AttributeType": "S"}],
+            "KeySchema": [{"AttributeName": "pk", "KeyType": "HASH"}],
+            "BillingMode": "PAY_PER_REQUEST"}},
+        QUEUE: {"Type": "AWS::SQS::Queue",
+                "Properties": {"QueueName": "sapimo-bench-queue"}},
+    }
+    for i in range(routes):
+        resources[f"Route{i}Function"] = {
+            "Type": "AWS::Serverless::Function",
+            "Properties": {
+                "CodeUri": "fn/",
+                "Handler": "app.handler",
+                "Runtime": "python3.9",
+                "Environment": {"Variables": {"BUCKET": BUCKET,
+                                              "TABLE": TABLE}},
+                # v1 and v2 alternately
+                "Events": {"Api": {
+                    "Type": "Api" if i % 2 == 0 else "HttpApi",
+                    "Properties": {"Path": route_path(i),
+                                   "Method": "get"}}}}}
+    return {"AWSTemplateFormatVersion": "2010-09-09",
+            "Transform": "AWS::Serverless-2016-10-31",
+            "Resources": resources}
+
+
+def create_project(root: Path, routes: int, s3_bytes: int,
+                   dynamo_rows: int, sqs_depth: int) -> Path:
+    """ create project dir (api_mock/config.yaml is not created) """
+    if root.exists():
+        shutil.rmtree(root)
+    (root / "fn").mkdir(parents=True)
+    (root / "fn" / "app.py").write_text(HANDLER)
+    with open(root / "template.yaml", "w") as f:
+        yaml.safe_dump(template(routes), f, sort_keys=False)
+
+    # s3 fixture (64 KiB files)
+    s3_path = root / "api_mock" / "s3" / BUCKET
+    s3_path.mkdir(parents=True)
+    chunk = 64 * 1024
+    for i in range(0, s3_bytes, chunk):
+        file = s3_path / f"dir{i // chunk % 16}" / f"obj{i // chunk}.bin"
+        file.parent.mkdir(exist_ok=True)
+        file.write_bytes(bytes([i // chunk % 256]) * min(chunk,
+                                                         s3_bytes - i))
+
+    # dynamodb items (one item per line)
+    table_path = root / "api_mock" / "dynamodb" / TABLE
+    table_path.mkdir(parents=True)
+    with open(table_path / "data.jsonl", "w") as f:
+        for i in range(dynamo_rows):
+            f.write(json.dumps({"pk": f"item{i}", "n": i,
+                                "name": f"name of item {i}"}) + "\n")
+
+    # sqs messages
+    queue_path = root / "api_mock" / "sqs" / QUEUE
+    queue_path.mkdir(parents=True)
+    for i in range(sqs_depth):
+        (queue_path / f"{str(i).zfill(8)}.txt").write_text(
+            json.dumps({"n": i}))
+    return root
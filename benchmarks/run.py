@@ -0,0 +1,169 @@
+"""
+    benchmark suite of the mock server
+    (each scenario runs in a subprocess against a generated SAM project)
+
+        python benchmarks/run.py --size small medium \
+            --output benchmarks/results/$(git rev-parse --short HEAD).json
+        python benchmarks/compare.py OLD.json NEW.json
+
+    scenarios
+        startup : import + on_start (seeding) without snapshot
+        snapshot: same as startup but restored from snapshot
+        mock / lambda / example: throughput and latency of each ReturnMode
+        sync    : MockManager.sync() without change and after changes
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from project import SIZES, create_project
+from compare import compare, print_rows
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+SCENARIOS = ["startup", "snapshot", "mock", "lambda", "example", "sync"]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def sapimo_env() -> dict:
+    env = dict(os.environ)
+    paths = [str(REPO_DIR / "src"), env.get("PYTHONPATH", "")]
+    env["PYTHONPATH"] = os.pathsep.join([p for p in paths if p])
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    return env
+
+
+def setup_project(root: Path, params: dict, settings: dict):
+    """ generate project and api_mock/config.yaml (by 'sapimo generate') """
+    create_project(root, **params)
+    subprocess.run([sys.executable, "-m", "sapimo", "generate"], cwd=root,
+                   env=sapimo_env(), check=True, capture_output=True)
+    if settings:
+        config_file = root / "api_mock" / "config.yaml"
+        with open(config_file) as f:
+            config = yaml.safe_load(f)
+        config.setdefault("settings", {}).update(settings)
+        with open(config_file, "w") as f:
+            yaml.safe_dump(config, f, sort_keys=False)
+
+
+def run_scenario(root: Path, scenario: str, args) -> dict:
+    snapshot = root / "api_mock" / "snapshot.pickle"
+    if scenario == "startup":
+        snapshot.unlink(missing_ok=True)
+    name = "startup" if scenario == "snapshot" else scenario
+    output = root / f"result_{scenario}.json"
+    command = [sys.executable, str(BENCH_DIR / "scenario.py"), name,
+               "--output", str(output), "--requests", str(args.requests),
+               "--concurrency", str(args.concurrency),
+               "--changes", str(args.changes)]
+    started = time.perf_counter()
+    with open(root / f"log_{scenario}.txt", "w") as log:
+        proc = subprocess.run(command, cwd=root, env=sapimo_env(),
+                              stdout=log, stderr=subprocess.STDOUT,
+                              timeout=args.timeout)
+    if proc.returncode != 0:
+        return {"error": f"exit code {proc.returncode}"
+                         f" (see {root / f'log_{scenario}.txt'})"}
+    with open(output) as f:
+        result = json.load(f)
+    result["wall_s"] = time.perf_counter() - started
+    return result
+
+
+def parse_settings(values: list[str]) -> dict:
+    settings = {}
+    for value in values:
+        key, _, raw = value.partition("=")
+        settings[key] = yaml.safe_load(raw)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", nargs="+", default=["small"],
+                        choices=[*SIZES.keys(), "custom"])
+    parser.add_argument("--scenario", nargs="+", default=SCENARIOS,
+                        choices=SCENARIOS)
+    # custom size (override of the size)
+    parser.add_argument("--routes", type=int)
+    parser.add_argument("--s3-bytes", type=int)
+    parser.add_argument("--dynamo-rows", type=int)
+    parser.add_argument("--sqs-depth", type=int)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--changes", type=int, default=100,
+                        help="s3 objects/dynamodb items/sqs messages"
+                             " written before sync")
+    parser.add_argument("--setting", action="append", default=[],
+                        help="config.yaml settings."
+                             " e.g. ExecutionMode=process")
+    parser.add_argument("--workdir", type=Path,
+                        help="dir of generated projects (default: temp dir)")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path,
+                        help="result json to compare with")
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="sapimo-bench-"))
+    settings = parse_settings(args.setting)
+    report = {
+        "meta": {"commit": git_commit(),
+                 "date": datetime.datetime.now().isoformat(),
+                 "python": platform.python_version(),
+                 "platform": platform.platform(),
+                 "cpus": os.cpu_count(),
+                 "requests": args.requests,
+                 "concurrency": args.concurrency,
+                 "changes": args.changes,
+                 "settings": settings},
+        "params": {},
+        "results": {},
+    }
+    for size in args.size:
+        params = dict(SIZES.get(size, SIZES["small"]))
+        for key in params:
+            if getattr(args, key) is not None:
+                params[key] = getattr(args, key)
+        report["params"][size] = params
+        root = workdir / size
+        print(f"[{size}] {params}", flush=True)
+        setup_project(root, params, settings)
+        results = report["results"].setdefault(size, {})
+        for scenario in [s for s in SCENARIOS if s in args.scenario]:
+            results[scenario] = run_scenario(root, scenario, args)
+            print(f"  {scenario:<8} {json.dumps(results[scenario])}",
+                  flush=True)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved: {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_rows(compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
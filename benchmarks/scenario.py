@@ -0,0 +1,146 @@
+"""
+    one benchmark scenario (run by run.py in the project dir as subprocess,
+    because sapimo.mock.initialize reads ./api_mock at import)
+        python scenario.py <startup|mock|lambda|example|sync> --output FILE
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.getcwd())  # lambda code and api_mock/app.py
+
+MODES = {"mock": "Mock", "lambda": "Lambda", "example": "Example"}
+
+
+def summarize(latencies: list[float]) -> dict:
+    """ [s] -> [ms] """
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+
+    def percentile(p):  # nearest rank
+        return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+    return {"mean": statistics.fmean(latencies) * 1000,
+            "p50": percentile(50) * 1000,
+            "p95": percentile(95) * 1000,
+            "p99": percentile(99) * 1000,
+            "max": latencies[-1] * 1000}
+
+
+def route_urls(client) -> list[str]:
+    from sapimo.mock.mediator_route import MediatorRoute
+    urls = []
+    for route in client.app.router.routes:
+        if isinstance(route, MediatorRoute):
+            urls.append(route.path.replace("{item_id}", "42") + "?q=bench")
+    return urls
+
+
+def run_load(client, urls: list[str], requests: int,
+             concurrency: int) -> dict:
+    errors = []
+
+    def request(i):
+        started = time.perf_counter()
+        res = client.get(urls[i % len(urls)])
+        if res.status_code >= 400:
+            errors.append(res.status_code)
+        return time.perf_counter() - started
+
+    for i in range(min(len(urls), requests)):  # warm up (cold start)
+        request(i)
+    errors.clear()
+    started = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [request(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(request, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "concurrency": concurrency,
+            "errors": len(errors), "throughput_rps": requests / elapsed,
+            "latency_ms": summarize(latencies)}
+
+
+def bench_startup() -> dict:
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from api_mock.app import api
+    imported = time.perf_counter()
+    client = TestClient(api)
+    client.__enter__()  # on_start (mock start and seeding)
+    ready = time.perf_counter()
+    client.__exit__(None, None, None)  # on_stop (sync, snapshot)
+    stopped = time.perf_counter()
+    return {"import_s": imported - started, "start_s": ready - imported,
+            "total_s": ready - started, "stop_s": stopped - ready}
+
+
+def bench_requests(mode: str, requests: int, concurrency: int) -> dict:
+    from fastapi.testclient import TestClient
+    from api_mock.app import api
+    from sapimo.mock.mediator_route import ReturnMode, set_mode
+    set_mode(ReturnMode[MODES[mode]], 200)
+    with TestClient(api) as client:
+        return run_load(client, route_urls(client), requests, concurrency)
+
+
+def bench_sync(changes: int, repeat: int = 5) -> dict:
+    import boto3
+    from fastapi.testclient import TestClient
+    from api_mock.app import api
+    from sapimo.mock import initialize
+    from project import BUCKET, TABLE
+
+    mock = initialize.mock
+    with TestClient(api):
+        def measure() -> float:
+            started = time.perf_counter()
+            mock.sync()
+            return time.perf_counter() - started
+
+        measure()  # first sync after startup
+        no_change = [measure() for _ in range(repeat)]
+
+        s3 = boto3.client("s3")
+        table = boto3.resource("dynamodb").Table(TABLE)
+        sqs = boto3.client("sqs")
+        url = sqs.get_queue_url(QueueName="sapimo-bench-queue")["QueueUrl"]
+        for i in range(changes):
+            s3.put_object(Bucket=BUCKET, Key=f"bench/{i}.txt", Body=b"x")
+            table.put_item(Item={"pk": f"bench{i}", "n": i})
+            sqs.send_message(QueueUrl=url, MessageBody=f"bench {i}")
+        changed = measure()
+    return {"changes": changes,
+            "no_change_ms": summarize(no_change),
+            "changed_ms": changed * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenario",
+                        choices=["startup", *MODES.keys(), "sync"])
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--changes", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.scenario == "startup":
+        result = bench_startup()
+    elif args.scenario == "sync":
+        result = bench_sync(args.changes)
+    else:
+        result = bench_requests(args.scenario, args.requests,
+                                args.concurrency)
+    with open(args.output, "w") as f:
+        json.dump(result, f)
+
+
+if __name__ == "__main__":
+    main()
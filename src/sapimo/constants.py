@@ -4,6 +4,9 @@ from enum import Enum
 WORKING_DIR = Path.cwd() / "api_mock"
 API_FILE = WORKING_DIR / "app.py"
 CONFIG_FILE = WORKING_DIR / "config.yaml"
+SNAPSHOT_FILE = WORKING_DIR / "snapshot.pickle"
+INVOCATIONS_DIR = WORKING_DIR / "log" / "invocations"
+CACHE_DIR = WORKING_DIR / ".cache"
 
 
 class EventType(Enum):
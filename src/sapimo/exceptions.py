@@ -17,3 +17,11 @@ class SamTemplateParseError(SapimoException):
 
 class DockerFileParseError(SapimoException):
     pass
+
+
+class PoolSaturatedError(SapimoException):
+    pass
+
+
+class LambdaTimeoutError(SapimoException):
+    pass
@@ -0,0 +1,298 @@
+"""
+    logging backend of sapimo
+        - all loggers share one QueueHandler.
+          records are written by a background listener thread
+          (the caller doesn't wait for file I/O)
+        - file: JSON lines (api_mock/log/<date>.jsonl)
+          created by the first record written to it
+          console: warnings and lambda logs
+        - request id and function of the running invocation
+          are added to records (log_context)
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Callable, Optional
+
+from sapimo import constants
+
+# fields of the running invocation (request_id, function, route)
+_context = contextvars.ContextVar("sapimo_log_context", default=None)
+CONTEXT_FIELDS = ("request_id", "function", "route")
+
+
+@contextmanager
+def log_context(**fields):
+    """ records logged in this context have the fields """
+    current = _context.get()
+    token = _context.set({**current, **fields} if current else fields)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context() -> dict:
+    return _context.get() or {}
+
+
+class LogSampler:
+    """ pass 'rate' of calls (evenly, not randomly) """
+
+    def __init__(self, rate: float = 1.0):
+        self.rate = max(0.0, min(1.0, rate))
+        self._count = itertools.count()
+
+    def sample(self) -> bool:
+        if self.rate >= 1.0:
+            return True
+        n = next(self._count)
+        return int((n + 1) * self.rate) > int(n * self.rate)
+
+
+class RawJson(str):
+    """ serialized json (embedded in the log line without escaping) """
+
+
+def truncate(value, max_chars: Optional[int]) -> str:
+    """ str (or json) of value, cut to max_chars """
+    if not isinstance(value, str):
+        try:
+            value = RawJson(json.dumps(value, default=str,
+                                       ensure_ascii=False))
+        except Exception:
+            value = repr(value)
+    if max_chars and len(value) > max_chars:
+        return f"{value[:max_chars]}...(truncated {len(value)} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """ one json object per line """
+
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._time_prefix = ""
+
+    def _time(self, created: float) -> str:
+        second = int(created)
+        if second != self._second:  # format once per second
+            self._second = second
+            self._time_prefix = time.strftime("%Y-%m-%dT%H:%M:%S",
+                                              time.gmtime(second))
+        return f"{self._time_prefix}.{int(created % 1 * 1000):03d}Z"
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self._time(record.created),
+            "level": record.levelname,
+            "logger": _short_name(record.name),
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if getattr(record, "lambda_log", False):
+            data["lambda"] = True
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        extra = getattr(record, "data", None)
+        if isinstance(extra, RawJson):
+            line = json.dumps(data, default=str, ensure_ascii=False)
+            return f'{line[:-1]}, "data": {extra}}}'
+        if extra is not None:
+            data["data"] = extra
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+@lru_cache(maxsize=256)
+def _short_name(name: str) -> str:
+    """ logger of sapimo is named by __file__ """
+    return Path(name).stem if name.endswith(".py") else name
+
+
+class _QueueHandler(QueueHandler):
+    """ format message and traceback in the caller (args may change) """
+
+    def __init__(self, log_queue, lambda_log: bool = False):
+        super().__init__(log_queue)
+        self._lambda_log = lambda_log
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(
+                record.exc_info)
+            record.exc_info = None
+        context = _context.get()
+        if context:
+            for field, value in context.items():
+                setattr(record, field, value)
+        record.lambda_log = self._lambda_log
+        return record
+
+
+class _InvocationFilter(logging.Filter):
+    """
+        records logged by running invocation
+        (lambda handler on root: records of other libraries are not
+         marked as lambda logs)
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return "request_id" in current_context()
+
+
+class _ConsoleFilter(logging.Filter):
+    """ warnings of sapimo and all lambda logs """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING\
+            or getattr(record, "lambda_log", False)
+
+
+class _LazyFileHandler(logging.StreamHandler):
+    """
+        file is opened by the first record (path is decided then)
+        not flushed per record (listener flushes when queue is empty)
+    """
+
+    def __init__(self, new_path: Callable[[], Path]):
+        super().__init__()
+        self.stream = None
+        self._new_path = new_path
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                path = self._new_path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.stream = open(path, "a", encoding="utf-8")
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+    def reopen(self):
+        """ next record is written to a new file """
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+    def close(self):
+        self.reopen()
+        super().close()
+
+
+class _Listener(QueueListener):
+    def dequeue(self, block: bool):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            if not block:
+                raise
+        for handler in self.handlers:
+            handler.flush()
+        return self.queue.get()
+
+
+class LogBackend:
+    """
+        started when the first logger is attached
+        (log_dir: WORKING_DIR/log if None)
+    """
+
+    def __init__(self, log_dir: Optional[Path] = None):
+        self._log_dir = log_dir
+        self._queue = queue.SimpleQueue()
+        self._handler = _QueueHandler(self._queue)
+        self._lambda_handler = _QueueHandler(self._queue, lambda_log=True)
+        # lambda code logs by root logger (logging.getLogger())
+        self._root_lambda_handler = _QueueHandler(self._queue,
+                                                  lambda_log=True)
+        self._root_lambda_handler.addFilter(_InvocationFilter())
+        self._listener: Optional[_Listener] = None
+        self._file_handler: Optional[_LazyFileHandler] = None
+        self._lock = threading.Lock()
+        self.file_path: Optional[Path] = None
+
+    @property
+    def log_dir(self) -> Path:
+        return self._log_dir or constants.WORKING_DIR / "log"
+
+    def set_log_dir(self, log_dir: Optional[Path]):
+        """ records after this are written to a new file in log_dir """
+        self._log_dir = log_dir
+        if self._file_handler:
+            self._file_handler.reopen()
+
+    def _new_file_path(self) -> Path:
+        filename = datetime.datetime.now().strftime("%Y-%m-%d_%H%M")
+        if multiprocessing.parent_process() is not None:
+            # worker process of ExecutionMode: process
+            filename += f"_{os.getpid()}"
+        self.file_path = self.log_dir / f"{filename}.jsonl"
+        return self.file_path
+
+    def start(self):
+        with self._lock:
+            if self._listener:
+                return
+            file_handler = _LazyFileHandler(self._new_file_path)
+            file_handler.setFormatter(JsonFormatter())
+            file_handler.setLevel(logging.INFO)
+            self._file_handler = file_handler
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(
+                logging.Formatter("[%(levelname)s] %(message)s"))
+            console_handler.addFilter(_ConsoleFilter())
+            self._listener = _Listener(self._queue, file_handler,
+                                       console_handler,
+                                       respect_handler_level=True)
+            self._listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """ write all queued records """
+        with self._lock:
+            if not self._listener:
+                return
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+            self._file_handler = None
+
+    def attach(self, logger: logging.Logger, lambda_log: bool = False):
+        """ add the shared handler to logger (only once) """
+        self.start()
+        if not lambda_log:
+            handler = self._handler
+        elif logger is logging.getLogger():
+            handler = self._root_lambda_handler
+        else:
+            handler = self._lambda_handler
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+
+
+backend = LogBackend()
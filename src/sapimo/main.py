@@ -1,4 +1,5 @@
 import uvicorn
+from functools import partial
 from typing import Callable
 import sys
 from pathlib import Path
@@ -26,12 +27,19 @@ def main():
     show_default=True,
 )
 @click.option("--cdk", is_flag=True, help="true if CDK cloudformation file",)
-def init(template, cdk):
+@click.option(
+    "--exclude",
+    type=str,
+    multiple=True,
+    help="dir or file pattern not searched for lambda code (CDK only)",
+)
+def init(template, cdk, exclude):
     if template == "":
-        create_config_default()
+        create_config_default(exclude)
     else:
         template_path = Path(template).resolve()
-        parser = SamParser if not cdk else CdkCfParser
+        parser = SamParser if not cdk\
+            else partial(CdkCfParser, excludes=list(exclude))
         if not create_config(template_path, parse_class=parser,
                              overwrite=False):
             print(f"{template.name} file not found.\
@@ -41,7 +49,7 @@ def init(template, cdk):
             exit()
 
 
-def create_config_default():
+def create_config_default(excludes: tuple = ()):
     template_path = Path("template.yaml").resolve()
     if template_path.exists():
         create_config(template_path, parse_class=SamParser, overwrite=False)
@@ -54,7 +62,9 @@ def create_config_default():
         files = [f for f in cdk_out.iterdir() if f.is_file()]
         for file in files:
             if file.name.endswith("template.json"):
-                create_config(file.resolve(), parse_class=CdkCfParser,
+                create_config(file.resolve(),
+                              parse_class=partial(CdkCfParser,
+                                                  excludes=list(excludes)),
                               overwrite=False)
                 break
         else:
@@ -105,7 +115,10 @@ def run(host: str, port: int):
     lambda_path = Path.cwd()
     sys.path.append(str(lambda_path))
 
-    uvicorn.run("api_mock.app:api", host=host, port=port, reload=True)
+    # lambda code is reloaded by sapimo itself (mock aws data is kept)
+    # uvicorn reloads only when api_mock/app.py is changed
+    uvicorn.run("api_mock.app:api", host=host, port=port, reload=True,
+                reload_dirs=[str(WORKING_DIR)])
 
 
 @main.command()
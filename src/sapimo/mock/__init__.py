@@ -1 +1,6 @@
-from .initialize import api
+def __getattr__(name: str):
+    """ import 'api' lazily (mock modules can be imported without config) """
+    if name == "api":
+        from .initialize import api
+        return api
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
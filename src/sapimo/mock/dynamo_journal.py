@@ -0,0 +1,119 @@
+import threading
+from typing import Optional
+
+from boto3.dynamodb.types import TypeDeserializer
+from moto.dynamodb.models import DynamoDBBackend
+
+
+class DynamoChangeJournal:
+    """
+        record dynamodb keys which are written or deleted in moto backend
+            - hook DynamoDBBackend.put_item / update_item / delete_item
+              (batch_write_item and transact_write_items
+               are processed through them)
+            - only "dirty" keys are recorded.
+              current state of the key is checked when syncing
+            - create_table / delete_table and PartiQL statements
+              mark the whole table dirty (synced by scan)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # { table name: {key} or None (whole table) }
+        # key: tuple of (attribute name, value) sorted by name
+        self._changes: dict[str, Optional[set]] = {}
+        self._originals = {}
+        self._deserializer = TypeDeserializer()
+
+    def start(self):
+        if self._originals:
+            return
+        originals = {name: getattr(DynamoDBBackend, name) for name in [
+            "put_item", "update_item", "delete_item", "create_table",
+            "delete_table", "execute_statement"]}
+        journal = self
+
+        def _put_item(backend, table_name, item_attrs, *args, **kwargs):
+            res = originals["put_item"](backend, table_name, item_attrs,
+                                        *args, **kwargs)
+            journal.record_item(backend, table_name, item_attrs)
+            return res
+
+        def _update_item(backend, table_name, key, *args, **kwargs):
+            res = originals["update_item"](backend, table_name, key,
+                                           *args, **kwargs)
+            journal.record_item(backend, table_name, key)
+            return res
+
+        def _delete_item(backend, table_name, key, *args, **kwargs):
+            res = originals["delete_item"](backend, table_name, key,
+                                           *args, **kwargs)
+            journal.record_item(backend, table_name, key)
+            return res
+
+        def _create_table(backend, name, *args, **kwargs):
+            res = originals["create_table"](backend, name, *args, **kwargs)
+            journal.record_table(name)
+            return res
+
+        def _delete_table(backend, name, *args, **kwargs):
+            res = originals["delete_table"](backend, name, *args, **kwargs)
+            journal.record_table(name)
+            return res
+
+        def _execute_statement(backend, *args, **kwargs):
+            res = originals["execute_statement"](backend, *args, **kwargs)
+            for name in list(backend.tables.keys()):
+                journal.record_table(name)
+            return res
+
+        self._originals = originals
+        DynamoDBBackend.put_item = _put_item
+        DynamoDBBackend.update_item = _update_item
+        DynamoDBBackend.delete_item = _delete_item
+        DynamoDBBackend.create_table = _create_table
+        DynamoDBBackend.delete_table = _delete_table
+        DynamoDBBackend.execute_statement = _execute_statement
+
+    def stop(self):
+        for name, func in self._originals.items():
+            setattr(DynamoDBBackend, name, func)
+        self._originals = {}
+
+    def record_item(self, backend, table_name: str, attrs: dict):
+        """ attrs: item or key (attribute values of dynamodb json) """
+        table = backend.tables.get(table_name)
+        if table is None:
+            return
+        key = tuple(sorted(
+            (name, self._deserializer.deserialize(attrs[name]))
+            for name in [table.hash_key_attr, table.range_key_attr]
+            if name and name in attrs))
+        with self._lock:
+            keys = self._changes.setdefault(table_name, set())
+            if keys is not None:
+                keys.add(key)
+
+    def record_table(self, table_name: str):
+        with self._lock:
+            self._changes[table_name] = None
+
+    def restore(self, changes: dict):
+        """ record changes popped but not synced again """
+        with self._lock:
+            for table_name, keys in changes.items():
+                current = self._changes.get(table_name, set())
+                if keys is None or current is None:
+                    self._changes[table_name] = None
+                else:
+                    self._changes[table_name] = current | keys
+
+    def pop(self) -> dict:
+        """
+            return recorded changes and clear journal
+            ({ table: {keys} or None })
+        """
+        with self._lock:
+            changes = self._changes
+            self._changes = {}
+        return changes
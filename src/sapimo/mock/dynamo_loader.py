@@ -0,0 +1,175 @@
+"""
+    streaming loader of local dynamodb data (api_mock/dynamodb/<table>/)
+"""
+import base64
+import csv
+import gzip
+import json
+import re
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Iterator, Union
+
+from sapimo.utils import LogManager
+
+logger = LogManager.setup_logger(__file__)
+
+DYNAMO_TYPES = {"S", "N", "B", "BOOL", "NULL", "SS", "NS", "BS", "L", "M"}
+# header of old console export. e.g. "pk (S)"
+_TYPED_HEADER = re.compile(r"\s*\((" + "|".join(DYNAMO_TYPES) + r")\)$")
+
+
+def iter_items(table_path: Path) -> Iterator[dict]:
+    """
+        yield items of local table dir (first found file is used)
+        - data.json: list of items (sapimo format)
+        - data.jsonl: one item per line (plain or DynamoDB JSON)
+        - *.json.gz: DynamoDB export to S3 (DynamoDB JSON per line)
+        - results.csv: exported csv from DynamoDB console
+    """
+    file = table_path / "data.json"
+    if file.exists():
+        if file.stat().st_size < 4:  # skip if empty file
+            logger.warning(f"{file} is empty.")
+        else:
+            yield from iter_json_items(file)
+        return
+    file = table_path / "data.jsonl"
+    if file.exists():
+        yield from iter_json_lines(file)
+        return
+    exports = sorted(table_path.glob("**/*.json.gz"))
+    if exports:
+        for export in exports:
+            yield from iter_json_lines(export)
+        return
+    file = table_path / "results.csv"
+    if file.exists():
+        yield from iter_csv_items(file)
+
+
+def iter_json_items(file: Path) -> Iterator[dict]:
+    with open(file, "r", encoding="utf-8") as f:
+        data = json.load(f, parse_float=Decimal)
+    if not isinstance(data, list):
+        data = [data]
+    yield from data
+
+
+def iter_json_lines(file: Path) -> Iterator[dict]:
+    """ JSON lines. {"Item": {...}} line is regarded as DynamoDB JSON """
+    open_ = gzip.open if file.name.endswith(".gz") else open
+    with open_(file, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line, parse_float=Decimal)
+            if len(item) == 1 and isinstance(item.get("Item"), dict):
+                yield {k: from_dynamo_json(v) for k, v in item["Item"].items()}
+            else:
+                yield item
+
+
+def iter_csv_items(file: Path) -> Iterator[dict]:
+    """ csv is tokenized by csv module (quoted comma and newline are ok) """
+    with open(file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        headers = [_TYPED_HEADER.sub("", h.strip().strip('"'))
+                   for h in next(reader, [])]
+        for row in reader:
+            # empty cell means the item doesn't have the attribute
+            yield {col: interpret_cell(cell)
+                   for col, cell in zip(headers, row) if cell != ""}
+
+
+def from_dynamo_json(value: dict):
+    """ {"S": "a"} -> "a" """
+    (tp, v), = value.items()
+    if tp == "N":
+        return Decimal(v)
+    elif tp == "B":
+        return base64.b64decode(v)
+    elif tp == "NULL":
+        return None
+    elif tp == "SS":
+        return set(v)
+    elif tp == "NS":
+        return {Decimal(n) for n in v}
+    elif tp == "BS":
+        return {base64.b64decode(b) for b in v}
+    elif tp == "L":
+        return [from_dynamo_json(e) for e in v]
+    elif tp == "M":
+        return {k: from_dynamo_json(e) for k, e in v.items()}
+    return v  # S, BOOL
+
+
+def _is_typed(obj) -> bool:
+    return isinstance(obj, dict) and len(obj) == 1\
+        and next(iter(obj)) in DYNAMO_TYPES
+
+
+def interpret_cell(cell: str) -> Union[str, Decimal, list, dict, set]:
+    """ interpret one cell of results.csv """
+    val = cell.strip()
+    if val.startswith("[") or val.startswith("{"):
+        try:
+            obj = json.loads(val, parse_float=Decimal)
+        except ValueError:
+            # double quotation is removed
+            return interpret_dynamo_cell(val)
+        if isinstance(obj, list):
+            if all(_is_typed(e) for e in obj):  # list
+                return [from_dynamo_json(e) for e in obj]
+            if obj and (all(isinstance(e, str) for e in obj)
+                        or all(isinstance(e, Decimal)
+                               or type(e) is int for e in obj)):
+                return set(obj)  # string or number set
+            return obj  # list of plain json (e.g. dicts)
+        if _is_typed(obj):
+            return from_dynamo_json(obj)
+        return {k: from_dynamo_json(v) if _is_typed(v) else v
+                for k, v in obj.items()}
+    try:
+        return Decimal(val)
+    except InvalidOperation:
+        return val
+
+
+def interpret_dynamo_cell(elm: str) -> Union[str, Decimal, list, dict, set]:
+    """ interpret cell whose double quotation is removed """
+    val = elm.strip().strip("\"")
+    if val.startswith("["):  # dynamo set or list
+        val = val[1:-1]  # remove []
+        if val:
+            res = [interpret_dynamo_cell(n) for n in val.split(",")]
+            return res if val.startswith("{") else set(res)
+        else:
+            return []
+    if val.startswith("{"):  # dynamo map or list item
+        pair = val[1:-1]  # remove {}
+        if not pair:
+            return {}
+        key, *rest = pair.split(":")
+        v = ":".join(rest)
+        key = key.strip("\"")
+        v = v.strip("\"")
+        if key == "S":
+            return v.strip("\"")
+        elif key == "N":
+            return Decimal(v.strip("\""))
+        elif key == "BOOL":
+            return bool(val.strip("\""))
+        elif key == "B":
+            return base64.b64decode(v.strip("\""))
+        elif key in ["SS", "NS", "BS", "L", "M"]:
+            return interpret_dynamo_cell(v)
+        else:
+            return {key: interpret_dynamo_cell(v)}
+    else:
+        val = val.strip("'")
+        try:
+            val = Decimal(val)
+            return val
+        except InvalidOperation:
+            return val
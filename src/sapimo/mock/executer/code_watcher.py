@@ -0,0 +1,95 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Callable
+
+from sapimo.utils import LogManager
+
+try:
+    import watchfiles
+except ImportError:  # uvicorn[standard] is not installed
+    watchfiles = None
+
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
+
+
+class CodeWatcher:
+    """
+        watch lambda code dirs (CodeUri and Layers) on background thread
+        and notify changed dirs
+            - watchfiles is used if installed (otherwise, poll mtime)
+    """
+
+    def __init__(self, dirs: list[str],
+                 on_change: Callable[[list[str]], None],
+                 poll_interval: float = 1.0):
+        self._dirs = [d for d in dict.fromkeys(dirs) if Path(d).is_dir()]
+        self._on_change = on_change
+        self._poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self._dirs or self._thread:
+            return
+        self._stop_event.clear()
+        if watchfiles:
+            target, args = self._watch, ()
+        else:
+            # changes after start() returns are detected
+            target, args = self._poll, (self._scan(),)
+        self._thread = threading.Thread(target=target, args=args,
+                                        daemon=True,
+                                        name="sapimo-code-watcher")
+        self._thread.start()
+        logger.info(f"watch lambda code: {self._dirs}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        for changes in watchfiles.watch(
+                *self._dirs, watch_filter=watchfiles.PythonFilter(),
+                stop_event=self._stop_event, raise_interrupt=False):
+            self._notify([path for _, path in changes])
+
+    def _poll(self, mtimes: dict):
+        while not self._stop_event.wait(self._poll_interval):
+            new_mtimes = self._scan()
+            changed = [path for path in mtimes.keys() | new_mtimes.keys()
+                       if mtimes.get(path) != new_mtimes.get(path)]
+            mtimes = new_mtimes
+            if changed:
+                self._notify(changed)
+
+    def _scan(self) -> dict:
+        mtimes = {}
+        for d in self._dirs:
+            for root, dirs, files in os.walk(d):
+                dirs[:] = [d for d in dirs if not d.startswith(".")
+                           and d != "__pycache__"]
+                for file in files:
+                    if file.endswith(".py"):
+                        path = os.path.join(root, file)
+                        try:
+                            mtimes[path] = os.stat(path).st_mtime_ns
+                        except FileNotFoundError:
+                            pass
+        return mtimes
+
+    def _notify(self, paths: list[str]):
+        """ changed files -> watched dirs which contain them """
+        roots = {d: os.path.join(os.path.abspath(d), "") for d in self._dirs}
+        changed = [d for d, root in roots.items()
+                   if any(os.path.abspath(p).startswith(root) for p in paths)]
+        if not changed:
+            return
+        logger.info(f"lambda code is changed: {changed}")
+        try:
+            self._on_change(changed)
+        except Exception:
+            logger.exception("reload error")
@@ -0,0 +1,91 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Optional
+
+from sapimo.exceptions import LambdaInvokeError
+from sapimo.mock.executer.invoke_info import InvokeInfo
+
+
+class WarmHandler:
+    """ imported lambda code (like a warm container) """
+
+    def __init__(self, module: ModuleType, func: Callable,
+                 init_duration: float):
+        self.module = module
+        self.func = func
+        self.init_duration = init_duration  # [s]
+        self.invocations = 0
+
+
+class HandlerCache:
+    """
+        cache of lambda handlers
+            key: CodeUri + Handler + Layers
+            - module globals (boto3 clients etc.) are kept between invocation
+            - with force_cold_start, lambda code is re-imported every time
+    """
+
+    def __init__(self, force_cold_start: bool = False):
+        self._force_cold_start = force_cold_start
+        self._handlers: dict[tuple, WarmHandler] = {}
+        self._lock = threading.Lock()
+
+    def get(self, props: InvokeInfo) -> tuple[WarmHandler, bool]:
+        """
+            return (handler, is_cold_start)
+            (call in LayerImporter: code_uri and layers are in sys.path)
+        """
+        with self._lock:
+            handler = self._handlers.get(props.function_key)
+            if handler and not self._force_cold_start:
+                handler.invocations += 1
+                return handler, False
+            if handler or self._force_cold_start:
+                unload_modules([props.code_uri, *props.layers])
+                sys.modules.pop(props.import_path, None)
+
+            started = time.perf_counter()
+            module = importlib.import_module(props.import_path)
+            init_duration = time.perf_counter() - started
+            func = getattr(module, props.func, None)
+            if not callable(func):
+                err_msg = f"lambda entrypoint({props.func}) is"\
+                    f" not exist in {props.import_path}"
+                raise LambdaInvokeError(err_msg)
+            handler = WarmHandler(module, func, init_duration)
+            handler.invocations += 1
+            self._handlers[props.function_key] = handler
+            return handler, True
+
+    def invalidate(self, dirs: list[str]) -> list[str]:
+        """
+            drop handlers which use code in dirs (CodeUri or Layers)
+            return removed module names
+        """
+        targets = {os.path.abspath(d) for d in dirs}
+        with self._lock:
+            unload_dirs = list(dirs)
+            for key in list(self._handlers.keys()):
+                code_uri, _, layers = key
+                if targets & {os.path.abspath(d) for d in [code_uri, *layers]}:
+                    # code which imports changed layer is also reloaded
+                    unload_dirs.append(code_uri)
+                    del self._handlers[key]
+            return unload_modules(unload_dirs)
+
+
+def unload_modules(dirs: list[str]) -> list[str]:
+    """ remove modules in dirs from sys.modules (re-imported next time) """
+    roots = tuple(os.path.join(os.path.abspath(d), "") for d in dirs if d)
+    removed = []
+    for name, module in list(sys.modules.items()):
+        file: Optional[str] = getattr(module, "__file__", None)
+        if file and os.path.abspath(file).startswith(roots):
+            del sys.modules[name]
+            removed.append(name)
+    importlib.invalidate_caches()
+    return removed
@@ -0,0 +1,380 @@
+"""
+    logs of each lambda invocation (for /_sapimo/invocations)
+        - logging records, print output and exception of the invocation
+          are captured (records of any logger propagated to root)
+        - running invocations and the latest 'capacity' finished ones
+          are kept in memory, older ones are spilled to
+          api_mock/log/invocations/*.jsonl by a writer thread
+        - indexed by request id, route and function
+          (query doesn't scan invocations of other routes/functions)
+"""
+import contextvars
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+# capture of the running invocation (copied to worker thread)
+_capture = contextvars.ContextVar("sapimo_invocation_capture", default=None)
+
+
+class InvocationCapture:
+    """ logs of one invocation """
+    __slots__ = ("request_id", "route", "function", "started", "duration",
+                 "status", "report", "logs", "stdout", "error", "_max_lines",
+                 "_dropped", "_on_finish")
+
+    def __init__(self, request_id: str, route: str, function: str,
+                 max_lines: int = 500,
+                 on_finish: Callable[["InvocationCapture"], None] = None):
+        self.request_id = request_id
+        self.route = route
+        self.function = function
+        self.started = time.time()
+        self.duration: Optional[float] = None
+        self.status = "running"
+        self.report: Optional[str] = None
+        self.logs: list[dict] = []
+        self.stdout: list[str] = []
+        self.error: Optional[str] = None
+        self._max_lines = max_lines
+        self._dropped = 0
+        self._on_finish = on_finish
+
+    def add_log(self, record: logging.LogRecord):
+        if len(self.logs) >= self._max_lines:
+            self._dropped += 1
+            return
+        entry = {"time": record.created, "level": record.levelname,
+                 "logger": record.name, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exc"] = "".join(traceback.format_exception(
+                *record.exc_info))
+        self.logs.append(entry)
+
+    def add_stdout(self, text: str):
+        if len(self.stdout) >= self._max_lines:
+            self._dropped += 1
+            return
+        self.stdout.append(text)
+
+    def output(self) -> dict:
+        """ captured lines (sent from worker process) """
+        return {"logs": self.logs, "stdout": self.stdout,
+                "error": self.error, "dropped": self._dropped}
+
+    def merge(self, output: dict):
+        """ add lines captured by worker process """
+        for entry in output["logs"]:
+            if len(self.logs) >= self._max_lines:
+                self._dropped += 1
+            else:
+                self.logs.append(entry)
+        for text in output["stdout"]:
+            self.add_stdout(text)
+        self._dropped += output["dropped"]
+        if output["error"]:
+            self.error = output["error"]
+
+    def finish(self, status: str, report=None, error: str = None):
+        self.duration = time.time() - self.started
+        self.status = status
+        self.report = str(report) if report is not None else None
+        self.error = error
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+    def to_dict(self, logs: bool = True) -> dict:
+        res = {"request_id": self.request_id, "route": self.route,
+               "function": self.function, "started": self.started,
+               "duration_ms": self.duration * 1000
+               if self.duration is not None else None,
+               "status": self.status, "report": self.report,
+               "error": self.error}
+        if logs:
+            res["logs"] = self.logs
+            res["stdout"] = "".join(self.stdout)
+            res["dropped_lines"] = self._dropped
+        return res
+
+
+@contextmanager
+def capture_invocation(capture: InvocationCapture):
+    token = _capture.set(capture)
+    try:
+        yield capture
+    finally:
+        _capture.reset(token)
+
+
+class _CaptureHandler(logging.Handler):
+    """ (on root logger) records -> capture of the running invocation """
+
+    def emit(self, record: logging.LogRecord):
+        capture = _capture.get()
+        if capture is not None:
+            capture.add_log(record)
+
+
+class _StdoutTee:
+    """ sys.stdout: print of lambda code is also captured """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text: str):
+        capture = _capture.get()
+        if capture is not None and text:
+            capture.add_stdout(text)
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class InvocationStore:
+    """
+        ring buffer of InvocationCapture with disk spill
+            capacity: finished invocations kept in memory
+            segments: number of spill files (capacity lines each)
+        only finished captures are spilled. they are serialized
+        and written by the writer thread (not on the event loop)
+    """
+
+    def __init__(self, spill_dir: Optional[Path], capacity: int = 1000,
+                 segments: int = 10):
+        self._capacity = capacity
+        self._segments = segments
+        self._spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._running: OrderedDict[str, InvocationCapture] = OrderedDict()
+        self._memory: OrderedDict[str, InvocationCapture] = OrderedDict()
+        # evicted from memory and not written yet
+        self._pending: OrderedDict[str, InvocationCapture] = OrderedDict()
+        self._queue: queue.Queue[Optional[InvocationCapture]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # spilled { request_id: (segment, offset, route, function, status) }
+        self._spilled: OrderedDict[str, tuple] = OrderedDict()
+        # request ids in begin order (running, memory, pending and spilled)
+        # { ("route", "GET /a") / ("path", "/a") / ("function", f)
+        #   / ("all", ""): { request_id: None } }
+        self._index: dict[tuple, OrderedDict[str, None]] = {}
+        self._segment = 0
+        self._segment_lines = 0
+        self._file = None
+        self._handler = _CaptureHandler()
+        self._stdout = None
+
+    def start(self):
+        """ capture logs and print (and clear spilled files) """
+        if self._spill_dir:
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            for file in self._spill_dir.glob("*.jsonl"):
+                file.unlink()
+            self._writer = threading.Thread(
+                target=self._write_loop, name="sapimo-invocation-log",
+                daemon=True)
+            self._writer.start()
+        logging.getLogger().addHandler(self._handler)
+        if not isinstance(sys.stdout, _StdoutTee):
+            self._stdout = sys.stdout
+            sys.stdout = _StdoutTee(sys.stdout)
+
+    def stop(self):
+        logging.getLogger().removeHandler(self._handler)
+        if self._stdout is not None and isinstance(sys.stdout, _StdoutTee):
+            sys.stdout = self._stdout
+            self._stdout = None
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def begin(self, request_id: str, route: str, function: str,
+              max_lines: int = 500) -> InvocationCapture:
+        capture = InvocationCapture(request_id, route, function, max_lines,
+                                    on_finish=self._finished)
+        with self._lock:
+            self._running[request_id] = capture
+            for key in self._index_keys(route, function):
+                self._index.setdefault(key, OrderedDict())[request_id] = None
+        return capture
+
+    @staticmethod
+    def _index_keys(route: Optional[str], function: str) -> list[tuple]:
+        keys = [("all", ""), ("function", function)]
+        if route:
+            keys += [("route", route), ("path", route.split(" ")[-1])]
+        return keys
+
+    def _unindex(self, request_id: str, route: Optional[str],
+                 function: str):
+        """ forget dropped capture (with lock) """
+        for key in self._index_keys(route, function):
+            ids = self._index.get(key)
+            if ids is not None:
+                ids.pop(request_id, None)
+                if not ids:
+                    del self._index[key]
+
+    def _finished(self, capture: InvocationCapture):
+        """ move to memory (the oldest one is queued to be spilled) """
+        with self._lock:
+            self._running.pop(capture.request_id, None)
+            self._memory[capture.request_id] = capture
+            self._memory.move_to_end(capture.request_id)
+            while len(self._memory) > self._capacity:
+                request_id, old = self._memory.popitem(last=False)
+                if self._writer is not None:
+                    self._pending[request_id] = old
+                    self._queue.put(old)
+                else:
+                    self._unindex(request_id, old.route, old.function)
+
+    def join(self):
+        """ wait until queued captures are written (for tests) """
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            capture = self._queue.get()
+            try:
+                if capture is None:
+                    return
+                line = json.dumps(capture.to_dict(), default=str) + "\n"
+                with self._lock:
+                    self._spill(capture, line)
+            except Exception:
+                logging.getLogger(__name__).exception("invocation spill")
+            finally:
+                self._queue.task_done()
+
+    def _spill(self, capture: InvocationCapture, line: str):
+        """ write serialized capture (with lock) """
+        self._pending.pop(capture.request_id, None)
+        if self._file is None or self._segment_lines >= self._capacity:
+            self._next_segment()
+        offset = self._file.tell()
+        self._file.write(line)
+        self._segment_lines += 1
+        self._spilled[capture.request_id] = (
+            self._segment, offset, capture.route, capture.function,
+            capture.status)
+
+    def _next_segment(self):
+        if self._file:
+            self._file.close()
+            self._segment += 1
+        self._segment_lines = 0
+        self._file = open(self._segment_path(self._segment), "a",
+                          encoding="utf-8")
+        # drop the oldest segment
+        dropped = self._segment - self._segments
+        if dropped >= 0:
+            self._segment_path(dropped).unlink(missing_ok=True)
+            while self._spilled:
+                request_id, entry = next(iter(self._spilled.items()))
+                if entry[0] > dropped:
+                    break
+                self._spilled.pop(request_id)
+                self._unindex(request_id, entry[2], entry[3])
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._spill_dir / f"{segment:06d}.jsonl"
+
+    def get(self, request_id: str) -> Optional[dict]:
+        with self._lock:
+            capture = self._running.get(request_id)\
+                or self._memory.get(request_id)\
+                or self._pending.get(request_id)
+            if capture:
+                return capture.to_dict()
+            entry = self._spilled.get(request_id)
+            if entry is None:
+                return None
+            self._file.flush()
+            return self._read(entry[0], entry[1])
+
+    def _read(self, segment: int, offset: int) -> Optional[dict]:
+        try:
+            with open(self._segment_path(segment), encoding="utf-8") as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def query(self, route: str = None, function: str = None,
+              status: str = None, limit: int = 50,
+              logs: bool = False) -> list[dict]:
+        """
+            newest first
+            route: "GET /hello" or path only ("/hello")
+        """
+        def match(r, f, s) -> bool:
+            if route and r != route and r.split(" ")[-1] != route:
+                return False
+            return (not function or f == function)\
+                and (not status or s == status)
+
+        # running ones first, then candidates from the index
+        # of route or function (newest first)
+        keys = [("all", "")]
+        if route:
+            keys.append(("route" if " " in route else "path", route))
+        if function:
+            keys.append(("function", function))
+        res = []
+        with self._lock:
+            for capture in reversed(self._running.values()):
+                if len(res) >= limit:
+                    return res
+                if match(capture.route or "", capture.function,
+                         capture.status):
+                    res.append(capture.to_dict(logs))
+            request_ids = min((self._index.get(key, {}) for key in keys),
+                              key=len)
+            flushed = False
+            for request_id in reversed(request_ids):
+                if len(res) >= limit:
+                    break
+                if request_id in self._running:
+                    continue
+                capture = self._memory.get(request_id)\
+                    or self._pending.get(request_id)
+                if capture is not None:
+                    if match(capture.route or "", capture.function,
+                             capture.status):
+                        res.append(capture.to_dict(logs))
+                    continue
+                entry = self._spilled.get(request_id)
+                if entry is None:
+                    continue
+                segment, offset, r, f, s = entry
+                if not match(r or "", f, s):
+                    continue
+                if not flushed and self._file:
+                    self._file.flush()
+                    flushed = True
+                record = self._read(segment, offset)
+                if record is None:
+                    continue
+                if not logs:
+                    for key in ["logs", "stdout", "dropped_lines"]:
+                        record.pop(key, None)
+                res.append(record)
+        return res
+
+
+def current_capture() -> Optional[InvocationCapture]:
+    return _capture.get()
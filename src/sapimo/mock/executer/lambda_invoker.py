@@ -1,6 +1,9 @@
+import asyncio
 import os
-import importlib
 import sys
+import time
+import traceback
+from contextlib import contextmanager
 from pathlib import Path
 import json
 from typing import Union
@@ -10,10 +13,28 @@ from fastapi.responses import JSONResponse, Response
 
 from sapimo.parser.config_parser import ConfigParser
 from sapimo.utils import LogManager
+from sapimo.log_backend import \
+    LogSampler, current_context, log_context, truncate
 from sapimo.mock.executer.invoke_info import \
-    ApiInfo, ApiV2Info, InvokeInfo, TokenAuthorizerInfo, RequestAuthorizerInfo
-from sapimo.constants import EventType, AuthType
-from sapimo.exceptions import LambdaInvokeError, EventConvertError
+    ApiInfo, ApiV2Info, InvokeInfo, TokenAuthorizerInfo, \
+    RequestAuthorizerInfo, S3TriggerInfo, SqsTriggerInfo
+from sapimo.mock.executer.handler_cache import HandlerCache
+from sapimo.mock.executer.code_watcher import CodeWatcher
+from sapimo.mock.executer.worker_pool import WorkerPool
+from sapimo.mock.executer.process_pool import ProcessPool
+from sapimo.mock.executer.report import \
+    InvocationReport, MemoryTracer, request_id
+from sapimo.mock.executer.invocation_log import \
+    InvocationStore, capture_invocation, current_capture
+from sapimo.mock.executer.s3_trigger import \
+    S3TriggerDispatcher, trigger_chain
+from sapimo.mock.executer.sqs_poller import SqsPoller
+from sapimo.mock.metrics import metrics
+from sapimo.constants import EventType, AuthType, INVOCATIONS_DIR
+from sapimo.exceptions import (
+    LambdaInvokeError, LambdaTimeoutError, EventConvertError,
+    PoolSaturatedError)
+import logging
 from logging import DEBUG
 
 logger = LogManager.setup_logger(__file__, level=DEBUG)
@@ -26,56 +47,235 @@ class LambdaInvoker:
         - setup and execute lambda python code
     """
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, config: ConfigParser = None):
         """
-            - set config
+            - set config (config: parsed path, shared with MockManager)
             - setup s3 and dynamodb
         """
-        self._config = ConfigParser(path)
+        self._path = path
+        self._config = config or ConfigParser(path)
+        # { (route path, method): ApiInfo } (replaced as a whole on reload)
+        self._routes = self._compile_routes(self._config)
+        self._handlers = HandlerCache(
+            force_cold_start=self._config.settings.get("ForceColdStart",
+                                                       False))
+        settings = self._config.settings
+        self._pool = WorkerPool(
+            size=settings.get("WorkerPoolSize", None),
+            max_pending=settings.get("MaxPendingInvocations", 100))
+        self._memory_tracer = MemoryTracer()\
+            if settings.get("TraceMemory", False) else None
+        self._log_sampler = LogSampler(settings.get("LogSampleRate", 1.0))
+        self._log_body_max_chars = settings.get("LogBodyMaxChars", 4096)
+        # logs of each invocation (for /_sapimo/invocations)
+        self.invocations = InvocationStore(
+            INVOCATIONS_DIR,
+            capacity=settings.get("InvocationLogSize", 1000),
+            segments=settings.get("InvocationLogSegments", 10))
+        self._invocation_max_lines = settings.get("InvocationLogMaxLines",
+                                                  500)
+        self._processes = None
+        if settings.get("ExecutionMode", "thread") == "process":
+            self._processes = ProcessPool(
+                workers_per_function=settings.get("WorkersPerFunction", 1),
+                size=settings.get("WorkerPoolSize", None),
+                max_pending=settings.get("MaxPendingInvocations", 100),
+                force_cold_start=settings.get("ForceColdStart", False))
+        self._trigger = None
+        if self._config.triggered:
+            self._trigger = S3TriggerDispatcher(
+                self._config.triggered, self.run_by_trigger,
+                workers=settings.get("TriggerWorkers", 4),
+                max_depth=settings.get("TriggerMaxDepth", 16))
+        self._sqs_pollers = [
+            SqsPoller(SqsTriggerInfo(queue, src), self.run_by_sqs,
+                      poll_interval=settings.get("SqsPollInterval", 1.0))
+            for queue, srcs in self._config.sqs_triggered.items()
+            for src in ([srcs] if isinstance(srcs, dict) else srcs)]
+        self.sync_scheduler = None  # set by initialize
+        self._watcher = None
+        if self._config.settings.get("WatchCode", True):
+            self._watcher = CodeWatcher(self._code_dirs(),
+                                        self._on_code_change)
+
+    def start(self):
+        self.invocations.start()
+        if self._processes:
+            self._processes.start()
+            # pre-fork workers of all functions
+            for props in self._routes.values():
+                self._processes.prestart(
+                    self._env_key(props), props,
+                    self._lambda_environ(props.environ))
+        if self._trigger:
+            self._trigger.start()
+        for poller in self._sqs_pollers:
+            poller.start()
+        if self._watcher:
+            self._watcher.start()
+
+    def stop(self):
+        if self._watcher:
+            self._watcher.stop()
+        if self._trigger:
+            self._trigger.stop()
+        for poller in self._sqs_pollers:
+            poller.stop()
+        self._pool.shutdown()
+        if self._processes:
+            self._processes.stop()
+        self.invocations.stop()
+
+    def _code_dirs(self) -> list[str]:
+        """ CodeUri and Layers of all functions (api and s3 trigger) """
+        srcs = [src for methods in self._config.apis.values()
+                for src in methods.values()]
+        for triggered in [self._config.triggered,
+                          self._config.sqs_triggered]:
+            for triggers in triggered.values():
+                srcs += [triggers] if isinstance(triggers, dict) else triggers
+        dirs = []
+        for src in srcs:
+            props = src.get("Properties", {})
+            dirs.append(props.get("CodeUri", ""))
+            dirs += props.get("Layers", [])
+        return [d for d in dirs if d]
+
+    def _on_code_change(self, dirs: list[str]):
+        """ re-import changed lambda code at next invocation """
+        if self._processes:
+            removed = self._processes.invalidate(dirs)
+            logger.info(f"restart workers: {removed}")
+        else:
+            removed = self._handlers.invalidate(dirs)
+            logger.info(f"unload modules: {removed}")
+
+    @staticmethod
+    def _compile_routes(config: ConfigParser) -> dict[tuple, ApiInfo]:
+        """ config.apis -> { (route path, method): ApiInfo } """
+        routes = {}
+        for path, methods in config.apis.items():
+            for method, src in methods.items():
+                try:
+                    event_type = EventType[
+                        src["Properties"].get("EventType", "APIGW")]
+                    info = ApiV2Info if event_type == EventType.APIGW_V2\
+                        else ApiInfo
+                    routes[(path, method)] = info(path, method, src)
+                except Exception:
+                    logger.exception("")
+                    logger.warning(f"{path}:{method} execute info is invalid")
+        return routes
+
+    def reload(self):
+        """
+            re-read config and replace route table
+            (requests in flight keep using the old one.
+             config shared with MockManager is not changed)
+            workers of functions whose properties are changed are stopped
+            (process mode: restarted at next invocation)
+        """
+        config = ConfigParser(self._path)
+        routes = self._compile_routes(config)
+        old_props = self._route_props(self._routes)
+        self._routes = routes
+        self._config = config
+        logger.info(f"routes reloaded: {len(self._routes)}")
+        if self._processes:
+            new_props = self._route_props(routes)
+            changed = [key for key, props in old_props.items()
+                       if new_props.get(key) != props]
+            removed = self._processes.discard(changed)
+            if removed:
+                logger.info(f"restart workers: {removed}")
+
+    def _route_props(self, routes: dict[tuple, ApiInfo]) -> dict:
+        """ { env key: Properties of routes (serialized) } """
+        res = {}
+        for props in routes.values():
+            res.setdefault(self._env_key(props), set()).add(
+                json.dumps(props._props, sort_keys=True, default=str))
+        return res
 
     def _get_api_info(self, req: Request):
         path = req.scope["route"].path
-        method = req.method.lower()
+        props = self._routes.get((path, req.method.lower()))
+        if props is None:
+            logger.warning(f"{path}:{req.method.lower()}"
+                           " execute info is not found")
+        return props
 
+    def notify_s3(self, event_name: str, bucket: str, key: str,
+                  fake_key=None):
+        """ s3 listener: queue s3 event for triggered lambda """
+        if self._trigger:
+            self._trigger.notify(event_name, bucket, key, fake_key)
+
+    async def run_by_trigger(self, props: S3TriggerInfo, event: dict,
+                             chain: tuple):
+        """
+            lambda execution by s3 event
+            (called from S3TriggerDispatcher)
+        """
+        res = await self._lambda_exec(props, event, f"s3:{props.bucket}",
+                                      chain)
+        if self.sync_scheduler:
+            self.sync_scheduler.request()
+        return res
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """
+            wait until s3 events and visible sqs messages are processed
+            (including events caused by the triggered lambdas)
+            Return: False if timed out
+        """
+        async def _drain():
+            while True:
+                # s3 events of finished lambdas are scheduled on the loop
+                await asyncio.sleep(0.05)
+                busy = self._trigger is not None and self._trigger.busy()
+                for poller in self._sqs_pollers:
+                    busy = busy or await poller.busy()
+                if not busy:
+                    return
         try:
-            src = self._config.apis[path][method]
-            event_type = EventType[src["Properties"].get("EventType", "APIGW")]
-            if event_type == EventType.APIGW:
-                return ApiInfo(path, method, src)
-            elif event_type == EventType.APIGW_V2:
-                return ApiV2Info(path, method, src)
-        except:
-            logger.exception("")
-            logger.warning(f"{path}:{method} execute info is not found")
-            return None
+            await asyncio.wait_for(_drain(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
 
-    async def run_by_trigger(self, updated: dict, deleted: dict):
+    async def run_by_sqs(self, props: SqsTriggerInfo, event: dict):
         """
-            lambda execution when s3 file is updated
-            - interpret trigger rules
+            lambda execution by sqs messages
+            (called from SqsPoller)
         """
-        if not self._config.triggered:
-            return
-        raise NotImplementedError()
+        res = await self._lambda_exec(props, event, f"sqs:{props.queue}")
+        if self.sync_scheduler:
+            self.sync_scheduler.request()
+        return res
 
-    async def auth_api(self, props: ApiInfo, req: Request):
+    async def auth_api(self, props: ApiInfo, req: Request, route: str = ""):
         """
         if api has a lambda authorizer, get additional info
+            Return:
+                context returned by the authorizer (or None)
         """
+        if props is None:
+            return None
         if props.auth == AuthType.CUSTOM:
             # TODO: Check this flow!
             auth_props = RequestAuthorizerInfo(req)
-            res = await self._lambda_exec(auth_props, req)
-            props.auth_res_context = res.get("context")
+            with metrics.measure(route, "authorizer"):
+                res = await self._lambda_exec(auth_props, req)
+            return res.get("context")
         elif props.auth == AuthType.CUSTOM_REQUEST:
             pass
         elif props.auth == AuthType.CUSTOM_TOKEN:
             auth_props = TokenAuthorizerInfo(req)
-            res = await self._lambda_exec(auth_props, req)
-            props.auth_res_context = res.get("context")
-        else:
-            props.auth_res_context = None
-            return
+            with metrics.measure(route, "authorizer"):
+                res = await self._lambda_exec(auth_props, req)
+            return res.get("context")
+        return None
 
     async def run_by_api(self, req: Request):
         """
@@ -84,22 +284,25 @@ class LambdaInvoker:
                 API response
         """
         props: ApiInfo = self._get_api_info(req)
-        await self.auth_api(props, req)
+        route = props.route if props else f"{req.method} {req.url.path}"
 
         try:
-            lambda_res = await self._lambda_exec(props, req)
-            if(lambda_res is not None):
-                status = lambda_res.get("statusCode", 500)
-                body = lambda_res.get("body")
-            else:
-                status = 500
-                body = "No response from lambda"
-            try:
-                if not isinstance(body, dict):
-                    body = json.loads(body)
-                return JSONResponse(status_code=status, content=body)
-            except:
-                return Response(status_code=status, content=body)
+            authorizer = await self.auth_api(props, req, route)
+            lambda_res = await self._lambda_exec(props, req, route,
+                                                 authorizer=authorizer)
+            with metrics.measure(route, "response"):
+                if(lambda_res is not None):
+                    status = lambda_res.get("statusCode", 500)
+                    body = lambda_res.get("body")
+                else:
+                    status = 500
+                    body = "No response from lambda"
+                try:
+                    if not isinstance(body, dict):
+                        body = json.loads(body)
+                    return JSONResponse(status_code=status, content=body)
+                except:
+                    return Response(status_code=status, content=body)
         except ModuleNotFoundError as e:
             err_msg = "lambda code import error: " + str(e) + "\n"\
                 "- check 'CodeUri' or 'Layers'"\
@@ -109,6 +312,14 @@ class LambdaInvoker:
                 "- check import section in your code\n"
             logger.error(err_msg)
             return Response(status_code=500, content=err_msg)
+        except LambdaTimeoutError:
+            # like API Gateway's response when lambda is timed out
+            return JSONResponse(status_code=502,
+                                content={"message": "Internal server error"})
+        except PoolSaturatedError as e:
+            logger.warning(e.message)
+            return Response(status_code=429, content=e.message,
+                            headers={"Retry-After": "1"})
         except EventConvertError as e:
             logger.exception("")  # FIXME
             logger.error("request convert error")
@@ -122,12 +333,17 @@ class LambdaInvoker:
             return Response(status_code=500, content=str(e))
 
     async def _lambda_exec(self, props: InvokeInfo,
-                           event_src: Union[Request, str]):
+                           event_src: Union[Request, str, dict],
+                           route: str = None, chain: tuple = (),
+                           authorizer: dict = None):
         """
             common process of lambda execution
-            - set(change) env
-            - import required layer
-            - execute lambda code
+            - convert request to event (on event loop)
+            - set(change) env and import required layer
+            - execute lambda code (on worker pool)
+            - phases are recorded to metrics if route is given
+            - chain: triggered lambdas which caused this invocation
+            - authorizer: context of lambda authorizer (api only)
 
             Return:
                 result of lambda handler
@@ -135,73 +351,136 @@ class LambdaInvoker:
         if not props:
             raise LambdaInvokeError("lambda info is not exist")
 
-        # set env
-        self._change_env(props.environ)
+        # request to event
+        started = time.perf_counter()
+        try:
+            event = await props.to_event(event_src, authorizer)
+        except Exception as e:
+            logger.exception("lambda event convert error")
+            raise EventConvertError()
+        if route:
+            metrics.observe(route, "event", time.perf_counter() - started)
 
-        # import layer
-        with LayerImporter([*props.layers, props.code_uri]):
-            # request to event
+        # records logged by this invocation (also on worker thread)
+        # have its request id and are captured to the invocation store
+        invocation_id = request_id(event)
+        capture = self.invocations.begin(invocation_id, route,
+                                         props.import_path,
+                                         self._invocation_max_lines)
+        with self._invocation_context(capture):
+            env_key = self._env_key(props)
             try:
-                event = await props.to_event(event_src)
-            except Exception as e:
-                logger.exception("lambda event convert error")
-                raise EventConvertError()
+                if self._processes:
+                    # run on worker process which owns env and layers
+                    lambda_res, report = await self._processes.run(
+                        env_key, props, self._lambda_environ(props.environ),
+                        event, chain)
+                else:
+                    # run on worker thread with env and layers of the function
+                    lambda_res, report = await self._pool.run(
+                        env_key, lambda: self._lambda_env(props),
+                        self._invoke, props, event, chain,
+                        timeout=props.timeout)
+            except LambdaTimeoutError as e:
+                logger.error(f"{invocation_id} {e.message}")
+                capture.finish("timeout", error=e.message)
+                raise
+            except BaseException as e:
+                # including cancel (capture is not left running)
+                capture.finish("error",
+                               error=capture.error or str(e) or repr(e))
+                raise
+            capture.finish("ok", report)
+            logger.info(report)
+            if route:
+                if report.init_duration is not None:
+                    metrics.observe(route, "init", report.init_duration)
+                metrics.observe(route, "handler", report.duration)
+            if report.memory_exceeded:
+                logger.warning(f"{props.import_path}: max memory used"
+                               f" {report.max_memory_used_mb} MB exceeds"
+                               f" MemorySize {report.memory_size} MB")
+            return lambda_res
+
+    @staticmethod
+    @contextmanager
+    def _invocation_context(capture):
+        """ log context and capture of the invocation """
+        with log_context(request_id=capture.request_id,
+                         function=capture.function, route=capture.route):
+            with capture_invocation(capture):
+                yield
 
+    @staticmethod
+    def _env_key(props: InvokeInfo) -> tuple:
+        return (props.function_key, tuple(sorted(props.environ.items())))
 
-            # import lambda code
-            app = importlib.import_module(props.import_path)
+    @contextmanager
+    def _lambda_env(self, props: InvokeInfo):
+        """ set(change) env and import required layer """
+        self._change_env(props.environ)
+        with LayerImporter([*props.layers, props.code_uri]):
+            yield
 
-            # check handler
-            if not props.func in dir(app):
-                err_msg = f"lambda entrypoint({props.func}) is\
-                            not exist in {props.import_path}"
-                raise LambdaInvokeError(err_msg)
+    def _invoke(self, props: InvokeInfo, event: dict, chain: tuple = ())\
+            -> tuple[dict, InvocationReport]:
+        """ import and execute lambda code (on worker thread) """
+        # import lambda code (only at cold start)
+        handler, cold_start = self._handlers.get(props)
+        app = handler.module
+        if cold_start:
+            init_ms = handler.init_duration * 1000
+            logger.info(f"cold start: {props.import_path}"
+                        f" init duration {init_ms:.2f} ms")
 
-            # lambda execution
+        # lambda execution
+        try:
+            sampled = self._log_sampler.sample()
+            if sampled:
+                logger.info("lambda event", extra={"data": truncate(
+                    event, self._log_body_max_chars)})
+            if hasattr(app, "logger") and \
+                    isinstance(app.logger, logging.Logger):
+                LogManager.capture(app.logger)
+            tracer = self._memory_tracer
+            token = tracer.begin() if tracer else None
+            started = time.perf_counter()
             try:
-                logger.info("--------- PARAMS --------")
-                qs =event.get("queryStringParameters", "")
-                bd = event.get("body", "")
-                logger.info(f"QueryStrings: {qs}")
-                logger.info(f"Body: {bd}")
-                logger.info("--------- ALL EVENT --------")
-                logger.info(event)
-                if hasattr(app, "logger"):
-                    lam_logger = app.logger
-                    log_changer = LogManager(lam_logger)
-                    logger.info("--------- LAMBDA LOG --------")
-                lambda_res = eval("app."+props.func)(event, None)
-                logger.info("---------- RESPONSE ---------")
-                logger.info(lambda_res)
-                if hasattr(app, "logger"):
-                    log_changer.deinit()
-                logger.info("-----------------------------")
-                return lambda_res
-            except Exception as e:
-                logger.exception("lambda execute error")
-                raise LambdaInvokeError(str(e))
+                with trigger_chain(chain):
+                    lambda_res = handler.func(event, None)
+            finally:
+                duration = time.perf_counter() - started
+                # memory allocated by this invocation (not process RSS)
+                max_memory = tracer.end(token) if tracer else None
+            report = InvocationReport(
+                current_context().get("request_id") or request_id(event),
+                duration, props.memory_size, max_memory,
+                handler.init_duration if cold_start else None)
+            if sampled:
+                logger.info("lambda response", extra={"data": truncate(
+                    lambda_res, self._log_body_max_chars)})
+            return lambda_res, report
+        except Exception as e:
+            logger.exception("lambda execute error")
+            capture = current_capture()
+            if capture is not None:
+                capture.error = traceback.format_exc()
+            raise LambdaInvokeError(str(e))
 
     async def get_example(self, req: Request, status: int):
+        """
+            example response written in config (Example mode)
+        """
         props = self._get_api_info(req)
-        if "responses" not in props:
-            return None
-        if not props.responses:
-            return None
-        example = props.responses[status]
-
-        def search_example(di: dict):
-            for key, value in di.items():
-                if key == "example":
-                    return value
-                elif isinstance(value, dict):
-                    res = search_example(value)
-                    if res:
-                        return res
-            else:
-                return None
-        return search_example(example)
+        if props is None:
+            return Response(status_code=404, content="api is not found")
+        res = props.get_response(status) or props.responses[500]
+        example = res.example()
+        return Response(status_code=int(example["statusCode"]),
+                        content=example["body"],
+                        media_type="application/json")
 
-    def _change_env(self, env: dict):
+    def _lambda_environ(self, env: dict) -> dict:
         def_env = {
             "HOSTNAME": "fae95fa3f3cb",  # dummy
             "AWS_LAMBDA_FUNCTION_VERSION": "$LATEST",
@@ -234,6 +513,10 @@ class LambdaInvoker:
             # "AWS_LAMBDA_FUNCTION_HANDLER": "app.lambda_handler",
         }
         def_env.update(env)
+        return def_env
+
+    def _change_env(self, env: dict):
+        def_env = self._lambda_environ(env)
 
         # delete one by one for avoid memory leak
         for k in os.environ.keys():
@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Hashable, Optional
+
+from sapimo.exceptions import \
+    LambdaInvokeError, LambdaTimeoutError, PoolSaturatedError
+from sapimo.log_backend import backend
+from sapimo.mock.executer.handler_cache import HandlerCache
+from sapimo.mock.executer.invocation_log import \
+    InvocationCapture, InvocationStore, capture_invocation, current_capture
+from sapimo.mock.executer.invoke_info import InvokeInfo
+from sapimo.mock.executer.report import InvocationReport, max_rss, request_id
+from sapimo.mock.executer.s3_trigger import send_chain_header, trigger_chain
+from sapimo.utils import LogManager
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:  # moto[server] (flask) is not installed
+    ThreadedMotoServer = None
+
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
+
+
+def _use_endpoint(endpoint_url: str):
+    """
+        aws clients of this process use moto server of the main process
+        (AWS_ENDPOINT_URL is read only by boto3 >= 1.28)
+    """
+    from botocore.session import Session
+    create_client = Session.create_client
+
+    def _create_client(session, service_name, *args, **kwargs):
+        # endpoint_url is the 5th argument after service_name
+        if len(args) < 5 and kwargs.get("endpoint_url") is None:
+            kwargs["endpoint_url"] = endpoint_url
+        return create_client(session, service_name, *args, **kwargs)
+    Session.create_client = _create_client
+
+
+def _worker_main(conn, src: dict, environ: dict, force_cold_start: bool,
+                 log_dir: Path):
+    """
+        entrypoint of worker process
+            - env, sys.path and imported modules are owned by this process
+            - logs are written to log_dir of the parent process
+            - lambda code is imported before the first event (warm)
+            - receive (event, chain) and send
+              ("ok", response, report, output)
+              or ("error", kind, msg, output)
+              (output: logs and print of the invocation)
+            - chain is sent with aws requests (s3 trigger loop detection)
+    """
+    backend.set_log_dir(log_dir)
+    os.environ.clear()
+    os.environ.update(environ)
+    if environ.get("AWS_ENDPOINT_URL"):
+        _use_endpoint(environ["AWS_ENDPOINT_URL"])
+    send_chain_header()
+    props = InvokeInfo(src)
+    sys.path.extend([*props.layers, props.code_uri])
+    handlers = HandlerCache(force_cold_start=force_cold_start)
+    InvocationStore(None).start()  # capture logs and print of handler
+    init_duration = None
+    try:
+        handler, _ = handlers.get(props)
+        init_duration = handler.init_duration
+    except Exception:
+        pass  # error is sent on invocation
+    conn.send(("ready",))
+    while True:
+        try:
+            received = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if received is None:
+            break
+        event, chain = received
+        capture = InvocationCapture(request_id(event), None,
+                                    props.import_path)
+        try:
+            with capture_invocation(capture):
+                handler, cold_start = handlers.get(props)
+                if cold_start:
+                    init_duration = handler.init_duration
+                app_logger = getattr(handler.module, "logger", None)
+                if isinstance(app_logger, logging.Logger):
+                    LogManager.capture(app_logger)
+                started = time.perf_counter()
+                with trigger_chain(chain):
+                    res = handler.func(event, None)
+            report = InvocationReport(
+                request_id(event), time.perf_counter() - started,
+                props.memory_size, max_rss(), init_duration)
+            init_duration = None
+            conn.send(("ok", res, report, capture.output()))
+        except ModuleNotFoundError as e:
+            conn.send(("error", "import", str(e), capture.output()))
+        except Exception as e:
+            traceback.print_exc()
+            capture.error = traceback.format_exc()
+            conn.send(("error", "invoke", f"{type(e).__name__}: {e}",
+                       capture.output()))
+    conn.close()
+
+
+class FunctionWorker:
+    """ pre-forked process which runs one function """
+
+    def __init__(self, ctx, props: InvokeInfo, environ: dict,
+                 force_cold_start: bool):
+        self._conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, daemon=True,
+            args=(child_conn, {"Properties": props._props}, environ,
+                  force_cold_start, backend.log_dir))
+        self.process.start()
+        child_conn.close()
+        self._ready = False
+
+    def invoke(self, event: dict, timeout: float = None, chain: tuple = (),
+               capture: InvocationCapture = None)\
+            -> tuple[dict, InvocationReport]:
+        """
+            worker is killed if timed out (init phase is not counted)
+            logs and print of the worker are added to capture
+        """
+        try:
+            if not self._ready:
+                self._conn.recv()  # wait until lambda code is imported
+                self._ready = True
+            self._conn.send((event, chain))
+            if not self._conn.poll(timeout):
+                self.process.kill()
+                self.process.join()
+                raise LambdaTimeoutError(
+                    f"Task timed out after {timeout:.2f} seconds")
+            res = self._conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            raise LambdaInvokeError("lambda worker process is dead"
+                                    f" (exitcode: {self.process.exitcode})")
+        if capture is not None:
+            capture.merge(res[-1])
+        if res[0] == "ok":
+            return res[1], res[2]
+        _, kind, message, _ = res
+        if kind == "import":
+            raise ModuleNotFoundError(message)
+        raise LambdaInvokeError(message)
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self):
+        try:
+            self._conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=3)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._conn.close()
+
+
+class _FunctionWorkers:
+    """
+        warm workers of one function
+        (idle is used on the event loop. None in idle: closed)
+    """
+
+    def __init__(self, props: InvokeInfo):
+        self.props = props
+        self.idle: asyncio.Queue[Optional[FunctionWorker]] = asyncio.Queue()
+        self.closed = False
+
+    def close(self) -> list[FunctionWorker]:
+        """ return idle workers (to be closed) """
+        self.closed = True
+        workers = []
+        while not self.idle.empty():
+            worker = self.idle.get_nowait()
+            if worker is not None:
+                workers.append(worker)
+        self.idle.put_nowait(None)  # waiters retry with new workers
+        return workers
+
+
+def _close_later(workers: list[FunctionWorker]):
+    """ close workers without blocking the caller (event loop) """
+    if workers:
+        threading.Thread(target=lambda: [w.close() for w in workers],
+                         daemon=True).start()
+
+
+class ProcessPool:
+    """
+        run lambda handlers on pre-forked worker processes
+            - N warm workers per function (same env and code)
+            - moto server is started because mock aws in this process
+              can't be reached from workers (endpoint_url of clients)
+            - idle worker is waited on the event loop
+              and workers are spawned on executor threads
+    """
+
+    def __init__(self, workers_per_function: int = 1, size: int = None,
+                 max_pending: int = 100, force_cold_start: bool = False):
+        if ThreadedMotoServer is None:
+            raise ImportError("process execution requires moto[server]")
+        self.workers_per_function = workers_per_function
+        self.size = size or min(32, (os.cpu_count() or 1) + 4)
+        self.max_pending = max_pending
+        self._force_cold_start = force_cold_start
+        self._ctx = multiprocessing.get_context("spawn")
+        # threads wait for the response from worker process
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.size, thread_name_prefix="sapimo-dispatch")
+        self._functions: dict[Hashable, _FunctionWorkers] = {}
+        self._lock = threading.Lock()  # for _functions
+        self._loop = None  # loop which uses idle queues
+        self._running = 0
+        self._server = None
+        self.endpoint_url = None
+
+    def start(self):
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self._server = ThreadedMotoServer(ip_address="127.0.0.1", port=0,
+                                          verbose=False)
+        self._server.start()
+        port = self._server._server.server_port
+        self.endpoint_url = f"http://127.0.0.1:{port}"
+        logger.info(f"moto server for lambda workers: {self.endpoint_url}")
+
+    def stop(self):
+        with self._lock:
+            functions = list(self._functions.values())
+            self._functions.clear()
+        for workers in functions:
+            for worker in workers.close():
+                worker.close()
+        self._executor.shutdown(wait=True)
+        if self._server:
+            self._server.stop()
+            self._server = None
+
+    def prestart(self, key: Hashable, props: InvokeInfo, environ: dict):
+        """ spawn workers of the function (call on the event loop) """
+        workers, new = self._add_function(key, props)
+        if new:
+            for worker in self._spawn_all(props, environ):
+                workers.idle.put_nowait(worker)
+
+    async def run(self, key: Hashable, props: InvokeInfo, environ: dict,
+                  event: dict, chain: tuple = ())\
+            -> tuple[dict, InvocationReport]:
+        if self._running >= self.size + self.max_pending:
+            raise PoolSaturatedError(
+                f"too many invocations ({self._running} running or pending)")
+        self._running += 1
+        try:
+            self._loop = loop = asyncio.get_running_loop()
+            while True:
+                workers = await self._get_workers(key, props, environ)
+                worker = await workers.idle.get()
+                if worker is not None:
+                    break
+                workers.idle.put_nowait(None)  # closed: wake other waiters
+            try:
+                if not worker.is_alive():
+                    logger.warning(f"restart dead worker: {props.import_path}")
+                    worker.close()
+                    worker = await loop.run_in_executor(
+                        self._executor, self._spawn, props, environ)
+                return await loop.run_in_executor(
+                    self._executor, worker.invoke, event, props.timeout,
+                    chain, current_capture())
+            finally:
+                if workers.closed:
+                    _close_later([worker])
+                else:
+                    workers.idle.put_nowait(worker)
+        finally:
+            self._running -= 1
+
+    def _add_function(self, key, props) -> tuple[_FunctionWorkers, bool]:
+        """ workers of the function (new: registered to be spawned) """
+        with self._lock:
+            workers = self._functions.get(key)
+            if workers is not None:
+                return workers, False
+            workers = _FunctionWorkers(props)
+            self._functions[key] = workers
+            return workers, True
+
+    async def _get_workers(self, key, props, environ) -> _FunctionWorkers:
+        """ workers of the function (spawned outside the lock) """
+        workers, new = self._add_function(key, props)
+        if not new:
+            return workers
+        try:
+            spawned = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._spawn_all, props, environ)
+        except BaseException:
+            # waiters retry (and spawn again)
+            with self._lock:
+                if self._functions.get(key) is workers:
+                    del self._functions[key]
+            workers.close()
+            raise
+        if workers.closed:
+            _close_later(spawned)
+        else:
+            for worker in spawned:
+                workers.idle.put_nowait(worker)
+        return workers
+
+    def _spawn_all(self, props: InvokeInfo, environ: dict)\
+            -> list[FunctionWorker]:
+        return [self._spawn(props, environ)
+                for _ in range(self.workers_per_function)]
+
+    def _spawn(self, props: InvokeInfo, environ: dict) -> FunctionWorker:
+        if self.endpoint_url:
+            environ = {**environ, "AWS_ENDPOINT_URL": self.endpoint_url}
+        return FunctionWorker(self._ctx, props, environ,
+                              self._force_cold_start)
+
+    def invalidate(self, dirs: list[str]) -> list[str]:
+        """
+            stop workers which use code in dirs (CodeUri or Layers)
+            return import path of stopped functions
+        """
+        targets = {os.path.abspath(d) for d in dirs}
+        removed = []
+        with self._lock:
+            for key, workers in list(self._functions.items()):
+                props = workers.props
+                uris = {os.path.abspath(d)
+                        for d in [props.code_uri, *props.layers]}
+                if targets & uris:
+                    del self._functions[key]
+                    removed.append(workers)
+        for workers in removed:
+            self._close(workers)
+        return [workers.props.import_path for workers in removed]
+
+    def discard(self, keys: list[Hashable]) -> list[str]:
+        """
+            stop workers of keys (e.g. properties of function are changed)
+            return import path of stopped functions
+        """
+        with self._lock:
+            removed = [self._functions.pop(key) for key in keys
+                       if key in self._functions]
+        for workers in removed:
+            self._close(workers)
+        return [workers.props.import_path for workers in removed]
+
+    def _close(self, workers: _FunctionWorkers):
+        """ close workers (idle queue is used on the event loop) """
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(
+                lambda: _close_later(workers.close()))
+        else:
+            _close_later(workers.close())
@@ -0,0 +1,114 @@
+import math
+import sys
+import threading
+import tracemalloc
+import uuid
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+MB = 1024 * 1024
+
+
+def max_rss() -> Optional[int]:
+    """ peak RSS of this process [byte] """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class MemoryTracer:
+    """
+        peak memory allocated by invocations (tracemalloc, thread mode)
+            - tracing runs only while traced invocations are running
+            - the peak of tracemalloc is process wide:
+              memory of an invocation which overlapped others is None
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: dict[int, list] = {}  # { token: [base, alone] }
+        self._next = 0
+        self._started = False  # tracing is started by this tracer
+
+    def begin(self) -> int:
+        with self._lock:
+            if self._running:
+                for running in self._running.values():
+                    running[1] = False
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started = True
+                tracemalloc.reset_peak()
+            self._next += 1
+            self._running[self._next] = [
+                tracemalloc.get_traced_memory()[0], not self._running]
+            return self._next
+
+    def end(self, token: int) -> Optional[int]:
+        """ Return: max memory used [byte] (None if not alone) """
+        with self._lock:
+            base, alone = self._running.pop(token)
+            peak = tracemalloc.get_traced_memory()[1]
+            if not self._running and self._started:
+                tracemalloc.stop()
+                self._started = False
+        return peak - base if alone else None
+
+
+def request_id(event: dict) -> str:
+    """ requestId of api event (or new one) """
+    context = event.get("requestContext") if isinstance(event, dict) else None
+    if isinstance(context, dict) and context.get("requestId"):
+        return context["requestId"]
+    return str(uuid.uuid4())
+
+
+class InvocationReport:
+    """
+        result of one invocation like lambda's REPORT line
+            - duration, init_duration: [s]
+            - memory_size: [MB] (MemorySize of function)
+            - max_memory_used: [byte]
+    """
+
+    def __init__(self, request_id: str, duration: float, memory_size: int,
+                 max_memory_used: Optional[int] = None,
+                 init_duration: Optional[float] = None):
+        self.request_id = request_id
+        self.duration = duration
+        self.memory_size = memory_size
+        self.max_memory_used = max_memory_used
+        self.init_duration = init_duration
+
+    @property
+    def billed_duration(self) -> int:
+        """ [ms] (1ms unit) """
+        return max(1, math.ceil(self.duration * 1000))
+
+    @property
+    def max_memory_used_mb(self) -> Optional[int]:
+        if self.max_memory_used is None:
+            return None
+        return math.ceil(self.max_memory_used / MB)
+
+    @property
+    def memory_exceeded(self) -> bool:
+        used = self.max_memory_used_mb
+        return used is not None and used > self.memory_size
+
+    def __str__(self):
+        used = self.max_memory_used_mb
+        line = f"REPORT RequestId: {self.request_id}"\
+            f"\tDuration: {self.duration * 1000:.2f} ms"\
+            f"\tBilled Duration: {self.billed_duration} ms"\
+            f"\tMemory Size: {self.memory_size} MB"\
+            f"\tMax Memory Used: {'-' if used is None else used} MB"
+        if self.init_duration is not None:
+            line += f"\tInit Duration: {self.init_duration * 1000:.2f} ms"
+        return line
@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote_plus
+
+from sapimo.mock.executer.invoke_info import S3TriggerInfo
+from sapimo.utils import LogManager
+
+try:
+    from flask import has_request_context, request as flask_request
+except ImportError:  # moto[server] (flask) is not installed
+    has_request_context = None
+
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
+
+# functions (import path) which caused the running invocation
+# (set on the thread which runs triggered lambda)
+_chain = threading.local()
+# chain of worker process is sent to moto server by this request header
+CHAIN_HEADER = "x-sapimo-trigger-chain"
+
+
+@contextmanager
+def trigger_chain(chain: tuple):
+    """ s3 events written in this context are regarded as chained """
+    prev = getattr(_chain, "value", None)
+    _chain.value = chain
+    try:
+        yield
+    finally:
+        _chain.value = prev
+
+
+def current_chain() -> Optional[tuple]:
+    return getattr(_chain, "value", None)
+
+
+def send_chain_header():
+    """
+        add the chain to aws requests of this process (worker process)
+        moto server of the main process gets it by request_chain()
+    """
+    from botocore.endpoint import Endpoint
+    if getattr(Endpoint.make_request, "sends_chain", False):
+        return
+    make_request = Endpoint.make_request
+
+    def _make_request(endpoint, operation_model, request_dict):
+        chain = current_chain()
+        if chain:
+            request_dict.setdefault("headers", {})[CHAIN_HEADER] = \
+                ",".join(chain)
+        return make_request(endpoint, operation_model, request_dict)
+    _make_request.sends_chain = True
+    Endpoint.make_request = _make_request
+
+
+def request_chain() -> Optional[tuple]:
+    """ chain sent by worker process (on the thread of moto server) """
+    if has_request_context is None or not has_request_context():
+        return None
+    value = flask_request.headers.get(CHAIN_HEADER)
+    return tuple(value.split(",")) if value else None
+
+
+def build_s3_event(event_name: str, bucket: str, key: str,
+                   size: Optional[int] = None, etag: Optional[str] = None,
+                   region: str = "us-east-1") -> dict:
+    """ s3 notification event (one record) """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    obj = {"key": quote_plus(key), "sequencer": f"{time.time_ns():X}"}
+    if event_name.startswith("ObjectCreated"):
+        obj["size"] = size or 0
+        obj["eTag"] = (etag or "").strip('"')
+    return {"Records": [{
+        "eventVersion": "2.1",
+        "eventSource": "aws:s3",
+        "awsRegion": region,
+        "eventTime": now.strftime("%Y-%m-%dT%H:%M:%S.") +
+        f"{now.microsecond // 1000:03d}Z",
+        "eventName": event_name,
+        "userIdentity": {"principalId": "AWS:EXAMPLE"},
+        "requestParameters": {"sourceIPAddress": "127.0.0.1"},
+        "responseElements": {
+            "x-amz-request-id": uuid.uuid4().hex[:16].upper(),
+            "x-amz-id-2": uuid.uuid4().hex},
+        "s3": {
+            "s3SchemaVersion": "1.0",
+            "configurationId": "sapimo",
+            "bucket": {"name": bucket,
+                       "ownerIdentity": {"principalId": "EXAMPLE"},
+                       "arn": f"arn:aws:s3:::{bucket}"},
+            "object": obj}
+    }]}
+
+
+class S3TriggerDispatcher:
+    """
+        deliver s3 events to triggered lambdas
+            - notify() is called from moto (any thread) and only enqueues
+            - workers on the event loop run matched lambdas concurrently
+            - events written by triggered lambda carry its chain
+              (worker process: by CHAIN_HEADER of the request).
+              chain longer than max_depth (recursive loop) is dropped
+            - events are dropped if the queue is full
+    """
+
+    def __init__(self, triggered: dict,
+                 invoke: Callable[[S3TriggerInfo, dict, tuple], Awaitable],
+                 workers: int = 4, max_depth: int = 16,
+                 queue_size: int = 1000):
+        self._triggers: dict[str, list[S3TriggerInfo]] = {}
+        for bucket, srcs in triggered.items():
+            if isinstance(srcs, dict):
+                srcs = [srcs]
+            self._triggers[bucket] = [S3TriggerInfo(bucket, src)
+                                      for src in srcs]
+        self._invoke = invoke
+        self._workers = workers
+        self.max_depth = max_depth
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending = 0  # events queued or being processed
+        self._loop = None
+        self._tasks = []
+
+    def start(self):
+        """ call on the event loop """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._pending = 0
+        self._tasks = [self._loop.create_task(self._worker())
+                       for _ in range(self._workers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._loop = None
+
+    def notify(self, event_name: str, bucket: str, key: str, fake_key=None):
+        """ s3 listener (called on the thread which wrote the object) """
+        if self._loop is None or bucket not in self._triggers:
+            return
+        chain = current_chain() or request_chain() or ()
+        size = getattr(fake_key, "size", None)
+        etag = getattr(fake_key, "etag", None)
+        self._loop.call_soon_threadsafe(
+            self._enqueue, (event_name, bucket, key, size, etag, chain))
+
+    def _enqueue(self, record: tuple):
+        try:
+            self._queue.put_nowait(record)
+            self._pending += 1
+        except asyncio.QueueFull:
+            logger.warning(f"s3 event queue is full. dropped: {record[:3]}")
+
+    async def join(self):
+        """ wait until all queued events are processed """
+        await self._queue.join()
+
+    def busy(self) -> bool:
+        """ events are queued or being processed """
+        return self._pending > 0
+
+    async def _worker(self):
+        while True:
+            record = await self._queue.get()
+            try:
+                await self._dispatch(*record)
+            except Exception:
+                logger.exception("s3 trigger error")
+            finally:
+                self._pending -= 1
+                self._queue.task_done()
+
+    async def _dispatch(self, event_name, bucket, key, size, etag, chain):
+        targets = [t for t in self._triggers.get(bucket, [])
+                   if t.match(event_name, key)]
+        if not targets:
+            return
+        if len(chain) >= self.max_depth:
+            loop = "recursive loop" if any(
+                t.import_path in chain for t in targets) else "deep chain"
+            logger.warning(f"{loop} is detected. s3 event is dropped:"
+                           f" {event_name} s3://{bucket}/{key}"
+                           f" (chain: {' -> '.join(chain)})")
+            return
+        event = build_s3_event(event_name, bucket, key, size, etag)
+        logger.info(f"s3 trigger: {event_name} s3://{bucket}/{key}"
+                    f" -> {[t.import_path for t in targets]}")
+        results = await asyncio.gather(*[
+            self._invoke(t, event, (*chain, t.import_path))
+            for t in targets], return_exceptions=True)
+        for target, res in zip(targets, results):
+            if isinstance(res, Exception):
+                logger.error(f"s3 triggered lambda error:"
+                             f" {target.import_path}: {res!r}")
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+import boto3
+
+from sapimo.mock.executer.invoke_info import SqsTriggerInfo
+from sapimo.utils import LogManager
+
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
+
+
+def build_sqs_event(messages: list[dict], queue_arn: str,
+                    region: str = "us-east-1") -> dict:
+    """ receive_message response -> lambda event """
+    records = []
+    for msg in messages:
+        attributes = {}
+        for name, attr in msg.get("MessageAttributes", {}).items():
+            binary = attr.get("BinaryValue")
+            attributes[name] = {
+                "stringValue": attr.get("StringValue"),
+                "binaryValue": base64.b64encode(binary).decode("ascii")
+                if binary is not None else None,
+                "stringListValues": attr.get("StringListValues", []),
+                "binaryListValues": [
+                    base64.b64encode(b).decode("ascii")
+                    for b in attr.get("BinaryListValues", [])],
+                "dataType": attr.get("DataType")}
+        records.append({
+            "messageId": msg["MessageId"],
+            "receiptHandle": msg["ReceiptHandle"],
+            "body": msg.get("Body", ""),
+            "attributes": msg.get("Attributes", {}),
+            "messageAttributes": attributes,
+            "md5OfBody": msg.get("MD5OfBody", ""),
+            "eventSource": "aws:sqs",
+            "eventSourceARN": queue_arn,
+            "awsRegion": region})
+    return {"Records": records}
+
+
+class SqsPoller:
+    """
+        sqs event source mapping (one queue -> one function)
+            - 'concurrency' pollers receive messages in parallel
+            - batch is sent when BatchSize is reached
+              or MaximumBatchingWindowInSeconds is passed
+            - messages are deleted when lambda succeeds.
+              with ReportBatchItemFailures, only batchItemFailures are kept
+              (kept messages are received again after visibility timeout)
+    """
+
+    def __init__(self, props: SqsTriggerInfo,
+                 invoke: Callable[[SqsTriggerInfo, dict], Awaitable],
+                 poll_interval: float = 1.0):
+        self._props = props
+        self._invoke = invoke
+        self._poll_interval = poll_interval
+        self._client = None
+        self._url: Optional[str] = None
+        self._arn: Optional[str] = None
+        self._tasks = []
+        self._held = 0  # received messages being batched or processed
+        self._receiving = 0  # receive_message calls in flight
+
+    def start(self):
+        """ call on the event loop """
+        if not self._props.enabled:
+            return
+        self._client = boto3.client("sqs")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._poll())
+                       for _ in range(self._props.concurrency)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def busy(self) -> bool:
+        """
+            visible messages are left or received ones are being processed
+            (failed/delayed messages which are not visible are not counted)
+        """
+        if not self._tasks or not self._url:
+            return False
+        if self._held or self._receiving:
+            return True
+        attrs = await self._call(
+            self._client.get_queue_attributes, QueueUrl=self._url,
+            AttributeNames=["ApproximateNumberOfMessages"])
+        # messages received meanwhile are invisible but held (or receiving)
+        return int(attrs["Attributes"]["ApproximateNumberOfMessages"]) > 0\
+            or self._held > 0 or self._receiving > 0
+
+    async def _call(self, func, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(**kwargs))
+
+    async def _resolve_queue(self):
+        if self._url:
+            return
+        url = (await self._call(self._client.get_queue_url,
+                                QueueName=self._props.queue))["QueueUrl"]
+        attrs = await self._call(self._client.get_queue_attributes,
+                                 QueueUrl=url, AttributeNames=["QueueArn"])
+        self._arn = attrs["Attributes"]["QueueArn"]
+        self._url = url
+
+    async def _poll(self):
+        warned = False
+        while True:
+            try:
+                await self._resolve_queue()
+                messages = await self._receive_batch()
+                if messages:
+                    try:
+                        await self._process(messages)
+                    finally:
+                        self._held -= len(messages)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not warned:
+                    logger.warning(f"sqs poller error ({self._props.queue}):"
+                                   f" {e!r}")
+                    warned = True
+            await asyncio.sleep(self._poll_interval)
+
+    async def _receive_batch(self) -> list[dict]:
+        batch_size = self._props.batch_size
+        deadline = time.monotonic() + self._props.batching_window
+        messages = []
+        try:
+            while len(messages) < batch_size:
+                self._receiving += 1
+                try:
+                    res = await self._call(
+                        self._client.receive_message, QueueUrl=self._url,
+                        MaxNumberOfMessages=min(10,
+                                                batch_size - len(messages)),
+                        AttributeNames=["All"],
+                        MessageAttributeNames=["All"])
+                finally:
+                    self._receiving -= 1
+                received = res.get("Messages", [])
+                messages += received
+                self._held += len(received)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not received:
+                    await asyncio.sleep(min(self._poll_interval, remaining))
+        except BaseException:
+            self._held -= len(messages)
+            raise
+        return messages
+
+    async def _process(self, messages: list[dict]):
+        event = build_sqs_event(messages, self._arn)
+        try:
+            res = await self._invoke(self._props, event)
+        except Exception as e:
+            # whole batch is retried after visibility timeout
+            logger.error(f"sqs triggered lambda error"
+                         f" ({self._props.queue}): {e!r}")
+            return
+        ids = {m["MessageId"] for m in messages}
+        failed = set()
+        if self._props.report_failures and isinstance(res, dict):
+            failures = res.get("batchItemFailures") or []
+            failed = {f.get("itemIdentifier") for f in failures
+                      if isinstance(f, dict)}
+            if len(failed) != len(failures) or not failed <= ids:
+                # invalid response is regarded as failure of whole batch
+                logger.warning("invalid batchItemFailures. batch is retried")
+                return
+        done = [m for m in messages if m["MessageId"] not in failed]
+        for i in range(0, len(done), 10):
+            entries = [{"Id": str(n), "ReceiptHandle": m["ReceiptHandle"]}
+                       for n, m in enumerate(done[i:i + 10])]
+            await self._call(self._client.delete_message_batch,
+                             QueueUrl=self._url, Entries=entries)
+        if failed:
+            logger.info(f"sqs: {len(failed)} messages failed"
+                        f" ({self._props.queue})")
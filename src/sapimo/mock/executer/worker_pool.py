@@ -0,0 +1,165 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager
+from typing import Callable, Hashable
+
+from sapimo.exceptions import LambdaTimeoutError, PoolSaturatedError
+
+
+class GateTicket:
+    """ one invocation which enters EnvGate """
+
+    def __init__(self):
+        self.entered = False
+        self.abandoned = False  # timed out (gate doesn't wait for it)
+
+
+class EnvGate:
+    """
+        lambda code shares os.environ and sys.path of this process
+            - invocations with the same key (same function and environment)
+              run concurrently
+            - invocations with another key wait until all of them finish
+            - context is entered by the first one and exited by the last one
+            - abandoned (timed out) invocations are not waited for
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._key = None
+        self._count = 0
+        self._context = None
+        self._waiting: dict[Hashable, int] = {}
+
+    def _can_enter(self, key: Hashable) -> bool:
+        if self._key is None:
+            return True
+        # don't starve waiting functions
+        others = sum(n for k, n in self._waiting.items() if k != key)
+        return self._key == key and others == 0
+
+    def enter(self, key: Hashable,
+              context_factory: Callable[[], AbstractContextManager],
+              ticket: GateTicket) -> bool:
+        """ return False if ticket is abandoned before entering """
+        with self._cond:
+            if not self._can_enter(key):
+                self._waiting[key] = self._waiting.get(key, 0) + 1
+                try:
+                    self._cond.wait_for(
+                        lambda: ticket.abandoned or self._can_enter(key))
+                finally:
+                    self._waiting[key] -= 1
+                    if not self._waiting[key]:
+                        del self._waiting[key]
+                    self._cond.notify_all()
+            if ticket.abandoned:
+                return False
+            if self._count == 0:
+                context = context_factory()
+                context.__enter__()
+                self._key = key
+                self._context = context
+            self._count += 1
+            ticket.entered = True
+            return True
+
+    def exit(self, ticket: GateTicket):
+        with self._cond:
+            if not ticket.abandoned:
+                self._leave()
+            ticket.entered = False
+
+    def abandon(self, ticket: GateTicket):
+        """ the invocation no longer holds the gate (its thread may run) """
+        with self._cond:
+            if ticket.abandoned:
+                return
+            ticket.abandoned = True
+            if ticket.entered:
+                self._leave()
+            self._cond.notify_all()
+
+    def _leave(self):
+        self._count -= 1
+        if self._count == 0:
+            context, self._context = self._context, None
+            self._key = None
+            try:
+                context.__exit__(None, None, None)
+            finally:
+                self._cond.notify_all()
+
+
+class WorkerPool:
+    """
+        run lambda handlers on worker threads (not on the event loop)
+            - env is process-global: handlers of different keys
+              (functions) don't run in parallel (see EnvGate).
+              ExecutionMode: process runs them in parallel
+            - size: number of worker threads
+            - max_pending: number of invocations which can wait for a worker
+              (PoolSaturatedError is raised if exceeded)
+    """
+
+    def __init__(self, size: int = None, max_pending: int = 100):
+        self.size = size or min(32, (os.cpu_count() or 1) + 4)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.size, thread_name_prefix="sapimo-lambda")
+        self._gate = EnvGate()
+        self._running = 0  # running + pending (only touched on event loop)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def run(self, key: Hashable,
+                  context_factory: Callable[[], AbstractContextManager],
+                  func: Callable, *args, timeout: float = None):
+        """
+            run func(*args) in context which is shared by the same key
+            - timeout includes the wait for a worker and for the context
+              (LambdaTimeoutError is raised, but the thread can't be killed.
+               it doesn't hold the context any more)
+        """
+        if self._running >= self.size + self.max_pending:
+            raise PoolSaturatedError(
+                f"too many invocations ({self._running} running or pending)")
+        loop = asyncio.get_running_loop()
+        ticket = GateTicket()
+        self._running += 1
+        # contextvars (e.g. request id of logs) are passed to the thread
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(
+            self._executor, context.run, self._run_in_gate,
+            key, context_factory, func, args, ticket)
+        # count until the thread is finished (even if timed out)
+        future.add_done_callback(self._on_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._gate.abandon(ticket)
+            raise LambdaTimeoutError(
+                f"Task timed out after {timeout:.2f} seconds")
+        except asyncio.CancelledError:
+            self._gate.abandon(ticket)
+            raise
+
+    def _on_done(self, _):
+        self._running -= 1
+
+    def _run_in_gate(self, key, context_factory, func, args,
+                     ticket: GateTicket):
+        if not self._gate.enter(key, context_factory, ticket):
+            return None  # timed out before started
+        try:
+            return func(*args)
+        finally:
+            self._gate.exit(ticket)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -4,12 +4,17 @@
 """
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
 from .executer.lambda_invoker import LambdaInvoker
 from .mediator_route import MediatorRoute
 from .mock_manager import MockManager
-from sapimo.constants import CONFIG_FILE
+from .metrics import metrics
+from .sync_scheduler import SyncScheduler
+from sapimo.constants import CONFIG_FILE, SNAPSHOT_FILE
+from sapimo.parser.config_parser import ConfigParser
 from sapimo.utils import LogManager
 logger = LogManager.setup_logger(__file__)
 
@@ -18,19 +23,34 @@ if not CONFIG_FILE.exists():
     exit(0)
 
 
-mock = MockManager(config_file=CONFIG_FILE)
+# config.yaml is parsed once
+config = ConfigParser(CONFIG_FILE)
+mock = MockManager(config_file=CONFIG_FILE, config=config)
+invoker = LambdaInvoker(CONFIG_FILE, config=config)
+scheduler = SyncScheduler(
+    mock, debounce=mock.settings.get("SyncDebounce", 0.2),
+    max_staleness=mock.settings.get("SyncMaxStaleness", 2.0))
+invoker.sync_scheduler = scheduler
 
 
 def on_start():
     """ start mock and setup aws resources from local dir"""
     mock.start()
     logger.info("mock start")
-    mock.init_data()
+    mock.init_data(SNAPSHOT_FILE)
+    invoker.start()
+    # s3 event -> triggered lambda (seeded objects don't trigger)
+    mock.add_s3_listener(invoker.notify_s3)
+    scheduler.start()
 
 
 def on_stop():
     """ stop mock and sync local"""
+    scheduler.stop()
+    invoker.stop()
     mock.sync()
+    mock.flush()
+    mock.save_snapshot(SNAPSHOT_FILE)
     mock.stop()
     logger.info("mock stop")
 
@@ -43,7 +63,74 @@ api.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+
+# sapimo's own endpoints (registered before MediatorRoute is set)
+@api.get("/_sapimo/metrics")
+def get_metrics(req: Request, format: str = "json"):
+    """ latency of each phase per route (json or prometheus text) """
+    if format == "prometheus" or "text/plain" in req.headers.get("accept", ""):
+        return PlainTextResponse(metrics.to_prometheus(),
+                                 media_type="text/plain; version=0.0.4")
+    return metrics.to_dict()
+
+
+@api.delete("/_sapimo/metrics")
+def reset_metrics():
+    metrics.reset()
+    return {"message": "metrics reset"}
+
+
+@api.post("/_sapimo/sync")
+async def flush_sync(wait: bool = False, timeout: float = 30.0):
+    """
+        sync moto -> local dir now (e.g. before checking local files)
+        wait: wait for s3/sqs triggered lambdas (and lambdas they trigger)
+              up to timeout [s] before sync
+        failed sync returns 500 (and is retried in background)
+    """
+    if wait and not await invoker.drain(timeout):
+        logger.warning("triggered lambdas are still running. sync anyway")
+    try:
+        await run_in_threadpool(scheduler.flush)
+    except Exception as e:
+        logger.exception("sync error")
+        return JSONResponse(status_code=500,
+                            content={"message": f"sync failed: {e}"})
+    return {"message": "synced"}
+
+
+@api.get("/_sapimo/invocations")
+def get_invocations(route: str = None, function: str = None,
+                    status: str = None, limit: int = 50, logs: bool = False):
+    """
+        recent invocations (newest first)
+        route: "GET /hello" or "/hello", function: import path of handler
+        status: ok, error or timeout, logs: include captured logs
+    """
+    return invoker.invocations.query(route=route, function=function,
+                                     status=status, limit=limit, logs=logs)
+
+
+@api.get("/_sapimo/invocations/{request_id}")
+def get_invocation(request_id: str):
+    """ captured logs, print output and error of one invocation """
+    res = invoker.invocations.get(request_id)
+    if res is None:
+        return JSONResponse(status_code=404,
+                            content={"message": "invocation is not found"})
+    return res
+
+
+@api.post("/_sapimo/reload")
+def reload_routes():
+    """ re-read 'paths' of config (e.g. after changing Timeout or Handler) """
+    invoker.reload()
+    return {"message": "routes reloaded"}
+
+
 # fast api settings
-MediatorRoute.lambda_manager = LambdaInvoker(CONFIG_FILE)
+MediatorRoute.lambda_manager = invoker
 MediatorRoute.data_manager = mock
+MediatorRoute.sync_scheduler = scheduler
 api.router.route_class = MediatorRoute
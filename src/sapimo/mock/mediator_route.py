@@ -1,3 +1,4 @@
+import time
 from typing import Callable
 from logging import DEBUG
 from enum import Enum
@@ -7,6 +8,7 @@ from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from sapimo.utils import LogManager
+from sapimo.mock.metrics import metrics
 
 logger = LogManager.setup_logger(__file__, level=DEBUG)
 
@@ -23,7 +25,7 @@ class MediatorRoute(APIRoute):
         custom APIRoute
             - generate lambda event from request
             - switch the return value depending on the mode
-            - s3 and dynamo sync (moto <-> local dir)
+            - request s3 and dynamo sync (moto <-> local dir)
     """
 
     return_mode = ReturnMode.Default
@@ -33,6 +35,8 @@ class MediatorRoute(APIRoute):
         original_route_handler = super().get_route_handler()
 
         async def custom_handler(req: Request) -> Response:
+            started = time.perf_counter()
+            route = f"{req.method} {self.path}"
 
             response: Response = await original_route_handler(req)
             body = response.body.decode("utf-8")
@@ -48,20 +52,8 @@ class MediatorRoute(APIRoute):
                 logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]==========")
                 logger.info(f"{req.method}:{req.url} ->lambda execute")
                 res = await self.lambda_manager.run_by_api(req)
-                self.data_manager.sync()
-                changed = self.data_manager.get_change("s3")
-                updated = changed.get("updated")
-                deleted = changed.get("deleted")
-                while updated or deleted:
-                    await self.lambda_manager.run_by_trigger(updated, deleted)
-                    self.data_manager.sync()
-                    s3_changed = self.data_manager.get_change("s3")
-                    updated = s3_changed.get("updated", None)
-                    deleted = s3_changed.get("deleted", None)
-                    print("---updated---")
-                    print(updated)
-                    print("---deleted---")
-                    print(deleted)
+                # moto -> local dir (and s3 trigger) on background
+                self.sync_scheduler.request()
 
             elif return_val == ReturnMode.Mock:
                 logger.info(f"{req.method}:{req.url} -> return mock")
@@ -71,7 +63,9 @@ class MediatorRoute(APIRoute):
                     res = response
                 logger.info(f"response: status={res.status_code}, body={res.body}")
             elif return_val == ReturnMode.Example:
-                res = await self.lambda_manager.example(req, status=self.return_code)
+                res = await self.lambda_manager.get_example(
+                    req, status=self.return_code)
+            metrics.observe(route, "total", time.perf_counter() - started)
             return res
         return custom_handler
 
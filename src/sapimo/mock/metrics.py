@@ -0,0 +1,128 @@
+"""
+    per route latency metrics of the mock server
+        phases: event (request -> event), authorizer, init (import),
+                handler, response (lambda result -> response), sync
+"""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# [s] (same as prometheus client default)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+           1.0, 2.5, 5.0, 7.5, 10.0)
+PHASES = ("event", "authorizer", "init", "handler", "response", "sync",
+          "total")
+
+
+class Histogram:
+    """
+        cumulative buckets (for prometheus)
+        and recent samples (for percentiles)
+    """
+
+    def __init__(self, samples: int = 1024):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=samples)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self._samples.append(value)
+
+    def percentile(self, p: float) -> float:
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)  # nearest rank
+        return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        res = []
+        total = 0
+        for le, count in zip([*map(str, BUCKETS), "+Inf"], self.counts):
+            total += count
+            res.append((le, total))
+        return res
+
+    def summary(self) -> dict:
+        """ [ms] """
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Metrics:
+    """ histograms per (route, phase). route is like "GET /hello" """
+
+    def __init__(self):
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, phase: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((route, phase))
+            if histogram is None:
+                histogram = Histogram()
+                self._histograms[(route, phase)] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def measure(self, route: str, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(route, phase, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def _sorted(self) -> list:
+        def key(item):
+            (route, phase), _ = item
+            order = PHASES.index(phase) if phase in PHASES else len(PHASES)
+            return route, order, phase
+        return sorted(self._histograms.items(), key=key)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            items = self._sorted()
+            res = {}
+            for (route, phase), histogram in items:
+                res.setdefault(route, {})[phase] = histogram.summary()
+        return {"routes": res}
+
+    def to_prometheus(self) -> str:
+        name = "sapimo_phase_duration_seconds"
+        lines = [f"# HELP {name} duration of each phase of mock request",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for (route, phase), histogram in self._sorted():
+                labels = f'route="{_escape(route)}",phase="{phase}"'
+                for le, count in histogram.cumulative():
+                    bucket_labels = f'{labels},le="{le}"'
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {count}")
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')\
+        .replace("\n", "\\n")
+
+
+metrics = Metrics()
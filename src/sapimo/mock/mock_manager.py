@@ -1,21 +1,30 @@
 from abc import ABC, abstractmethod
 import hashlib
+import time
 from pathlib import Path
 import os
 import json
 import logging
 import base64
-from typing import Union, List
-from decimal import Decimal, InvalidOperation, Rounded
+import pickle
+from typing import Callable, Optional
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
+import moto
 from botocore.exceptions import ClientError
+from boto3.dynamodb.types import Binary
 from moto import mock_s3, mock_dynamodb, mock_sqs, mock_sns, mock_ses
 
 from sapimo.constants import WORKING_DIR
 from sapimo.parser.config_parser import ConfigParser
+from sapimo.mock.s3_journal import S3ChangeJournal
+from sapimo.mock.dynamo_journal import DynamoChangeJournal
+from sapimo.mock.dynamo_loader import iter_items
+from sapimo.utils import LogManager
 
-logger = logging.getLogger(__file__)
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
 
 
 class AwsMock(ABC):
@@ -33,16 +42,45 @@ class AwsMock(ABC):
         """
         pass
 
+    def flush(self):
+        """ persist local data (called before 'mock.stop') """
+        pass
+
+    # snapshot of moto backends (only for the mock whose 'snapshot' is True)
+    snapshot = False
+
+    def fingerprint(self) -> Optional[str]:
+        """
+            digest of local data which the backend state is made from
+            (None: local data is changed and snapshot can't be used)
+        """
+        return None
+
+    def snapshot_state(self):
+        """ additional state of this object saved with backends """
+        return None
+
+    def restore(self, state):
+        """
+            called instead of 'init_data' when backends are restored
+            from snapshot
+        """
+        pass
+
+    # True: local data is changed from snapshot, but backends are restored
+    # and 'init_data' (after 'restore') loads only the changed data
+    incremental = False
+
     @abstractmethod
     def sync() -> dict:
         pass
 
     @staticmethod
-    def CreateMock(name: str, config: dict):
+    def CreateMock(name: str, config: dict, settings: dict):
         if name == "s3":
-            return S3Mock(config)
+            return S3Mock(config, settings)
         elif name == "dynamodb":
-            return DynamoMock(config)
+            return DynamoMock(config, settings)
         elif name == "sqs":
             return SqsMock(config)
         elif name == "sns":
@@ -68,13 +106,28 @@ class SesMock(AwsMock):
 
 
 class SqsMock(AwsMock):
+    """
+        local dir: sqs/<queue>/<file> (body of each message)
+            - files of the local dir are sent in the order of the index
+              (sqs_index.json: { queue: { MessageId: file name } },
+               files which are not in the index are sent after them
+               in name order)
+            - fixture files keep their names.
+              messages sent by lambda are written to <MessageId>.txt
+            - messages are read from moto backend directly
+              (in-flight and delayed messages are included,
+               visibility of messages is not changed)
+            - only files of added/removed messages are written/deleted
+    """
     service_name = "sqs"
 
     def __init__(self, config: dict):
         self._mock = mock_sqs()
         self._config = config
         self._sqs_local_path = WORKING_DIR / "sqs"
-        self._last_messages = {}
+        self._index_path = WORKING_DIR / "sqs_index.json"
+        # mirrored files in queue order { queue: { MessageId: file name } }
+        self._mirrored: dict[str, dict[str, str]] = {}
 
         # create local dir, if not exist
         self._sqs_local_path.mkdir(exist_ok=True)
@@ -85,9 +138,10 @@ class SqsMock(AwsMock):
         """
         self._client = boto3.client("sqs")
         self._url_map = {}
+        previous = self._load_index()
         for key, value in self._config.items():
-            name = value.pop("QueueName", key)
-            tags = {t["Key"]: t["Value"] for t in value.pop("Tags", [])}
+            name = value.get("QueueName", key)
+            tags = {t["Key"]: t["Value"] for t in value.get("Tags", [])}
             atrs = ["DelaySeconds", "MaximumMessageSize",
                     "MessageRetentionPeriod", "ReceiveMessageWaitTimeSeconds",
                     "RedrivePolicy"]
@@ -95,56 +149,118 @@ class SqsMock(AwsMock):
             url = self._client.create_queue(QueueName=name,
                                             Attributes=attributes,
                                             tags=tags)["QueueUrl"]
-            self._last_messages[key] = []
             self._url_map[key] = url
+            self._mirrored[key] = {}
 
             # send message in local
             queue_path = self._sqs_local_path / key
             queue_path.mkdir(exist_ok=True)
-            files = sorted([f for f in queue_path.iterdir() if f.is_file()])
+            order = {file_name: i for i, file_name
+                     in enumerate(previous.get(key, {}).values())}
+            files = sorted([f for f in queue_path.iterdir() if f.is_file()],
+                           key=lambda f: (order.get(f.name, len(order)),
+                                          f.name))
             for file in files:
                 with open(file, "r") as f:
                     msg = f.read()
-                self._client.send_message(QueueUrl=url, MessageBody=msg)
-                file.unlink()
+                message_id = self._client.send_message(
+                    QueueUrl=url, MessageBody=msg)["MessageId"]
+                self._mirrored[key][message_id] = file.name
+        self._save_index()
+
+    def _load_index(self) -> dict:
+        if not self._index_path.exists():
+            return {}
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f).get("queues", {})
+        except (ValueError, AttributeError):
+            logger.warning(f"{self._index_path.name} is broken. ignored")
+            return {}
+
+    def _save_index(self):
+        with open(self._index_path, "w") as f:
+            json.dump({"queues": self._mirrored}, f)
+
+    def _backend_queue(self, queue: str):
+        """ moto Queue object of the queue """
+        url = self._url_map[queue]
+        # https://sqs.<region>.amazonaws.com/<account>/<name>
+        account, name = url.split("/")[-2:]
+        region = url.split("/")[2].split(".")[1]
+        return self._mock.backends[account][region].queues.get(name)
+
+    @staticmethod
+    def _all_messages(backend_queue) -> list:
+        """
+            all messages of moto Queue (in-flight and delayed included)
+            sqs api can't read messages without changing their visibility.
+            '_messages' of moto 4 ("^4" in pyproject) is read
+            ('messages' has only visible ones. tested by test_sqs_mock)
+        """
+        return list(backend_queue._messages)
 
     def sync(self) -> dict:
         """
             sync  (sqs message -> local dir)
         """
+        res_updated = {}
+        res_deleted = {}
         for queue in self._config.keys():
-            res = self._client.receive_message(QueueUrl=self._url_map[queue],
-                                               VisibilityTimeout=0,
-                                               MaxNumberOfMessages=10)
-            queue_path: Path = self._sqs_local_path / queue
-            messages = res.get("Messages", [])
-            if not messages:
-                continue
-            # msgs = {m["MessageId"]: m.get("Body", "") for m in messages }
-            msgs = [m["Body"] for m in messages if "Body" in m]
-            if msgs == self._last_messages[queue]:
+            backend_queue = self._backend_queue(queue)
+            if backend_queue is None:  # deleted by lambda
+                messages = []
+            else:
+                messages = self._all_messages(backend_queue)
+            mirrored = self._mirrored[queue]
+            current = {m.id for m in messages}
+            added = [m for m in messages if m.id not in mirrored]
+            deleted = [i for i in mirrored if i not in current]
+            if not added and not deleted:
                 continue
 
-            # detect change message
-            for file in queue_path.iterdir():
-                if file.is_file():
-                    file.unlink()
-
-            for i, body in enumerate(msgs):
-                with open(queue_path / (str(i).zfill(4)+".txt"), "w") as f:
-                    f.write(body)
-            self._last_messages[queue] = msgs
-            return {}  # FIXME
+            queue_path: Path = self._sqs_local_path / queue
+            queue_path.mkdir(exist_ok=True)
+            for message_id in deleted:
+                (queue_path / mirrored.pop(message_id)).unlink(missing_ok=True)
+            for message in added:
+                file_name = f"{message.id}.txt"
+                with open(queue_path / file_name, "w") as f:
+                    f.write(message.original_body)
+                mirrored[message.id] = file_name
+            if added:
+                res_updated[queue] = [m.id for m in added]
+            if deleted:
+                res_deleted[queue] = deleted
+        if res_updated or res_deleted:
+            self._save_index()
+        return {"updated": res_updated, "deleted": res_deleted}
 
 
 class S3Mock(AwsMock):
     service_name = "s3"
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, settings: dict):
         self._mock = mock_s3()
         self._config = config
         self._s3_local_path = WORKING_DIR / "s3"
-        self._hashes = {}
+        # metadata index { bucket: { key: (ETag, Size) } }
+        # (ETag of single part upload is md5 of the object)
+        self._index = {}
+        # "journal": sync only keys written/deleted after the last sync
+        # "scan": list all buckets and compare every object
+        self._sync_mode = settings.get("S3SyncMode", "journal")
+        self._journal = S3ChangeJournal()
+        # seeding (local dir -> s3 bucket)
+        self._seed_workers = settings.get("S3SeedWorkers", 8)
+        self._multipart_threshold = settings.get(
+            "S3MultipartThreshold", 8 * 1024 * 1024)
+        self._multipart_chunksize = settings.get(
+            "S3MultipartChunksize", 8 * 1024 * 1024)
+        # fixture manifest { "bucket/key": {"size", "mtime", "etag"} }
+        # (persisted to detect changed local files without reading them)
+        self._manifest_path = WORKING_DIR / "s3_manifest.json"
+        self._manifest = self._load_manifest()
 
         # create local dir, if not exist
         self._s3_local_path.mkdir(exist_ok=True)
@@ -152,6 +268,40 @@ class S3Mock(AwsMock):
             bucket_path = self._s3_local_path / bucket
             bucket_path.mkdir(exist_ok=True)
 
+    def start(self):
+        super().start()
+        # journal also notifies s3 events (for trigger)
+        self._journal.start()
+
+    def add_listener(self, listener: Callable):
+        """ listener(event_name, bucket, key, fake_key) """
+        self._journal.add_listener(listener)
+
+    def stop(self):
+        self._journal.stop()
+        super().stop()
+
+    def flush(self):
+        self._save_manifest()
+
+    snapshot = True
+    incremental = True
+
+    def fingerprint(self) -> Optional[str]:
+        if self.fixtures_changed():
+            return None
+        data = json.dumps(self._manifest, sort_keys=True)
+        return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+    def snapshot_state(self):
+        return self._index
+
+    def restore(self, state):
+        self._s3 = boto3.resource("s3")
+        self._client = boto3.client("s3")
+        self._index = state
+        self._journal.pop()
+
     def init_data(self):
         """
             upload file (local dir -> s3 bucket)
@@ -159,24 +309,157 @@ class S3Mock(AwsMock):
         self._s3 = boto3.resource("s3")
         self._client = boto3.client("s3")
 
+        self._index = {}
+        # buckets may be restored from snapshot
+        # (create_bucket of us-east-1 replaces the existing bucket)
+        buckets = [b["Name"] for b in self._client.list_buckets()["Buckets"]]
+        for dir in self._s3_local_path.iterdir():
+            if dir.is_dir():  # regard dir as a bucket, file is ignored
+                if dir.name not in buckets:
+                    self._s3.create_bucket(Bucket=dir.name)
+                self._index[dir.name] = {}
+        files = self._list_fixtures()
+        # objects already in buckets (e.g. restored from snapshot)
+        objects = {bucket_name: self._list_objects(bucket_name)
+                   for bucket_name in self._index}
+        manifest = {}
+        changed = []
+        for f in files:
+            bucket_name, key, _, stat = f
+            meta = objects[bucket_name].pop(key, None)
+            entry = self._manifest.get(bucket_name + "/" + key)
+            if self._is_unchanged(*f)\
+                    and meta == (entry["etag"], stat.st_size):
+                # same as the manifest: file is not read
+                self._index[bucket_name][key] = meta
+                manifest[bucket_name + "/" + key] = entry
+            else:
+                changed.append(f)
+        # objects whose local file is removed
+        for bucket_name, keys in objects.items():
+            for key in keys:
+                self._client.delete_object(Bucket=bucket_name, Key=key)
+        logger.info(f"s3 fixtures: {len(files)} files"
+                    f" ({len(changed)} changed since last start)")
+        self._manifest = manifest
+        self._seed(changed)
+        self._save_manifest()
+
+        # local files are already synced
+        self._journal.pop()
+
+    def _list_objects(self, bucket_name: str) -> dict:
+        """ return { key: (ETag, Size) } of the bucket """
+        paginator = self._client.get_paginator("list_objects_v2")
+        return {obj["Key"]: (obj["ETag"], obj["Size"])
+                for page in paginator.paginate(Bucket=bucket_name)
+                for obj in page.get("Contents", [])}
+
+    def fixtures_changed(self) -> bool:
+        """
+            True if local files are changed from the manifest
+            (compare only size and mtime, file is not read)
+        """
+        files = self._list_fixtures()
+        if len(files) != len(self._manifest):
+            return True
+        return not all(self._is_unchanged(*f) for f in files)
+
+    def _list_fixtures(self) -> list:
+        """ return [(bucket_name, key, file, stat)] of local dir """
+        files = []
         for dir in self._s3_local_path.iterdir():
             if dir.is_file():
                 continue  # regard dir as a bucket, file is ignored
-            bucket_name = dir.name
-            self._s3.create_bucket(Bucket=bucket_name)
-            bucket = self._s3.Bucket(bucket_name)
-            self._hashes[bucket_name] = {}
-            bucket_path = self._s3_local_path / bucket_name
             for file in dir.glob("**/*"):
                 if file.is_dir():
                     continue
-                with open(file, "rb") as f:
-                    data = f.read()
-                    key = str(file).replace(str(bucket_path), "")[1:]
-                    # print(key)
-                    bucket.Object(key).put(Body=data)
-                    hash = hashlib.md5(data).hexdigest()
-                    self._hashes[bucket_name][key] = hash
+                key = file.relative_to(dir).as_posix()
+                files.append((dir.name, key, file, file.stat()))
+        return files
+
+    def _is_unchanged(self, bucket_name: str, key: str, file: Path,
+                      stat: os.stat_result) -> bool:
+        entry = self._manifest.get(bucket_name + "/" + key)
+        return entry is not None and entry["size"] == stat.st_size\
+            and entry["mtime"] == stat.st_mtime_ns
+
+    def _load_manifest(self) -> dict:
+        if not self._manifest_path.exists():
+            return {}
+        try:
+            with open(self._manifest_path, "r") as f:
+                return json.load(f).get("files", {})
+        except (ValueError, AttributeError):
+            logger.warning(f"{self._manifest_path.name} is broken. ignored")
+            return {}
+
+    def _save_manifest(self):
+        with open(self._manifest_path, "w") as f:
+            json.dump({"files": self._manifest}, f)
+
+    def _update_manifest(self, bucket_name: str, key: str, etag: str,
+                         stat: os.stat_result):
+        self._manifest[bucket_name + "/" + key] = {
+            "size": stat.st_size, "mtime": stat.st_mtime_ns, "etag": etag}
+
+    def _seed(self, files: list):
+        """ upload files on thread pool and report progress """
+        started = time.perf_counter()
+        total = len(files)
+        step = max(total // 10, 1)
+        total_size = 0
+        with ThreadPoolExecutor(max_workers=self._seed_workers) as executor:
+            futures = {executor.submit(self._upload_file, *f[:3]): f[3]
+                       for f in files}
+            for done, future in enumerate(as_completed(futures), 1):
+                bucket_name, key, meta = future.result()
+                self._index[bucket_name][key] = meta
+                self._update_manifest(bucket_name, key, meta[0],
+                                      futures[future])
+                total_size += meta[1]
+                if done % step == 0 and done != total:
+                    logger.info(f"s3 seeding: {done}/{total} files")
+        elapsed = time.perf_counter() - started
+        logger.info(f"s3 seeded {total} files ({total_size} bytes)"
+                    f" in {elapsed:.2f}s")
+
+    def _upload_file(self, bucket_name: str, key: str, file: Path):
+        """
+            upload one file
+            - small file: single put
+            - large file: multipart upload (read by chunk)
+
+            return (bucket_name, key, (ETag, Size))
+        """
+        size = file.stat().st_size
+        with open(file, "rb") as f:
+            if size < self._multipart_threshold:
+                res = self._client.put_object(Bucket=bucket_name, Key=key,
+                                              Body=f.read())
+                return bucket_name, key, (res["ETag"], size)
+
+            upload_id = self._client.create_multipart_upload(
+                Bucket=bucket_name, Key=key)["UploadId"]
+            parts = []
+            try:
+                while True:
+                    chunk = f.read(self._multipart_chunksize)
+                    if not chunk:
+                        break
+                    number = len(parts) + 1
+                    res = self._client.upload_part(
+                        Bucket=bucket_name, Key=key, PartNumber=number,
+                        UploadId=upload_id, Body=chunk)
+                    parts.append({"ETag": res["ETag"], "PartNumber": number})
+                res = self._client.complete_multipart_upload(
+                    Bucket=bucket_name, Key=key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts})
+            except ClientError:
+                self._client.abort_multipart_upload(
+                    Bucket=bucket_name, Key=key, UploadId=upload_id)
+                raise
+        return bucket_name, key, (res["ETag"], size)
 
     def sync(self) -> dict:
         """
@@ -184,59 +467,135 @@ class S3Mock(AwsMock):
 
             return ({ bucket:[updated_keys] },{ bucket:[deleted_keys] })
         """
+        if self._sync_mode == "journal":
+            return self._sync_journal()
+        self._journal.pop()  # all objects are compared
+        return self._sync_all()
+
+    def _sync_journal(self) -> dict:
+        """
+            sync only keys recorded in journal
+            (if failed, keys which are not mirrored are recorded again)
+        """
+        res_updated = {}
+        res_deleted = {}
+        changes = self._journal.pop()
+        done = set()  # (bucket, key) mirrored to local dir
+        try:
+            for bucket_name, keys in changes.items():
+                bucket_path = self._get_bucket_path(bucket_name)
+                updated = []
+                deleted = []
+                for key in sorted(keys):
+                    self._sync_key(bucket_name, bucket_path, key,
+                                   updated, deleted)
+                    done.add((bucket_name, key))
+                if updated:
+                    res_updated[bucket_name] = updated
+                if deleted:
+                    res_deleted[bucket_name] = deleted
+        except BaseException:
+            for bucket_name, keys in changes.items():
+                self._journal.record(bucket_name)
+                for key in keys:
+                    if (bucket_name, key) not in done:
+                        self._journal.record(bucket_name, key)
+            raise
+        return {"updated": res_updated, "deleted": res_deleted}
+
+    def _sync_key(self, bucket_name: str, bucket_path: Path, key: str,
+                  updated: list, deleted: list):
+        index = self._index[bucket_name]
+        try:
+            res = self._client.get_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code not in ["NoSuchKey", "NoSuchBucket"]:
+                raise
+            if key in index:
+                self._remove_local(bucket_path, key)
+                del index[key]
+                deleted.append(key)
+            return
+        meta = (res["ETag"], res["ContentLength"])
+        if index.get(key) != meta:
+            self._write_local(bucket_path, key, res["Body"].read(), meta[0])
+            index[key] = meta
+            updated.append(key)
+
+    def _sync_all(self) -> dict:
+        """
+            list all buckets and compare metadata (ETag, Size) of objects
+            (object body is downloaded only if metadata is changed)
+        """
         buckets = [m["Name"] for m in self._client.list_buckets()["Buckets"]]
-        # print(buckets)
+        paginator = self._client.get_paginator("list_objects_v2")
         res_updated = {}
         res_deleted = {}
         for bucket_name in buckets:
-            bucket_path = self._s3_local_path / bucket_name
-            if not bucket_path.exists():
-                bucket_path.mkdir()
-                self._hashes[bucket_name] = {}
-            bucket = self._s3.Bucket(bucket_name)
-            keys = [obj.key for obj in bucket.objects.all()]
-            new_hashes = {}
+            bucket_path = self._get_bucket_path(bucket_name)
+            index = self._index[bucket_name]
+            new_index = {}
             updated = []
-            for key in keys:
-                data = bucket.Object(key).get()["Body"].read()
-                hash = hashlib.md5(data).hexdigest()
-                new_hashes[key] = hash
-
-                if key not in self._hashes[bucket_name]\
-                        or self._hashes[bucket_name][key] != hash:
-                    # if s3 file is updated/created, update/create local file
-                    key_parts = key.split("/")
-                    target_path: Path = bucket_path
-                    for k in key_parts:
-                        if not target_path.exists():
-                            target_path.mkdir()
-                        target_path = target_path / k
-                    with open(target_path, "wb") as f:
-                        f.write(data)
-                    updated.append(key)
+            for page in paginator.paginate(Bucket=bucket_name):
+                for obj in page.get("Contents", []):
+                    key = obj["Key"]
+                    meta = (obj["ETag"], obj["Size"])
+                    new_index[key] = meta
+                    if index.get(key) != meta:
+                        # if s3 file is updated/created,
+                        # update/create local file
+                        res = self._client.get_object(Bucket=bucket_name,
+                                                      Key=key)
+                        self._write_local(bucket_path, key,
+                                          res["Body"].read(), meta[0])
+                        updated.append(key)
             if updated:
                 res_updated[bucket_name] = updated
 
             # remove deleted file
-            deleted = set(
-                self._hashes[bucket_name].keys()) - set(new_hashes.keys())
+            deleted = set(index.keys()) - set(new_index.keys())
             for key in deleted:
-                target_path = str(bucket_path) + "/" + key
-                if os.path.exists(target_path):
-                    os.remove(target_path)
-            self._hashes[bucket_name] = new_hashes
+                self._remove_local(bucket_path, key)
+            self._index[bucket_name] = new_index
             if deleted:
                 res_deleted[bucket_name] = list(deleted)
         return {"updated": res_updated, "deleted": res_deleted}
 
+    def _get_bucket_path(self, bucket_name: str) -> Path:
+        bucket_path = self._s3_local_path / bucket_name
+        if not bucket_path.exists():
+            bucket_path.mkdir()
+        self._index.setdefault(bucket_name, {})
+        return bucket_path
+
+    def _write_local(self, bucket_path: Path, key: str, data: bytes,
+                     etag: str):
+        target_path: Path = bucket_path / key
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(target_path, "wb") as f:
+            f.write(data)
+        self._update_manifest(bucket_path.name, key, etag, target_path.stat())
+
+    def _remove_local(self, bucket_path: Path, key: str):
+        target_path = str(bucket_path) + "/" + key
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        self._manifest.pop(bucket_path.name + "/" + key, None)
+
 
 class DynamoMock(AwsMock):
     service_name = "dynamodb"
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, settings: dict):
         self._mock = mock_dynamodb()
         self._config = config
         self._local_dynamo_path = WORKING_DIR / "dynamodb"
+        self._seed_workers = settings.get("DynamoSeedWorkers", 4)
+        # { table: { primary key: hash of item } }
+        self._hashes = {}
+        # keys written after the last sync (only they are read on sync)
+        self._journal = DynamoChangeJournal()
 
         # create local dir, if not exist
         self._local_dynamo_path.mkdir(exist_ok=True)
@@ -244,141 +603,266 @@ class DynamoMock(AwsMock):
             table_path = self._local_dynamo_path / table
             table_path.mkdir(exist_ok=True)
 
-    def init_data(self):
-        self._dynamodb = boto3.resource('dynamodb')
-        for name, props in self._config.items():
-            self._dynamodb.create_table(
-                **props  # ok?
-                # TableName=name,
-                # KeySchema=props["KeySchema"],
-                # AttributeDefinitions=props["AttributeDefinitions"],
-                # ProvisionedThroughput=props["ProvisionedThroughput"]
-            )
-            table = self._dynamodb.Table(name)
-            file: Path = self._local_dynamo_path / name / "data.json"
-            csv_file: Path = self._local_dynamo_path / name / "results.csv"
-            data = []
+    def start(self):
+        super().start()
+        self._journal.start()
 
-            if file.exists():
-                if file.stat().st_size < 4:  # skip if empty file
-                    print(f"{file.parent + file.name} is empty.")
-                else:
-                    with open(file, "r") as f:
-                        data = json.load(f, parse_float=Decimal)
-                    if not isinstance(data, list):
-                        data = [data]
-            elif csv_file.exists():
-                # for exported csv file from real AWS DynamoDB Table
-                # (in this case, double quotation is removed)
-                with open(csv_file, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                headers = [h.strip().strip('"') for h in lines[0].split(",")]
-                data = []
-                for rec in lines[1:]:
-                    row = {col: d
-                           for col, d in zip(headers, self.read_record_csv(rec))}
-                    data.append(row)
-            else:
-                return
+    def stop(self):
+        self._journal.stop()
+        super().stop()
 
-            try:
-                with table.batch_writer() as batch:
-                    for row in data:
-                        batch.put_item(Item=row)
-
-            except ClientError as e:
-                logger.exception("dynamo init data error")
-                # TODO
-
-    def read_record_csv(self, row: str) -> List[Union[str, Decimal, list, dict, set]]:
-        """ read one row of results.csv (from aws dynamo db table)"""
-        cells = []
-        elms = row.split(",")
-        tmp = ""
-        for elm in elms:
-            tmp = (tmp+","+elm) if tmp != "" else elm
-            if tmp.count("[") == tmp.count("]") \
-                    and tmp.count("{") == tmp.count("}"):
-                cells.append(self.interpret_dynamo_cell(tmp))
-                tmp = ""
-        return cells
-
-    def interpret_dynamo_cell(self, elm: str) -> Union[str, Decimal, list, dict, set]:
-        val = elm.strip().strip("\"")
-        if val.startswith("["):  # dynamo set or list
-            val = val[1:-1]  # remove []
-            if val:
-                res = [self.interpret_dynamo_cell(n) for n in val.split(",")]
-                return res if val.startswith("{") else set(res)
-            else:
-                return []
-        if val.startswith("{"):  # dynamo map or list item
-            pair = val[1:-1]  # remove {}
-            if not pair:
-                return {}
-            key, *rest = pair.split(":")
-            v = ":".join(rest)
-            key = key.strip("\"")
-            v = v.strip("\"")
-            if key == "S":
-                return v.strip("\"")
-            elif key == "N":
-                return Decimal(v.strip("\""))
-            elif key == "BOOL":
-                return bool(val.strip("\""))
-            elif key == "B":
-                return base64.b64decode(v.strip("\""))
-            elif key in ["SS", "NS", "BS", "L", "M"]:
-                return self.interpret_dynamo_cell(v)
-            else:
-                return {key: self.interpret_dynamo_cell(v)}
-        else:
-            val = val.strip("'")
-            try:
-                val = Decimal(val)
-                return val
-            except InvalidOperation:
-                return val
+    def init_data(self):
+        """
+            create tables and put items (local dir -> dynamodb)
+            tables are loaded in parallel
+        """
+        self._dynamodb = boto3.resource('dynamodb')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self._seed_workers) as executor:
+            total = sum(executor.map(self._init_table, self._config.keys()))
+        self._journal.pop()  # seeded items are hashed by scan
+        elapsed = time.perf_counter() - started
+        logger.info(f"dynamodb seeded {total} rows in {elapsed:.2f}s"
+                    f" ({total / max(elapsed, 1e-6):.0f} rows/s)")
+
+    def _init_table(self, name: str) -> int:
+        """ return number of loaded rows """
+        # resource is not thread safe
+        dynamodb = boto3.session.Session().resource("dynamodb")
+        dynamodb.create_table(**self._config[name])
+        table = dynamodb.Table(name)
+        started = time.perf_counter()
+        count = 0
+        try:
+            with table.batch_writer() as batch:
+                for item in iter_items(self._local_dynamo_path / name):
+                    batch.put_item(Item=item)
+                    count += 1
+            # changes not compacted (e.g. process was killed)
+            self._replay_log(name, table)
+
+        except ClientError:
+            # table is kept with the rows loaded before the error
+            logger.exception(f"dynamodb {name}: init data error"
+                             f" ({count} rows loaded)")
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"dynamodb {name}: {count} rows in {elapsed:.2f}s"
+                    f" ({count / max(elapsed, 1e-6):.0f} rows/s)")
+        self._hashes[name] = {self._get_key(name, item): self._digest(item)
+                              for item in self._scan(table)}
+        if self._get_log_path(name).exists():
+            self._compact(name, table)
+        return count
+
+    def flush(self):
+        for name in self._config.keys():
+            if self._get_log_path(name).exists():
+                self._compact(name, self._dynamodb.Table(name))
+
+    snapshot = True
+
+    def fingerprint(self) -> Optional[str]:
+        if any(self._get_log_path(name).exists() for name in self._config):
+            return None
+        md5 = hashlib.md5()
+        for file in sorted(self._local_dynamo_path.glob("**/*")):
+            if file.is_file():
+                stat = file.stat()
+                md5.update(f"{file.relative_to(self._local_dynamo_path)}"
+                           f":{stat.st_size}:{stat.st_mtime_ns}\n"
+                           .encode("utf-8"))
+        return md5.hexdigest()
+
+    def snapshot_state(self):
+        return self._hashes
+
+    def restore(self, state):
+        self._dynamodb = boto3.resource('dynamodb')
+        self._hashes = state
+        self._journal.pop()
 
     def sync(self) -> dict:
-        def obj_to_item(obj):
-            if isinstance(obj, Decimal):
-                return float(obj)
-            if isinstance(obj, set):
-                return list(obj)
+        """
+            sync  (dynamodb table -> local dir)
+            - only keys written after the last sync (journal) are read
+              (whole table is scanned if it is re-created
+               or changed by PartiQL)
+            - compare hash of each item (keyed by primary key)
+            - changes are appended to changes.jsonl of the table
+              (compacted into data.json on stop)
+
+            return {"tables": [changed_tables],
+                    "inserted": { table:[keys] },
+                    "modified": { table:[keys] },
+                    "removed": { table:[keys] }}
+        """
         changed_table = []
-        for name in self._config.keys():
-            table = self._dynamodb.Table(name)
-            items = table.scan().get("Items", [])
-            file: Path = self._local_dynamo_path / name / "data.json"
-            if len(items):
-                local = []
-                if file.exists():
-                    with open(file, "r") as f:
-                        local = json.load(f)
-
-                if local != items:
+        res = {"inserted": {}, "modified": {}, "removed": {}}
+        journal = self._journal.pop()
+        done = set()
+        try:
+            for name in self._config.keys():
+                if name not in journal:
+                    continue
+                changes = self._sync_table(name, journal[name])
+                done.add(name)
+                if changes:
                     changed_table.append(name)
-                    with open(file, "w") as f:
-                        json.dump(items, f, indent=4,
-                                  ensure_ascii=False, default=obj_to_item)
+                    for change, keys in changes.items():
+                        if keys:
+                            res[change][name] = keys
+        except BaseException:
+            # tables which are not synced are synced next time
+            self._journal.restore({name: keys for name, keys
+                                   in journal.items() if name not in done})
+            raise
+        return {"tables": changed_table, **res}
+
+    def _sync_table(self, name: str, journal_keys: Optional[set]) -> dict:
+        """
+            append changes of keys (None: whole table) to changes.jsonl
+            return { "inserted": [keys], "modified": ..., "removed": ... }
+            (hashes are updated after the changes are written)
+        """
+        hashes = self._hashes.setdefault(name, {})
+        if journal_keys is None:
+            items = {self._get_key(name, item): item
+                     for item in self._scan(self._dynamodb.Table(name))}
+            keys = list(items.keys())
+            keys += [key for key in hashes if key not in items]
+        else:
+            keys = [self._get_key(name, dict(key)) for key in journal_keys]
+            items = self._get_items(name, keys)
+        lines = []
+        new_hashes = {}  # None: removed
+        changes = {"inserted": [], "modified": [], "removed": []}
+        for key in keys:
+            item = items.get(key)
+            if item is None:
+                if hashes.get(key) is not None:
+                    new_hashes[key] = None
+                    changes["removed"].append(self._key_dict(name, key))
+                    lines.append({"delete": self._key_dict(name, key)})
+                continue
+            hash = self._digest(item)
+            if hashes.get(key) == hash:
+                continue
+            change = "inserted" if key not in hashes else "modified"
+            new_hashes[key] = hash
+            changes[change].append(self._key_dict(name, key))
+            lines.append({"put": item})
+        if not lines:
+            return {}
+
+        with open(self._get_log_path(name), "a") as f:
+            f.write("".join(json.dumps(line, ensure_ascii=False,
+                                       default=self._to_json) + "\n"
+                            for line in lines))
+        for key, hash in new_hashes.items():
+            if hash is None:
+                hashes.pop(key, None)
             else:
-                if file.exists():
-                    file.unlink()
+                hashes[key] = hash
+        return changes
+
+    def _scan(self, table):
+        """ scan all items (follow LastEvaluatedKey) """
+        kwargs = {}
+        while True:
+            page = table.scan(**kwargs)
+            yield from page.get("Items", [])
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    def _get_items(self, name: str, keys: list[tuple]) -> dict:
+        """ current items of keys ({ key: item }, deleted one is absent) """
+        items = {}
+        for i in range(0, len(keys), 100):
+            request = {name: {"Keys": [self._key_dict(name, key)
+                                       for key in keys[i:i + 100]],
+                              "ConsistentRead": True}}
+            while request:
+                page = self._dynamodb.batch_get_item(RequestItems=request)
+                for item in page["Responses"].get(name, []):
+                    items[self._get_key(name, item)] = item
+                request = page.get("UnprocessedKeys")
+        return items
+
+    def _get_key(self, name: str, item: dict) -> tuple:
+        return tuple(item.get(k["AttributeName"])
+                     for k in self._config[name]["KeySchema"])
+
+    def _key_dict(self, name: str, key: tuple) -> dict:
+        return {k["AttributeName"]: v
+                for k, v in zip(self._config[name]["KeySchema"], key)}
+
+    def _get_log_path(self, name: str) -> Path:
+        return self._local_dynamo_path / name / "changes.jsonl"
+
+    def _replay_log(self, name: str, table):
+        """ apply changes.jsonl to table """
+        log_path = self._get_log_path(name)
+        if not log_path.exists():
+            return
+        with open(log_path, "r") as f, table.batch_writer() as batch:
+            for line in f:
+                if not line.strip():
+                    continue
+                change = json.loads(line, parse_float=Decimal)
+                if "put" in change:
+                    batch.put_item(Item=change["put"])
+                elif "delete" in change:
+                    batch.delete_item(Key=change["delete"])
+
+    def _compact(self, name: str, table):
+        """ write all items to data.json and remove changes.jsonl """
+        file: Path = self._local_dynamo_path / name / "data.json"
+        items = list(self._scan(table))
+        if len(items):
+            with open(file, "w") as f:
+                json.dump(items, f, indent=4,
+                          ensure_ascii=False, default=self._to_json)
+        else:
+            if file.exists():
+                file.unlink()
+        self._get_log_path(name).unlink()
 
-        return {"tables": changed_table}
+    @staticmethod
+    def _to_json(obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        if isinstance(obj, set):
+            return list(obj)
+        if isinstance(obj, Binary):
+            return base64.b64encode(obj.value).decode("ascii")
+
+    @staticmethod
+    def _digest(item: dict) -> str:
+        def canonical(obj):
+            if isinstance(obj, set):
+                return sorted(obj, key=str)
+            return str(obj)
+        data = json.dumps(item, sort_keys=True, default=canonical)
+        return hashlib.md5(data.encode("utf-8")).hexdigest()
 
 
 class MockManager():
-    def __init__(self, config_file):
-        config = ConfigParser(config_file)
+    def __init__(self, config_file, config: ConfigParser = None):
+        """ config: parsed config_file (shared with LambdaInvoker) """
+        config = config or ConfigParser(config_file)
         services = ["s3", "dynamodb", "sns", "sqs", "ses"]
         self._services = []
         self._changed = {}
+        self._config_hash = config.content_hash
+        self.settings = config.settings
+        self._use_snapshot = config.settings.get("Snapshot", True)
         for service in services:
             service_config = config.get_service_config(service)
             if service_config:
-                mock = AwsMock.CreateMock(service, service_config)
+                mock = AwsMock.CreateMock(service, service_config,
+                                          config.settings)
                 self._services.append(mock)
 
     def start(self):
@@ -393,9 +877,105 @@ class MockManager():
         logger.info(
             f"stop aws mock:{[m.service_name for m in self._services]}")
 
-    def init_data(self):
+    def init_data(self, snapshot_file: Optional[Path] = None):
+        """
+            setup aws resources from local dir
+            (or restore from snapshot if local data is not changed)
+        """
+        restored = []
+        if snapshot_file and self._use_snapshot:
+            restored = self.restore_snapshot(snapshot_file)
         for mock in self._services:
-            mock.init_data()
+            if mock.service_name not in restored:
+                mock.init_data()
+
+    def flush(self):
+        for mock in self._services:
+            mock.flush()
+
+    def save_snapshot(self, snapshot_file: Path):
+        """
+            save moto backends to snapshot file
+            (call after 'flush' and before 'stop')
+        """
+        if not self._use_snapshot:
+            return
+        services = {}
+        for mock in self._services:
+            fingerprint = mock.fingerprint() if mock.snapshot else None
+            if fingerprint is None:
+                continue
+            backends = mock._mock.backends
+            services[mock.service_name] = {
+                "fingerprint": fingerprint,
+                "backends": {account: backends[account]
+                             for account in backends},
+                "state": mock.snapshot_state()
+            }
+        snapshot = {"moto": moto.__version__, "config": self._config_hash,
+                    "services": services}
+        started = time.perf_counter()
+        try:
+            with open(snapshot_file, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.exception("snapshot save error")
+            snapshot_file.unlink(missing_ok=True)
+            return
+        elapsed = time.perf_counter() - started
+        logger.info(f"snapshot saved:{list(services.keys())}"
+                    f" in {elapsed:.2f}s")
+
+    def restore_snapshot(self, snapshot_file: Path) -> list[str]:
+        """
+            restore moto backends from snapshot file
+            return restored service names
+            (incremental mock whose local data is changed is restored,
+             but not returned. 'init_data' loads the changes)
+        """
+        if not snapshot_file.exists():
+            return []
+        started = time.perf_counter()
+        try:
+            with open(snapshot_file, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            logger.exception("snapshot load error")
+            return []
+        if snapshot.get("moto") != moto.__version__\
+                or snapshot.get("config") != self._config_hash:
+            return []
+
+        restored = []
+        for mock in self._services:
+            saved = snapshot["services"].get(mock.service_name)
+            if not saved:
+                continue
+            unchanged = saved["fingerprint"] == mock.fingerprint()
+            if not unchanged and not mock.incremental:
+                continue
+            backends = mock._mock.backends
+            for account, account_backend in saved["backends"].items():
+                for region, backend in account_backend.items():
+                    # keep instance (it may be referred from moto)
+                    backends[account][region].__dict__.update(
+                        backend.__dict__)
+            mock.restore(saved["state"])
+            if unchanged:
+                restored.append(mock.service_name)
+        elapsed = time.perf_counter() - started
+        logger.info(f"snapshot restored:{restored} in {elapsed:.2f}s")
+        return restored
+
+    def add_s3_listener(self, listener: Callable):
+        """ listener(event_name, bucket, key, fake_key) """
+        for mock in self._services:
+            if isinstance(mock, S3Mock):
+                mock.add_listener(listener)
+
+    @property
+    def service_names(self) -> list[str]:
+        return [mock.service_name for mock in self._services]
 
     def sync(self):
         for mock in self._services:
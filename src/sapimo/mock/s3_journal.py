@@ -0,0 +1,106 @@
+import threading
+from typing import Callable
+
+from moto.s3.models import S3Backend
+
+
+class S3ChangeJournal:
+    """
+        record s3 keys which are written or deleted in moto backend
+            - hook S3Backend.put_object / delete_object / create_bucket
+              (copy_object, multipart completion and delete_objects
+               are processed through them. copy_object is also hooked
+               for the event name)
+            - only "dirty" keys are recorded.
+              current state of the key is checked when syncing
+            - listeners are notified of each write/delete
+              listener(event_name, bucket, key, fake_key or None)
+              (called on the thread which accesses moto. don't block)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changes: dict[str, set] = {}  # key: bucket name
+        self._originals = {}
+        self._listeners: list[Callable] = []
+        self._copying = threading.local()  # in copy_object (event name)
+
+    def add_listener(self, listener: Callable):
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._originals:
+            return
+        put_object = S3Backend.put_object
+        delete_object = S3Backend.delete_object
+        create_bucket = S3Backend.create_bucket
+        copy_object = S3Backend.copy_object
+        journal = self
+
+        def _put_object(backend, bucket_name, key_name, *args, **kwargs):
+            new_key = put_object(backend, bucket_name, key_name,
+                                 *args, **kwargs)
+            journal.record(bucket_name, key_name)
+            if getattr(journal._copying, "value", False):
+                event_name = "ObjectCreated:Copy"
+            elif kwargs.get("multipart") is not None:
+                event_name = "ObjectCreated:CompleteMultipartUpload"
+            else:
+                event_name = "ObjectCreated:Put"
+            journal.notify(event_name, bucket_name, key_name, new_key)
+            return new_key
+
+        def _copy_object(backend, *args, **kwargs):
+            journal._copying.value = True
+            try:
+                return copy_object(backend, *args, **kwargs)
+            finally:
+                journal._copying.value = False
+
+        def _delete_object(backend, bucket_name, key_name, *args, **kwargs):
+            res = delete_object(backend, bucket_name, key_name,
+                                *args, **kwargs)
+            journal.record(bucket_name, key_name)
+            if not isinstance(res, tuple) or res[0]:
+                journal.notify("ObjectRemoved:Delete", bucket_name, key_name)
+            return res
+
+        def _create_bucket(backend, bucket_name, *args, **kwargs):
+            bucket = create_bucket(backend, bucket_name, *args, **kwargs)
+            journal.record(bucket_name)
+            return bucket
+
+        self._originals = {"put_object": put_object,
+                           "delete_object": delete_object,
+                           "create_bucket": create_bucket,
+                           "copy_object": copy_object}
+        S3Backend.put_object = _put_object
+        S3Backend.delete_object = _delete_object
+        S3Backend.create_bucket = _create_bucket
+        S3Backend.copy_object = _copy_object
+
+    def stop(self):
+        for name, func in self._originals.items():
+            setattr(S3Backend, name, func)
+        self._originals = {}
+
+    def record(self, bucket_name: str, key: str = None):
+        with self._lock:
+            keys = self._changes.setdefault(bucket_name, set())
+            if key is not None:
+                keys.add(key)
+
+    def notify(self, event_name: str, bucket_name: str, key: str,
+               fake_key=None):
+        for listener in self._listeners:
+            listener(event_name, bucket_name, key, fake_key)
+
+    def pop(self) -> dict:
+        """
+            return recorded changes and clear journal
+            ({ bucket: {keys} })
+        """
+        with self._lock:
+            changes = self._changes
+            self._changes = {}
+        return changes
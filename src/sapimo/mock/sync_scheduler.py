@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from sapimo.mock.metrics import metrics
+from sapimo.utils import LogManager
+
+logger = LogManager.setup_logger(__file__, level=logging.INFO)
+
+
+class SyncScheduler:
+    """
+        run MockManager.sync (moto -> local dir) on background thread
+            - sync requests in a burst are coalesced
+              (sync starts when no request comes for 'debounce' seconds,
+               or 'max_staleness' seconds after the first request)
+            - listeners receive changes of each sync ({service: change})
+              (coroutine function is scheduled on the event loop)
+            - failed sync is retried by the next request
+              (or 'max_staleness' seconds later)
+            - flush() syncs immediately (for tests and shutdown).
+              error of the sync is raised.
+              it doesn't wait for s3 triggered / sqs triggered lambdas
+              (LambdaInvoker.drain, POST /_sapimo/sync?wait=true)
+    """
+
+    def __init__(self, manager, debounce: float = 0.2,
+                 max_staleness: float = 2.0):
+        self._manager = manager
+        self._debounce = debounce
+        self._max_staleness = max_staleness
+        self._listeners: list[Callable] = []
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._first_request: Optional[float] = None
+        self._last_request: Optional[float] = None
+        self._stopped = True
+        self._thread = None
+        self._loop = None
+
+    def add_listener(self, listener: Callable):
+        self._listeners.append(listener)
+
+    def start(self):
+        """ call on the event loop to schedule coroutine listeners """
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="sapimo-sync")
+        self._thread.start()
+
+    def stop(self):
+        """ pending requests are dropped (call manager.sync after this) """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def request(self):
+        """ request sync (returns immediately) """
+        now = time.monotonic()
+        with self._cond:
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            self._cond.notify_all()
+
+    def flush(self) -> dict:
+        """ sync now (blocking. lambdas in flight are not waited) """
+        with self._cond:
+            self._first_request = None
+            self._last_request = None
+        try:
+            return self._sync()
+        except Exception:
+            self._retry()
+            raise
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and self._first_request is None:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                # wait until burst is over (but not longer than staleness)
+                while not self._stopped:
+                    deadline = min(self._last_request + self._debounce,
+                                   self._first_request + self._max_staleness)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+                self._first_request = None
+                self._last_request = None
+            try:
+                self._sync()
+            except Exception:
+                logger.exception("sync error (retried later)")
+                self._retry()
+
+    def _retry(self):
+        """ keep sync pending after an error """
+        with self._cond:
+            if self._first_request is None:
+                # not retried in a tight loop if nothing is requested
+                now = time.monotonic()
+                self._first_request = now
+                self._last_request = now + self._max_staleness
+            self._cond.notify_all()
+
+    def _sync(self) -> dict:
+        with self._sync_lock:
+            with metrics.measure("*", "sync"):
+                self._manager.sync()
+            changed = {service: self._manager.get_change(service)
+                       for service in self._manager.service_names}
+        for listener in self._listeners:
+            self._notify(listener, changed)
+        return changed
+
+    def _notify(self, listener: Callable, changed: dict):
+        if not asyncio.iscoroutinefunction(listener):
+            try:
+                listener(changed)
+            except Exception:
+                logger.exception("sync listener error")
+            return
+        if self._loop is None or self._loop.is_closed():
+            logger.warning("event loop is not running. listener is skipped")
+            return
+        future = asyncio.run_coroutine_threadsafe(listener(changed),
+                                                  self._loop)
+        future.add_done_callback(_log_error)
+
+
+def _log_error(future):
+    if not future.cancelled() and future.exception():
+        logger.error("sync listener error", exc_info=future.exception())
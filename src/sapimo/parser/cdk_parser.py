@@ -1,10 +1,10 @@
-import hashlib
 from copy import deepcopy
 from pathlib import Path
 
 
 from sapimo.utils import LogManager
 from sapimo.parser.cf_resource_parser import CfResourceParser
+from sapimo.parser.source_index import SourceIndex
 from sapimo.constants import EventType, AuthType
 
 logger = LogManager.setup_logger(__file__)
@@ -15,25 +15,18 @@ class CdkCfParser(CfResourceParser):
         for CDK repository
     """
 
-    def __init__(self, filepath: Path, region="us-east-1"):
+    def __init__(self, filepath: Path, region="us-east-1",
+                 excludes: list[str] = None):
+        """
+            excludes: dirs/files not searched for lambda code
+                      (in addition to .gitignore and source_index.EXCLUDES)
+        """
         self._cdk_path = filepath.parent
         self._repo_path = self._cdk_path.parent
 
-        # calculate all file's md5
-        self._md5s = {}
-
-        def save_hash(directory: Path, d: dict):
-            for file in directory.iterdir():
-                code_uri: str = str(file).replace(str(self._repo_path)+"/", "")
-                if code_uri.startswith(".") or self._cdk_path.name in code_uri:
-                    continue
-                if file.is_dir():
-                    save_hash(file, d)
-                else:
-                    with open(file, "rb") as f:
-                        hash = hashlib.md5(f.read()).hexdigest()
-                    d[hash] = code_uri
-        save_hash(self._repo_path, self._md5s)
+        # source file of asset (*.py is hashed at first lookup)
+        self._sources = SourceIndex(self._repo_path, excludes=excludes,
+                                    skip_dirs=[self._cdk_path])
 
         super().__init__(filepath, region)
 
@@ -193,7 +186,7 @@ class CdkCfParser(CfResourceParser):
         origin_dir = self._cdk_path / cdk_code_uri
         if not handler_file:
             for file in origin_dir.iterdir():
-                if file.is_file and file.name != "__init__.py"\
+                if file.is_file() and file.name != "__init__.py"\
                         and file.name.endswith(".py"):
                     handler_file = file.name
         else:
@@ -206,9 +199,7 @@ class CdkCfParser(CfResourceParser):
 
         handler_path = origin_dir / handler_file
 
-        with open(handler_path, "rb") as f:
-            hash = hashlib.md5(f.read()).hexdigest()
-        code_uri = self._md5s.get(hash, "")
+        code_uri = self._sources.find(handler_path)
         if code_uri:
             return "/".join(code_uri.split("/")[:-1])
         else:
@@ -3,9 +3,9 @@ from copy import deepcopy
 from pathlib import Path
 
 import yaml
-from awscli.customizations.cloudformation.yamlhelper import yaml_parse
 
 from sapimo.utils import LogManager, add_element
+from sapimo.parser.loader import parse_template
 from sapimo.parser.fn_resolver import FnResolver
 
 logger = LogManager.setup_logger(__file__)
@@ -77,7 +77,7 @@ class CfResourceParser(FnResolver):
         if not overwrite and output_path.exists():
             try:
                 yaml_str = open(output_path).read()
-                old_config = self._treat(yaml_parse(yaml_str))
+                old_config = self._treat(parse_template(yaml_str))
                 logger.info(f'old_config_dict:{old_config}')
             except Exception as e:
                 logger.exception("old config yaml read error")
@@ -97,15 +97,24 @@ class CfResourceParser(FnResolver):
     def _get_ref_and_attr(self, name: str, resource: dict):
         """ get Ref value and Attr value by resource type """
         tp = resource["Type"]
-        props = resource["Properties"]
+        props = resource.get("Properties", {})
         if tp == "AWS::S3::Bucket":
             return {"Ref": props.get("BucketName", name)}
         elif tp == "AWS::DynamoDB::GlobalTable"\
                 or tp == "AWS::DynamoDB::Table":
             return {"Ref": props.get("TableName", name),
                     "Arn": self._arn_tmp.format("dynamo", name)}
-        # elif tp == "AWS::SQS::Queue":
-        #     pass
+        elif tp == "AWS::SQS::Queue":
+            # QueueName may be a function (resolved at Ref/GetAtt)
+            queue_name = props.get("QueueName", name)
+            url = {"Fn::Sub": [
+                "https://sqs.${AWS::Region}.amazonaws.com/${AWS::AccountId}"
+                "/${QueueName}", {"QueueName": queue_name}]}
+            arn = {"Fn::Sub": [
+                "arn:aws:sqs:${AWS::Region}:${AWS::AccountId}:${QueueName}",
+                {"QueueName": queue_name}]}
+            return {"Ref": url, "QueueUrl": url, "QueueName": queue_name,
+                    "Arn": arn}
         # elif tp == "AWS::SNS::Topic":
         #     pass
         # elif tp == "AWS::SES::EmailIdentity":
@@ -1,15 +1,14 @@
 from pathlib import Path
-import json
-
-import yaml
 
 from sapimo.utils import LogManager
+from sapimo.parser.loader import load_cached, parse_json, parse_yaml
 logger = LogManager.setup_logger(__file__)
 
 
 class ConfigParser:
     """
         read config.yaml and convert to useful form
+        (parse result is cached by content, content_hash: md5 of file)
     """
 
     def __init__(self, path: Path):
@@ -17,13 +16,13 @@ class ConfigParser:
             if not path.exists():
                 raise FileNotFoundError(f"{path.name} is not found")
 
-            with open(path) as f:
-                if path.name.endswith(".json"):
-                    obj = json.load(f)
-                elif path.name.endswith(".yaml") or path.name.endswith(".yml"):
-                    obj = yaml.safe_load(f)
-                else:
-                    raise Exception("config file must be json or yaml")
+            if path.name.endswith(".json"):
+                parse = parse_json
+            elif path.name.endswith(".yaml") or path.name.endswith(".yml"):
+                parse = parse_yaml
+            else:
+                raise Exception("config file must be json or yaml")
+            obj, self.content_hash = load_cached(path, parse)
 
             if "paths" not in obj:
                 raise Exception("paths key dose not exist in config file")
@@ -36,6 +35,8 @@ class ConfigParser:
                     method = k.lower()
                     self.apis[path][method] = v
             self.triggered = obj.get("triggered", {})
+            self.sqs_triggered = obj.get("sqs_triggered", {})
+            self.settings = obj.get("settings", None) or {}
         except:
             logger.exception("config parse error")
             raise Exception("config parse error")
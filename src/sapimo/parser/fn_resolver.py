@@ -1,16 +1,61 @@
-from pprint import pprint
-from copy import deepcopy
+import re
+from collections.abc import Mapping
 from pathlib import Path
 
 import yaml
-from awscli.customizations.cloudformation.yamlhelper import yaml_parse
 
 from sapimo.utils import LogManager
+from sapimo.parser.loader import load_template
 
 logger = LogManager.setup_logger(__file__)
 
+# Ref: AWS::NoValue (removed from the parent dict/list)
+_NO_VALUE = object()
+_SUB_VAR = re.compile(r"\$\{([^}]*)\}")
+
+
+class _LazyDict(Mapping):
+    """
+        dict whose values are resolved at first access
+        (entries whose "Condition" is false are hidden)
+    """
+
+    def __init__(self, raw: dict, resolve, check_condition=None,
+                 preset: dict = None):
+        self._raw = raw
+        self._resolve = resolve
+        self._check_condition = check_condition
+        self._resolved = dict(preset or {})
+
+    def _keys(self):
+        for key, val in self._raw.items():
+            if key in self._resolved or self._check_condition is None\
+                    or self._check_condition(val):
+                yield key
+
+    def __getitem__(self, key):
+        if key not in self._resolved:
+            val = self._raw[key]
+            if self._check_condition and not self._check_condition(val):
+                raise KeyError(key)
+            self._resolved[key] = self._resolve(val)
+        return self._resolved[key]
+
+    def __iter__(self):
+        return self._keys()
+
+    def __len__(self):
+        return sum(1 for _ in self._keys())
+
 
 class FnResolver:
+    """
+        resolve intrinsic functions (Ref, Fn::*) of template
+            - resolved subtrees, Ref/GetAtt and conditions are memoized
+              (each node of template is walked once)
+            - resources are resolved at first access
+    """
+
     def __init__(self, filepath: Path, region="us-east-1"):
         self._refs = {}
         self._preprocess(filepath, region)
@@ -24,104 +69,198 @@ class FnResolver:
             "AWS::AccountId": id,
             "AWS::Region": region,
             "AWS::NotificationARNs": ["arn1", "arn2", "arn3"],
-            "AWS::NoValue": None,  # FIXME
+            "AWS::NoValue": _NO_VALUE,
             "AWS::Partition": "aws",
             "AWS::StackId": "arn:aws:cloudformation:"+region+":"+id +\
             ":stack/teststack/51af3dc0-da77-11e4-872e-1234567db123",
             "AWS::StackName": "teststack",
             "AWS::URLSuffix": "amazonaws.com"
         }
+        self._region = region
         self._arn_tmp = "arn:aws:lambda:"+region + ":"+id+":{0}:{1}"
+        raw = {}
         try:
-            yaml_str = open(filepath).read()
-            self._whole = yaml_parse(yaml_str)
-            logger.info(f'yaml_dict:{self._whole}')
+            raw = load_template(filepath)
+            logger.info("yaml_dict:%s", raw)
         except yaml.parser.ParserError as e:
             logger.exception("yaml parse error")
         except yaml.scanner.ScannerError as e:
             logger.exception("yaml scan error")
 
-        self._mappings = self._whole.get("Mappings", {})
-        self._conditions = self._whole.get("Conditions", {})
-        dummy_params.update(self._whole.get("Parameters", {}))
+        # { id(node): (node, resolved) } (node is retained for unique id)
+        self._memo = {}
+        self._ref_values = {}  # { name: resolved value of Ref }
+        self._condition_values = {}  # { condition name: bool }
+
+        self._mappings = _LazyDict(raw.get("Mappings", {}), self._treat)
+        self._raw_conditions = raw.get("Conditions", {})
+        self._conditions = _LazyDict(self._raw_conditions, self._condition)
+        dummy_params.update(raw.get("Parameters", {}))
         self._parameters = dummy_params
-        self._resources = self._whole.get("Resources", {})
+        self._resources = _LazyDict(raw.get("Resources", {}), self._treat,
+                                    check_condition=self._is_created)
+        self._whole = _LazyDict(raw, self._treat,
+                                preset={"Resources": self._resources})
 
-        # create "Ref" map
-        for name, val in self._resources.items():
+        # create "Ref" map (resources are not resolved here)
+        for name, val in raw.get("Resources", {}).items():
             self._refs[name] = self._get_ref_and_attr(name, val)
 
-        # treat Fn and reflect global props
-        self._mappings = self._treat(self._mappings)
-        self._conditions = self._treat(self._conditions)
-        self._parameters = self._treat(self._parameters)
-        self._resources = self._treat(self._resources)
-        self._whole = self._treat(self._whole)
-
     def _get_ref_and_attr(self, name: str, resource: dict):
         """ for override """
         return {"Ref": name, "Arn": self._arn_tmp.format("other", name)}
 
-    def _treat(self, dic: dict):
+    def _treat(self, dic):
         """
             treat and replace Function parts (Func::*)
             and OrderedDict to dict
         """
-        if isinstance(dic, list):
-            res = []
-            for elm in dic:
-                res.append(self._treat(elm))
-            return res
-        elif not isinstance(dic, dict):
-            return dic
-        res = {}
-        for key, val in dic.items():
-            key = key.strip()
-            if key == "Ref":
-                res = self._treat(self._refs.get(val, {}).get("Ref", ""))
-                if not res:
-                    res = self._treat(self._parameters.get(val, ""))
-            # elif key == "Condition": # ignore
-            elif key.startswith("Fn::"):
-                fn = key[4:]
-                if fn == "GetAtt":
-                    att = self._treat(val)
-                    res = self._refs.get(val[0], {}).get(att[1], "")
-                    # print(f"att={att}")
-                    # print(f"res={res}")
-                elif fn == "FindInMap":
-                    map_name = self._treat(val[0])
-                    k1 = self._treat(val[1])
-                    k2 = self._treat(val[2])
-                    res = self._mappings.get(
-                        map_name, {}).get(k1, {}).get(k2, "")
-                elif fn == "GetAZs":
-                    res = ["us-east-1a", "us-east-1b"]  # dummy
-                elif fn == "ImportValue":
-                    res = self._treat(val)  # dummy
-                elif fn == "Join":
-                    res = val[0].join([self._treat(v) for v in val[1]])
-                elif fn == "Select":
-                    index = self._treat(val[0])
-                    li = [self._treat(v) for v in val[1]]
-                    res = li[index]
-                elif fn == "Split":
-                    res = self._treat(val[1]).split(val[0])
-                elif fn == "Sub":
-                    if isinstance(val, str):
-                        res_str = val
-                        val_map = self._parameters
-                    else:
-                        res_str: str = val[0]
-                        val_map = self._treat(val[1])
-
-                    for k, v in val_map.items():
-                        old = "${"+k+"}"
-                        if old in res_str:
-                            res_str = res_str.replace(old, v)
-                    res = res_str
+        res = self._resolve(dic)
+        return None if res is _NO_VALUE else res
+
+    def _resolve(self, node):
+        if not isinstance(node, (dict, list)):
+            return node
+        cached = self._memo.get(id(node))
+        if cached is not None and cached[0] is node:
+            return cached[1]
+        if isinstance(node, list):
+            res = [self._resolve(elm) for elm in node]
+            res = [elm for elm in res if elm is not _NO_VALUE]
+        elif len(node) == 1 and self._is_intrinsic(next(iter(node))):
+            key, val = next(iter(node.items()))
+            res = self._intrinsic(key.strip(), val)
+        else:
+            res = {}
+            for key, val in node.items():
+                val = self._resolve(val)
+                if val is not _NO_VALUE:
+                    res[key.strip()] = val
+        self._memo[id(node)] = (node, res)
+        if isinstance(res, (dict, list)):
+            # resolved value is not walked again
+            self._memo[id(res)] = (res, res)
+        return res
+
+    @staticmethod
+    def _is_intrinsic(key) -> bool:
+        if not isinstance(key, str):
+            return False
+        key = key.strip()
+        return key == "Ref" or key.startswith("Fn::")
+
+    def _intrinsic(self, key: str, val):
+        if key == "Ref":
+            return self._ref(self._resolve(val))
+        fn = key[4:]
+        if fn == "GetAtt":
+            if isinstance(val, str):
+                val = val.split(".", 1)
+            name, attr = self._resolve(val)[:2]
+            return self._get_att(name, attr)
+        elif fn == "FindInMap":
+            map_name, k1, k2 = [self._resolve(v) for v in val[:3]]
+            return self._mappings.get(map_name, {}).get(k1, {}).get(k2, "")
+        elif fn == "GetAZs":
+            return [self._region + "a", self._region + "b"]  # dummy
+        elif fn == "ImportValue":
+            return self._resolve(val)  # dummy
+        elif fn == "Join":
+            delimiter, values = self._resolve(val)
+            return delimiter.join([str(v) for v in values])
+        elif fn == "Select":
+            index, values = self._resolve(val)
+            return values[int(index)]
+        elif fn == "Split":
+            delimiter, source = self._resolve(val)
+            return source.split(delimiter)
+        elif fn == "Sub":
+            return self._sub(val)
+        elif fn == "If":
+            condition, if_true, if_false = val
+            return self._resolve(
+                if_true if self._condition_by_name(condition) else if_false)
+        elif fn == "Equals":
+            left, right = self._resolve(val)
+            return str(left) == str(right)
+        elif fn == "And":
+            return all(self._condition(v) for v in val)
+        elif fn == "Or":
+            return any(self._condition(v) for v in val)
+        elif fn == "Not":
+            return not self._condition(val[0])
+        else:
+            return {key: self._resolve(val)}
+
+    def _ref(self, name: str):
+        if name not in self._ref_values:
+            if name in self._refs:
+                res = self._treat(self._refs[name].get("Ref", ""))
+            elif name in self._parameters:
+                param = self._parameters[name]
+                if isinstance(param, dict):
+                    # parameter definition: use default value
+                    res = self._treat(param.get("Default", ""))
+                    if param.get("Type") == "CommaDelimitedList"\
+                            and isinstance(res, str):
+                        res = res.split(",")
                 else:
-                    res[key] = self._treat(val)
+                    res = param
             else:
-                res[key] = self._treat(val)
-        return res
+                res = ""
+            self._ref_values[name] = res
+        return self._ref_values[name]
+
+    def _get_att(self, name: str, attr: str):
+        key = (name, attr)
+        if key not in self._ref_values:
+            self._ref_values[key] = self._treat(
+                self._refs.get(name, {}).get(attr, ""))
+        return self._ref_values[key]
+
+    def _sub(self, val):
+        if isinstance(val, str):
+            template, variables = val, {}
+        else:
+            template, variables = val[0], self._resolve(val[1])
+
+        def replace(match: re.Match) -> str:
+            var = match.group(1)
+            if var.startswith("!"):
+                # ${!Literal} -> ${Literal}
+                return "${" + var[1:] + "}"
+            if var in variables:
+                res = variables[var]
+            elif var in self._refs or var in self._parameters:
+                res = self._ref(var)
+            elif "." in var:
+                res = self._get_att(*var.split(".", 1))
+            else:
+                return match.group(0)
+            return res if isinstance(res, str) else str(res)
+        return _SUB_VAR.sub(replace, template)
+
+    def _condition(self, val) -> bool:
+        """ value of condition expression (or name of condition) """
+        if isinstance(val, str):
+            return self._condition_by_name(val)
+        if isinstance(val, dict) and len(val) == 1 and "Condition" in val:
+            return self._condition_by_name(val["Condition"])
+        return bool(self._resolve(val))
+
+    def _condition_by_name(self, name: str) -> bool:
+        if name not in self._condition_values:
+            if name not in self._raw_conditions:
+                logger.warning(f"condition '{name}' is not found")
+                self._condition_values[name] = False
+            else:
+                self._condition_values[name] = False  # for recursion
+                self._condition_values[name] = self._condition(
+                    self._raw_conditions[name])
+        return self._condition_values[name]
+
+    def _is_created(self, resource) -> bool:
+        """ resource with false "Condition" is not created """
+        if not isinstance(resource, dict) or "Condition" not in resource:
+            return True
+        return self._condition_by_name(resource["Condition"])
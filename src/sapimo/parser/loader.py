@@ -0,0 +1,104 @@
+"""
+    loading of template and config file
+        - libyaml (CSafeLoader) is used if available
+        - parsed object is cached by content hash
+          (in memory and api_mock/.cache/*.pickle for next init/run/reload,
+           the file is written only if api_mock dir exists)
+"""
+import hashlib
+import json
+import pickle
+from pathlib import Path
+from typing import Callable
+
+import yaml
+from awscli.customizations.cloudformation.yamlhelper import \
+    intrinsics_multi_constructor
+
+from sapimo.constants import CACHE_DIR
+from sapimo.utils import LogManager
+
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # PyYAML without libyaml
+    from yaml import SafeLoader as _SafeLoader
+
+logger = LogManager.setup_logger(__file__)
+
+CACHE_VERSION = 1
+CACHE_FILES = 16  # kept per parse function
+_memory: dict[str, bytes] = {}  # { key: pickled object }
+
+
+class _TemplateLoader(_SafeLoader):
+    """ safe loader with CloudFormation tags (!Ref, !GetAtt, ...) """
+
+
+_TemplateLoader.add_multi_constructor("!", intrinsics_multi_constructor)
+
+
+def parse_yaml(text: str):
+    return yaml.load(text, Loader=_SafeLoader)
+
+
+def parse_template(text: str):
+    """ SAM/CloudFormation template (yaml or json) """
+    if text.lstrip()[:1] in ("{", "["):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return yaml.load(text, Loader=_TemplateLoader)
+
+
+def parse_json(text: str):
+    return json.loads(text)
+
+
+def load_cached(path: Path, parse: Callable[[str], object],
+                cache_dir: Path = None) -> tuple[object, str]:
+    """
+        parse file (or restore parsed object of the same content)
+            cache_dir: default CACHE_DIR (read at call)
+        Return:
+            parsed object (not shared with other callers), md5 of file
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.md5(data).hexdigest()
+    key = f"{parse.__name__}-{CACHE_VERSION}-{digest}"
+    pickled = _memory.get(key)
+    if pickled is None:
+        cache_file = cache_dir / f"{key}.pickle"
+        try:
+            pickled = cache_file.read_bytes()
+            obj = pickle.loads(pickled)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            obj = parse(data.decode("utf-8"))
+            pickled = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            _save(cache_dir, cache_file, pickled, parse.__name__)
+        _memory[key] = pickled
+        return obj, digest
+    return pickle.loads(pickled), digest
+
+
+def _save(cache_dir: Path, cache_file: Path, pickled: bytes, prefix: str):
+    """ write cache and remove old ones (cache is optional) """
+    if not cache_dir.parent.is_dir():
+        return  # not in a project (api_mock is not created for cache)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        tmp.write_bytes(pickled)
+        tmp.replace(cache_file)
+        files = sorted(cache_dir.glob(f"{prefix}-*.pickle"),
+                       key=lambda f: f.stat().st_mtime, reverse=True)
+        for old in files[CACHE_FILES:]:
+            old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.info(f"parse cache is not saved: {e}")
+
+
+def load_template(path: Path):
+    return load_cached(path, parse_template)[0]
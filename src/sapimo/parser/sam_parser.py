@@ -31,7 +31,8 @@ class SamParser(CfResourceParser):
 
         # additional member
         self._apis = {}  # key:api path,
-        self._triggered = {}  # key:trigger bucket name
+        self._triggered = {}  # key:trigger bucket name, value: [triggers]
+        self._sqs_triggered = {}  # key:queue name, value: [triggers]
         self._lambdas = {}  # key: resource name
 
     def _classification(self, name: str, val: dict):
@@ -39,7 +40,7 @@ class SamParser(CfResourceParser):
         props: dict = deepcopy(val.get("Properties", {}))
         if val["Type"] == "AWS::Serverless::Function":
             add_element(props, self._function_globals)
-            if props["PackageType"] == "Image":
+            if props.get("PackageType", "Zip") == "Image":
                 try:
                     image_info = ImageInfo(val["Metadata"], self._root)
                     props["CodeUri"] = image_info.code_uri
@@ -83,13 +84,15 @@ class SamParser(CfResourceParser):
                     api_id = event.get("Properties", {}).get("RestApiId", "")
                     if api_id:
                         api_rsc = self._api_resources.get(api_id, None)
-                        api_rsc = self._treat(api_rsc)
-                        if not api_rsc:
+                        if api_rsc is None:
                             msg = f"'{api_id}' Api resource"\
                                 f"( of function({name}) not found"\
                                 "this is ignored"
                             logger.warning(msg)
-                        auth = api_rsc.get("Properties", {}).get("Auth", None)
+                            continue
+                        api_rsc: dict = deepcopy(self._treat(api_rsc))
+                        add_element(api_rsc, self._api_globals)
+                        auth = api_rsc.get("Auth", None)
                         if not auth:
                             continue
                         def_auth = auth.get("DefaultAuthorizer", None)
@@ -141,14 +144,32 @@ class SamParser(CfResourceParser):
                 elif event_type == "S3":
                     # s3 trigger
                     ev_props = event.get("Properties", {})
-                    if "ObjectCreated" in ev_props.get("Events", ""):
-                        bucket = ev_props.get("Bucket", "")
+                    s3_events = ev_props.get("Events", [])
+                    if isinstance(s3_events, str):
+                        s3_events = [s3_events]
+                    bucket = ev_props.get("Bucket", "")
+                    if bucket and any("ObjectCreated" in e
+                                      or "ObjectRemoved" in e
+                                      for e in s3_events):
+                        trigger = {"Events": s3_events,
+                                   "Properties": deepcopy(props)}
                         filter_ = ev_props.get("Filter", None)
-                        if bucket:
-                            t_props = deepcopy(props)
-                            if filter_:
-                                t_props["Filter"] = filter_
-                            self._triggered[bucket] = {"Properties": t_props}
+                        if filter_:
+                            trigger["Filter"] = filter_
+                        self._triggered.setdefault(bucket, [])\
+                            .append(trigger)
+                    else:
+                        self._others[name] = val
+                elif event_type == "SQS":
+                    # sqs event source mapping
+                    ev_props = deepcopy(event.get("Properties", {}))
+                    queue = ev_props.pop("Queue", "")
+                    if isinstance(queue, str) and queue:
+                        # arn or url -> queue name
+                        queue_name = queue.replace("/", ":").split(":")[-1]
+                        trigger = {**ev_props, "Properties": deepcopy(props)}
+                        self._sqs_triggered.setdefault(queue_name, [])\
+                            .append(trigger)
                     else:
                         self._others[name] = val
                 else:
@@ -163,8 +184,10 @@ class SamParser(CfResourceParser):
         config["paths"] = self._apis
         if self._lambdas:
             config["lambdas"] = self._lambdas
-        # if self._triggered:
-        #     config["triggered"] = self._triggered
+        if self._triggered:
+            config["triggered"] = self._triggered
+        if self._sqs_triggered:
+            config["sqs_triggered"] = self._sqs_triggered
         return config
 
     def _get_ref_and_attr(self, name: str, resource: dict):
@@ -173,17 +196,14 @@ class SamParser(CfResourceParser):
             retain api and httpAPI resources (for auth)
         """
         tp = resource["Type"]
-        props = resource["Properties"]
+        props = resource.get("Properties", {})
         if tp == "AWS::Serverless::Function":
             return {"Ref": name, "Arn": self._arn_tmp.format("function", name)}
         elif tp == "AWS::Serverless::Api":
-            props: dict = deepcopy(props)
-            add_element(props, self._api_globals)
+            # globals are added at use (not read yet)
             self._api_resources[name] = props
             return {"Ref": name}
         elif tp == "AWS::Serverless::HttpApi":
-            props: dict = deepcopy(props)
-            add_element(props, self._http_api_globals)
             self._http_api_resources[name] = props
             return {"Ref": name}  # resource ip id
         elif tp == "AWS::Serverless::Application":
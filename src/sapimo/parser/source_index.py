@@ -0,0 +1,205 @@
+"""
+    lookup of the source file of a CDK asset file (for CdkCfParser)
+        - only *.py files are listed (at first lookup)
+        - dot dirs, EXCLUDES, excludes and .gitignore patterns are skipped
+        - only files of the same size are hashed
+          (same name first, in parallel)
+        - md5 is cached by path, mtime and size (api_mock/.cache)
+"""
+import fnmatch
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from sapimo.parser import loader
+from sapimo.utils import LogManager
+
+logger = LogManager.setup_logger(__file__)
+
+# generic names (env, build, dist) are skipped only at the repo root
+EXCLUDES = ["node_modules", "__pycache__", "venv", "site-packages", "cdk.out",
+            "/env", "/build", "/dist"]
+CACHE_FILE = "source_hashes.json"  # in loader.CACHE_DIR
+
+
+def _md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class _IgnoreRules:
+    """
+        subset of .gitignore
+            name, glob, dir/ (dirs only), /anchored, a/b (relative path)
+            (negation "!" is not supported)
+    """
+
+    def __init__(self):
+        # (base dir relative to repo, pattern, dir only, match by path)
+        self._rules: list[tuple[str, str, bool, bool]] = []
+
+    def add(self, base: str, patterns: list[str]):
+        for line in patterns:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("!"):
+                continue
+            dir_only = line.endswith("/")
+            anchored = line.startswith("/")
+            line = line.strip("/")
+            by_path = anchored or "/" in line
+            if line:
+                self._rules.append((base, line, dir_only, by_path))
+
+    def add_file(self, base: str, file: Path):
+        try:
+            with open(file, encoding="utf-8", errors="ignore") as f:
+                self.add(base, f.read().splitlines())
+        except OSError:
+            pass
+
+    def copy(self) -> "_IgnoreRules":
+        rules = _IgnoreRules()
+        rules._rules = list(self._rules)
+        return rules
+
+    def ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        for base, pattern, dir_only, by_path in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if by_path:
+                if base and not rel_path.startswith(base + "/"):
+                    continue
+                path = rel_path[len(base) + 1:] if base else rel_path
+                if fnmatch.fnmatchcase(path, pattern):
+                    return True
+            elif fnmatch.fnmatchcase(name, pattern):
+                return True
+        return False
+
+
+class SourceIndex:
+    """
+        find(file): path (relative to repo) of the file
+                    which has the same content as file
+    """
+
+    def __init__(self, repo_path: Path, excludes: list[str] = None,
+                 skip_dirs: list[str] = None, cache_file: Path = None,
+                 workers: int = None):
+        self._repo = repo_path
+        self._excludes = list(EXCLUDES) + list(excludes or [])
+        self._skip_dirs = {str(Path(d).resolve()) for d in skip_dirs or []}
+        self._cache_file = cache_file or loader.CACHE_DIR / CACHE_FILE
+        self._workers = workers or min(8, (os.cpu_count() or 1) + 4)
+        # { size: [(name, relative path)] } (listed at first lookup)
+        self._files: Optional[dict[int, list[tuple[str, str]]]] = None
+        # { relative path: [mtime_ns, size, md5] }
+        self._hashes: dict[str, list] = {}
+        self._changed = False
+
+    def _list(self):
+        """ list *.py files by size """
+        self._files = {}
+        rules = _IgnoreRules()
+        rules.add("", self._excludes)
+        stack = [(str(self._repo), "", rules)]
+        while stack:
+            directory, rel_dir, rules = stack.pop()
+            if os.path.exists(os.path.join(directory, ".gitignore")):
+                rules = rules.copy()
+                rules.add_file(rel_dir, Path(directory) / ".gitignore")
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir\
+                    else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir:
+                        if entry.path in self._skip_dirs\
+                                or rules.ignored(rel_path, entry.name, True):
+                            continue
+                        stack.append((entry.path, rel_path, rules))
+                    elif entry.name.endswith(".py") and entry.is_file()\
+                            and not rules.ignored(rel_path, entry.name,
+                                                  False):
+                        size = entry.stat().st_size
+                        self._files.setdefault(size, []).append(
+                            (entry.name, rel_path))
+                except OSError:
+                    continue
+        self._load_cache()
+        logger.info(f"source index: "
+                    f"{sum(len(v) for v in self._files.values())} files")
+
+    def find(self, file: Path) -> Optional[str]:
+        if self._files is None:
+            self._list()
+        try:
+            size = file.stat().st_size
+            target = _md5(str(file))
+        except OSError:
+            return None
+        candidates = sorted(self._files.get(size, []),
+                            key=lambda c: (c[0] != file.name, c[1]))
+        # same name first (usually found without hashing others)
+        same_name = [c[1] for c in candidates if c[0] == file.name]
+        others = [c[1] for c in candidates if c[0] != file.name]
+        for group in [same_name, others]:
+            for rel_path, digest in zip(group, self._hash_all(group)):
+                if digest == target:
+                    self._save_cache()
+                    return rel_path
+        self._save_cache()
+        return None
+
+    def _hash_all(self, rel_paths: list[str]) -> list[Optional[str]]:
+        if len(rel_paths) <= 1:
+            return [self._hash(p) for p in rel_paths]
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            return list(executor.map(self._hash, rel_paths))
+
+    def _hash(self, rel_path: str) -> Optional[str]:
+        path = os.path.join(self._repo, rel_path)
+        try:
+            stat = os.stat(path)
+            cached = self._hashes.get(rel_path)
+            if cached and cached[0] == stat.st_mtime_ns\
+                    and cached[1] == stat.st_size:
+                return cached[2]
+            digest = _md5(path)
+        except OSError:
+            return None
+        self._hashes[rel_path] = [stat.st_mtime_ns, stat.st_size, digest]
+        self._changed = True
+        return digest
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_file) as f:
+                cache = json.load(f)
+            if cache.get("repo") == str(self._repo):
+                self._hashes = cache.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _save_cache(self):
+        if not self._changed or not self._cache_file.parent.parent.is_dir():
+            return
+        try:
+            self._cache_file.parent.mkdir(exist_ok=True)
+            with open(self._cache_file, "w") as f:
+                json.dump({"repo": str(self._repo), "files": self._hashes}, f)
+            self._changed = False
+        except OSError as e:
+            logger.info(f"source hash cache is not saved: {e}")
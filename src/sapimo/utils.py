@@ -1,66 +1,39 @@
 from typing import Optional
 from pathlib import Path
 import logging
-import sys
-from datetime import datetime
-from typing import Optional
 
-class LogManager:
+from sapimo.log_backend import backend
 
-    log_file_path:Optional[Path] = None
+
+class LogManager:
+    """
+        loggers of sapimo and lambda functions
+        (records are written by sapimo.log_backend on background thread)
+    """
 
     @classmethod
     def setup_logger(cls, name: str, level: int = logging.WARNING) -> logging.Logger:
         logger = logging.getLogger(name)
         logger.setLevel(level)
-        formatter = logging.Formatter('[%(levelname)s] %(message)s')
-        stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setFormatter(formatter)
-        stream_handler.setLevel(logging.WARNING)
-        log_dir = Path("api_mock/log")
-        if cls.log_file_path is None:
-            if not log_dir.exists():
-                log_dir.mkdir(parents=True)
-            filename = datetime.now().strftime("%Y-%m-%d_%H%M")
-            cls.log_file_path =log_dir /f"{filename}.log"
-        file_handler = logging.FileHandler(cls.log_file_path)
-        file_handler.setFormatter(formatter)
-        file_handler.setLevel(logging.INFO)
-        logger.addHandler(stream_handler)
-        logger.addHandler(file_handler)
+        logger.propagate = False  # root may have lambda's handler
+        backend.attach(logger)
         return logger
 
+    @classmethod
+    def capture(cls, logger: logging.Logger):
+        """
+            output logs of lambda function (module level 'logger')
+            handler is added only at the first invocation
+            (root logger: only records logged by invocations)
+        """
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.DEBUG)
+        backend.attach(logger, lambda_log=True)
 
 
-    def __init__(self, logger:logging.Logger)->logging.Logger:
-        self._logger = logger
-        self._def_level = logger.level
-        logger.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('[%(levelname)s] %(message)s')
-        stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setFormatter(formatter)
-        stream_handler.setLevel(self._def_level)
-        log_dir = Path("api_mock/log")
-        if self.log_file_path is None:
-            if not log_dir.exists():
-                log_dir.mkdir(parents=True)
-            filename = datetime.now().strftime("%Y-%m-%d_%H%M")
-            self.log_file_path =log_dir /f"{filename}.log"
-        file_handler = logging.FileHandler(self.log_file_path)
-        file_handler.setFormatter(formatter)
-        file_handler.setLevel(logging.INFO)
-        logger.addHandler(stream_handler)
-        logger.addHandler(file_handler)
-        self._stream_handler = stream_handler
-        self._file_handler = file_handler
-
-    def deinit(self):
-        self._logger.removeHandler(self._stream_handler)
-        self._logger.removeHandler(self._file_handler)
-        self._logger.setLevel(self._def_level)
-
 logger = LogManager.setup_logger(__file__)
 
+
 def search_config() -> Optional[Path]:
     """ search config file """
     filenames = ["config.yml", "config.yaml", "config.json"]
@@ -107,6 +80,26 @@ paths:
         - my_layer/
         Runtime: python3.9
         Timeout: 3
+triggered:     # (optional) lambda triggered by s3 event
+  MyBucket:    # bucket name
+  - Events: s3:ObjectCreated:*  # or list (s3:ObjectRemoved:* etc.)
+    Filter:
+      S3Key:
+        Rules:
+        - Name: prefix
+          Value: uploads/
+    Properties:
+      CodeUri: lambda/thumbnail/
+      Handler: app.lambda_handler
+sqs_triggered: # (optional) lambda triggered by sqs (event source mapping)
+  MyQueue:     # queue name
+  - BatchSize: 10
+    MaximumBatchingWindowInSeconds: 0
+    FunctionResponseTypes:
+    - ReportBatchItemFailures
+    Properties:
+      CodeUri: lambda/worker/
+      Handler: app.lambda_handler
 s3:            # if your lambda uses s3 bucket, "s3" item is required.
   MyBucket:
     BucketName: MyBucket
@@ -126,6 +119,46 @@ dynamodb:      # if your lambda uses dynamoDB, "dynamodb" item is required.
     ProvisionedThroughput:
       ReadCapacityUnits: 10
       WriteCapacityUnits: 10
+settings:      # (optional) sapimo settings
+  S3SyncMode: journal  # journal: sync only changed keys
+                       # scan: compare metadata of all objects
+  ForceColdStart: false  # re-import lambda code on every invocation
+  WatchCode: true      # re-import lambda code when CodeUri/Layers
+                       # files are changed
+  WorkerPoolSize: 8    # number of threads which run lambda handlers
+                       # (default: cpu count + 4)
+                       # threads share os.environ and sys.path: only
+                       # invocations of the same function run in
+                       # parallel, other functions wait for them
+                       # (use ExecutionMode: process to run them together)
+  MaxPendingInvocations: 100  # requests waiting for a worker over this
+                              # get 429
+  LogSampleRate: 1.0   # rate of invocations whose event/response is logged
+                       # (0.0 - 1.0)
+  LogBodyMaxChars: 4096  # event/response in log is truncated to this length
+  InvocationLogSize: 1000  # invocations whose logs are kept in memory
+                           # (older ones: api_mock/log/invocations)
+  InvocationLogSegments: 10  # spill files of InvocationLogSize invocations
+                             # each (oldest file is removed)
+  InvocationLogMaxLines: 500  # log records/print lines kept per invocation
+  TraceMemory: false   # measure memory of each invocation with tracemalloc
+                       # (thread mode, slows lambda code)
+  ExecutionMode: thread  # thread: run handlers on WorkerPoolSize threads
+                         # (one function at a time, see WorkerPoolSize)
+                         # process: run each function on its own worker
+                         # processes (requires moto[server])
+  WorkersPerFunction: 1  # number of warm worker processes per function
+                         # (process mode)
+  TriggerWorkers: 4    # number of s3 events processed concurrently
+  TriggerMaxDepth: 16  # s3 event caused by a chain of triggered lambdas
+                       # longer than this is dropped
+  SqsPollInterval: 1.0 # [s] interval of polling empty sqs queue
+  SyncDebounce: 0.2    # [s] sync moto -> local dir when no request comes
+                       # for this time
+  SyncMaxStaleness: 2.0  # [s] but sync at least this time after the first
+                         # request
+  Snapshot: true       # restore s3/dynamodb from api_mock/snapshot.pickle
+                       # if local data is not changed
     """
     with open(output_path, "w") as f:
         f.write(t)
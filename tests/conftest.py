@@ -0,0 +1,65 @@
+import pytest
+
+from sapimo.log_backend import backend
+from sapimo.mock import mock_manager
+from sapimo.parser import loader
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_dir(tmp_path_factory):
+    """ logs of sapimo are not written to api_mock of the checkout """
+    log_dir = tmp_path_factory.mktemp("log")
+    backend.set_log_dir(log_dir)
+    yield log_dir
+    backend.stop()
+    backend.set_log_dir(None)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """ parse cache is not written to api_mock of the checkout """
+    monkeypatch.setattr(loader, "CACHE_DIR", tmp_path / ".cache")
+    return tmp_path / ".cache"
+
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    """ dummy credentials (moto) """
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+
+@pytest.fixture
+def working_dir(tmp_path, monkeypatch, aws_env):
+    """ tmp_path as api_mock dir of mocks """
+    monkeypatch.setattr(mock_manager, "WORKING_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def aws_mock(tmp_path, working_dir):
+    """
+        factory of started AwsMock whose data is loaded from files
+        (files: { path under the dir of the service: bytes or str })
+        mocks are stopped on teardown
+    """
+    mocks = []
+
+    def _aws_mock(mock_class, files: dict, *args):
+        for path, body in files.items():
+            file = tmp_path / mock_class.service_name / path
+            file.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(body, bytes):
+                file.write_bytes(body)
+            else:
+                file.write_text(body)
+        mock = mock_class(*args)
+        mock.start()
+        mocks.append(mock)
+        mock.init_data()
+        return mock
+
+    yield _aws_mock
+    for mock in mocks:
+        mock.stop()
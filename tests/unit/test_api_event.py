@@ -0,0 +1,79 @@
+import asyncio
+
+from starlette.requests import Request
+
+from sapimo.mock.executer.invoke_info import ApiInfo, ApiV2Info
+
+
+class Route:
+    path = "/items/{item_id}"
+
+
+def make_request(headers=None, query=b"a=1&b=2&b=3") -> Request:
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST",
+        "scheme": "http", "server": ("127.0.0.1", 8000),
+        "client": ("10.0.0.1", 50000), "root_path": "",
+        "path": "/items/42", "raw_path": b"/items/42",
+        "query_string": query, "path_params": {"item_id": "42"},
+        "headers": headers or [(b"host", b"localhost:8000"),
+                               (b"x-multi", b"a"), (b"x-multi", b"b"),
+                               (b"cookie", b"s=1; t=2")],
+        "route": Route(),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"k": 1}',
+                "more_body": False}
+    return Request(scope, receive)
+
+
+def api_info(cls, auth="NONE"):
+    return cls(Route.path, "post", {"Properties": {
+        "CodeUri": "app/", "Handler": "app.handler", "AuthType": auth}})
+
+
+def to_event(props, req, authorizer=None):
+    return asyncio.run(props.to_event(req, authorizer))
+
+
+def test_v1_event():
+    props = api_info(ApiInfo)
+    event = to_event(props, make_request(), {"user": "u"})
+    assert event["resource"] == "/items/{item_id}"
+    assert event["path"] == "/items/42"
+    assert event["body"] == '{"k": 1}'
+    assert event["headers"]["X-Multi"] == "b"
+    assert event["multiValueHeaders"]["X-Multi"] == ["a", "b"]
+    assert event["queryStringParameters"] == {"a": "1", "b": "3"}
+    assert event["multiValueQueryStringParameters"]["b"] == ["2", "3"]
+    assert event["pathParameters"] == {"item_id": "42"}
+    context = event["requestContext"]
+    assert context["domainName"] == "localhost:8000"
+    assert context["identity"]["sourceIp"] == "10.0.0.1"
+    assert context["authorizer"] == {"user": "u"}
+
+    # template is not shared between events
+    other = to_event(props, make_request())
+    assert "authorizer" not in other["requestContext"]
+    assert other["requestContext"]["requestId"] != context["requestId"]
+    other["requestContext"]["identity"]["user"] = "changed"
+    assert props._template["identity"]["user"] is None
+
+
+def test_v2_event():
+    props = api_info(ApiV2Info, "AWS_IAM")
+    event = to_event(props, make_request())
+    assert event["rawPath"] == "/items/42"
+    assert event["rawQueryString"] == "a=1&b=2&b=3"
+    assert event["cookies"] == ["s=1", "t=2"]
+    context = event["requestContext"]
+    assert context["http"]["method"] == "POST"
+    assert context["authorizer"]["iam"]["userId"] == "XXXXXXXXXXXXXXXX"
+    assert "clientCert" in context["authentication"]
+
+    other = to_event(props, make_request(query=b""))
+    assert other["rawQueryString"] == ""
+    assert other["queryStringParameters"] == {}
+    assert other["requestContext"]["authentication"] is not \
+        context["authentication"]
@@ -0,0 +1,26 @@
+import threading
+
+from sapimo.mock.executer import code_watcher
+from sapimo.mock.executer.code_watcher import CodeWatcher
+
+
+def test_poll(tmp_path, monkeypatch):
+    monkeypatch.setattr(code_watcher, "watchfiles", None)
+    (tmp_path / "fn").mkdir()
+    (tmp_path / "layer").mkdir()
+    (tmp_path / "fn/app.py").write_text("a = 1")
+    changed = []
+    event = threading.Event()
+
+    def on_change(dirs):
+        changed.extend(dirs)
+        event.set()
+    watcher = CodeWatcher([str(tmp_path / "fn"), str(tmp_path / "layer")],
+                          on_change, poll_interval=0.05)
+    watcher.start()
+    try:
+        (tmp_path / "fn/app.py").write_text("a = 22")
+        assert event.wait(5)
+    finally:
+        watcher.stop()
+    assert changed == [str(tmp_path / "fn")]
@@ -0,0 +1,52 @@
+import gzip
+import json
+from decimal import Decimal
+
+from sapimo.mock.dynamo_loader import iter_items, interpret_cell
+
+
+def test_csv(tmp_path):
+    (tmp_path / "results.csv").write_text(
+        '"pk (S)","num","list","map","set","memo"\n'
+        '"a","1","[{""S"":""x""},{""N"":""2""}]",'
+        '"{""k"":{""S"":""v,w""}}","[""s1"",""s2""]","comma, and\nnewline"\n'
+        '"b","2.5","","","",""\n', encoding="utf-8")
+    items = list(iter_items(tmp_path))
+    assert items == [
+        {"pk": "a", "num": Decimal("1"), "list": ["x", Decimal("2")],
+         "map": {"k": "v,w"}, "set": {"s1", "s2"},
+         "memo": "comma, and\nnewline"},
+        {"pk": "b", "num": Decimal("2.5")}]
+
+
+def test_csv_without_quotation():
+    assert interpret_cell("[{S:x}]") == ["x"]
+    assert interpret_cell("[a,b]") == {"a", "b"}
+
+
+def test_json_list_cell():
+    assert interpret_cell('[1, 2.5]') == {1, Decimal("2.5")}
+    assert interpret_cell('[{"a": 1}, {"b": 2}]') == [{"a": 1}, {"b": 2}]
+    assert interpret_cell('["a", 1]') == ["a", 1]
+    assert interpret_cell('[]') == []
+
+
+def test_export_json_gz(tmp_path):
+    lines = [{"Item": {"pk": {"S": "a"}, "n": {"N": "3"},
+                       "b": {"B": "AAE="}, "ns": {"NS": ["1", "2"]},
+                       "m": {"M": {"l": {"L": [{"BOOL": True},
+                                               {"NULL": True}]}}}}}]
+    path = tmp_path / "AWSDynamoDB" / "data"
+    path.mkdir(parents=True)
+    with gzip.open(path / "0001.json.gz", "wt") as f:
+        f.write("\n".join(json.dumps(line) for line in lines))
+    assert list(iter_items(tmp_path)) == [
+        {"pk": "a", "n": Decimal("3"), "b": b"\x00\x01",
+         "ns": {Decimal("1"), Decimal("2")}, "m": {"l": [True, None]}}]
+
+
+def test_json_lines(tmp_path):
+    (tmp_path / "data.jsonl").write_text(
+        '{"pk": "a", "v": 1.5}\n\n{"Item": {"pk": {"S": "b"}}}\n')
+    assert list(iter_items(tmp_path)) == [{"pk": "a", "v": Decimal("1.5")},
+                                          {"pk": "b"}]
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+import boto3
+
+from sapimo.mock.mock_manager import DynamoMock
+
+TABLE_CONFIG = {
+    "TableName": "test-table",
+    "AttributeDefinitions": [
+        {"AttributeName": "pk", "AttributeType": "S"},
+        {"AttributeName": "sk", "AttributeType": "N"}],
+    "KeySchema": [
+        {"AttributeName": "pk", "KeyType": "HASH"},
+        {"AttributeName": "sk", "KeyType": "RANGE"}],
+    "ProvisionedThroughput": {"ReadCapacityUnits": 10,
+                              "WriteCapacityUnits": 10}
+}
+
+
+@pytest.fixture
+def dynamo_mock(aws_mock):
+    def _dynamo_mock(files: dict):
+        return aws_mock(DynamoMock, files,
+                        {"test-table": dict(TABLE_CONFIG)}, {})
+    return _dynamo_mock
+
+
+def test_sync_changes(dynamo_mock, tmp_path):
+    data = [{"pk": "a", "sk": 1, "v": "x"}, {"pk": "b", "sk": 1, "v": "y"}]
+    mock = dynamo_mock({"test-table/data.json": json.dumps(data)})
+    assert mock.sync()["tables"] == []
+
+    table = boto3.resource("dynamodb").Table("test-table")
+    table.put_item(Item={"pk": "c", "sk": 2})
+    table.put_item(Item={"pk": "a", "sk": 1, "v": "changed"})
+    table.delete_item(Key={"pk": "b", "sk": 1})
+
+    res = mock.sync()
+    assert res["tables"] == ["test-table"]
+    assert res["inserted"] == {"test-table": [{"pk": "c", "sk": 2}]}
+    assert res["modified"] == {"test-table": [{"pk": "a", "sk": 1}]}
+    assert res["removed"] == {"test-table": [{"pk": "b", "sk": 1}]}
+    log = tmp_path / "dynamodb/test-table/changes.jsonl"
+    assert len(log.read_text().splitlines()) == 3
+
+    # compact on stop
+    mock.flush()
+    assert not log.exists()
+    data = tmp_path / "dynamodb/test-table/data.json"
+    local = json.loads(data.read_text())
+    assert sorted(i["pk"] for i in local) == ["a", "c"]
+
+
+def test_replay_log(dynamo_mock, tmp_path):
+    data = [{"pk": "a", "sk": 1}]
+    changes = [{"put": {"pk": "b", "sk": 2}},
+               {"delete": {"pk": "a", "sk": 1}}]
+    mock = dynamo_mock({
+        "test-table/data.json": json.dumps(data),
+        "test-table/changes.jsonl": "\n".join(json.dumps(c) for c in changes)
+    })
+    items = boto3.resource("dynamodb").Table("test-table").scan()["Items"]
+    assert [i["pk"] for i in items] == ["b"]
+    assert not (tmp_path / "dynamodb/test-table/changes.jsonl").exists()
+    assert mock.sync()["tables"] == []
+
+
+def test_scan_pagination(dynamo_mock):
+    data = [{"pk": str(i), "sk": 1, "v": "x" * 4000} for i in range(400)]
+    mock = dynamo_mock({"test-table/data.json": json.dumps(data)})
+    assert len(mock._hashes["test-table"]) == 400
+
+
+def test_sync_journal(dynamo_mock, mocker):
+    data = [{"pk": str(i), "sk": 1} for i in range(10)]
+    mock = dynamo_mock({"test-table/data.json": json.dumps(data)})
+    scan = mocker.spy(mock, "_scan")
+    table = boto3.resource("dynamodb").Table("test-table")
+    with table.batch_writer() as batch:
+        batch.put_item(Item={"pk": "new", "sk": 1})
+        batch.delete_item(Key={"pk": "0", "sk": 1})
+    table.update_item(Key={"pk": "1", "sk": 1}, UpdateExpression="SET v = :v",
+                      ExpressionAttributeValues={":v": "x"})
+    table.put_item(Item={"pk": "2", "sk": 1})  # same item
+    client = boto3.client("dynamodb")
+    client.transact_write_items(TransactItems=[{"Put": {
+        "TableName": "test-table", "Item": {"pk": {"S": "tx"},
+                                            "sk": {"N": "1"}}}}])
+
+    res = mock.sync()
+    assert scan.call_count == 0  # only written keys are read
+    assert sorted(k["pk"] for k in res["inserted"]["test-table"]) == \
+        ["new", "tx"]
+    assert res["modified"] == {"test-table": [{"pk": "1", "sk": 1}]}
+    assert res["removed"] == {"test-table": [{"pk": "0", "sk": 1}]}
+    assert mock.sync()["tables"] == []
+
+    # re-created table is synced by scan
+    client.delete_table(TableName="test-table")
+    client.create_table(**TABLE_CONFIG)
+    res = mock.sync()
+    assert scan.call_count == 1
+    assert len(res["removed"]["test-table"]) == 11
+
+
+def test_journal_kept_on_failure(dynamo_mock, tmp_path, mocker):
+    mock = dynamo_mock({"test-table/data.json": "[]"})
+    table = boto3.resource("dynamodb").Table("test-table")
+    table.put_item(Item={"pk": "a", "sk": 1})
+    get_log_path = mock._get_log_path
+    mocker.patch.object(mock, "_get_log_path",
+                        return_value=tmp_path / "missing/changes.jsonl")
+    with pytest.raises(OSError):
+        mock.sync()
+
+    mocker.patch.object(mock, "_get_log_path", side_effect=get_log_path)
+    res = mock.sync()
+    assert res["inserted"] == {"test-table": [{"pk": "a", "sk": 1}]}
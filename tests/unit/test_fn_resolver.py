@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from sapimo.parser.cf_resource_parser import CfResourceParser
+
+TEMPLATE = """
+Parameters:
+  Stage:
+    Type: String
+    Default: dev
+  Names:
+    Type: CommaDelimitedList
+    Default: a,b,c
+Conditions:
+  IsDev: !Equals [!Ref Stage, dev]
+  IsProd: !Not [!Condition IsDev]
+  DevInUsEast: !And [!Condition IsDev, !Equals [!Ref AWS::Region, us-east-1]]
+Resources:
+  Table:
+    Type: AWS::DynamoDB::Table
+    Properties:
+      TableName: !Sub "${Stage}-table"
+  Queue:
+    Type: AWS::SQS::Queue
+    Properties:
+      QueueName: !If [IsProd, prod-jobs, !Sub "${Stage}-jobs"]
+  ProdBucket:
+    Type: AWS::S3::Bucket
+    Condition: IsProd
+    Properties:
+      BucketName: prod-bucket
+  Other:
+    Type: AWS::SNS::Topic
+    Properties:
+      Url: !Sub "${Queue.QueueUrl}?table=${Table}&literal=${!Table}"
+      Arn: !GetAtt Table.Arn
+      Mode: !If [DevInUsEast, debug, release]
+      Second: !Select [1, !Ref Names]
+      Removed: !If [IsProd, value, !Ref AWS::NoValue]
+      List: [x, !Ref AWS::NoValue, !Join ["-", !Split [",", "1,2"]]]
+"""
+
+
+def test_intrinsics(tmp_path):
+    path = Path(tmp_path) / "template.yaml"
+    path.write_text(TEMPLATE)
+    parser = CfResourceParser(path)
+
+    assert list(parser._tables) == ["dev-table"]
+    assert list(parser._sqss["Queue"].values()) == ["dev-jobs"]
+    assert "ProdBucket" not in parser._resources  # condition is false
+    assert parser._buckets == {}
+
+    other = parser._resources["Other"]["Properties"]
+    assert other == {
+        "Url": "https://sqs.us-east-1.amazonaws.com/123456789012/dev-jobs"
+               "?table=dev-table&literal=${Table}",
+        "Arn": "arn:aws:lambda:us-east-1:123456789012:dynamo:Table",
+        "Mode": "debug",
+        "Second": "b",
+        "List": ["x", "1-2"],
+    }
+
+
+def test_memoized(tmp_path):
+    path = Path(tmp_path) / "template.yaml"
+    path.write_text(TEMPLATE)
+    parser = CfResourceParser(path)
+
+    resource = parser._resources["Other"]
+    assert parser._resources["Other"] is resource
+    # resolved subtree is not walked again
+    assert parser._treat(resource) is resource
+    assert parser._whole["Resources"]["Other"] is resource
@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+from sapimo.mock.executer.handler_cache import HandlerCache
+from sapimo.mock.executer.invoke_info import InvokeInfo
+from sapimo.exceptions import LambdaInvokeError
+
+
+@pytest.fixture
+def lambda_props(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    code = tmp_path / "cache_fn"
+    code.mkdir()
+    (code / "app.py").write_text(
+        "count = 0\n"
+        "def handler(event, context):\n"
+        "    global count\n"
+        "    count += 1\n"
+        "    return count\n")
+    yield InvokeInfo({"Properties": {"CodeUri": "cache_fn/",
+                                     "Handler": "app.handler"}})
+    for name in [m for m in sys.modules if m.startswith("cache_fn")]:
+        del sys.modules[name]
+
+
+def test_warm_start(lambda_props):
+    cache = HandlerCache()
+    handler, cold = cache.get(lambda_props)
+    assert cold
+    assert handler.func({}, None) == 1
+    handler, cold = cache.get(lambda_props)
+    assert not cold
+    assert handler.func({}, None) == 2  # module globals are kept
+
+
+def test_force_cold_start(lambda_props):
+    cache = HandlerCache(force_cold_start=True)
+    for _ in range(2):
+        handler, cold = cache.get(lambda_props)
+        assert cold
+        assert handler.func({}, None) == 1
+
+
+def test_handler_not_exist(lambda_props):
+    props = InvokeInfo({"Properties": {"CodeUri": "cache_fn/",
+                                       "Handler": "app.not_exist"}})
+    with pytest.raises(LambdaInvokeError):
+        HandlerCache().get(props)
+
+
+def test_invalidate(lambda_props, tmp_path):
+    cache = HandlerCache()
+    handler, _ = cache.get(lambda_props)
+    handler.func({}, None)
+    assert "cache_fn.app" in cache.invalidate(["cache_fn/"])
+    handler, cold = cache.get(lambda_props)
+    assert cold
+    assert handler.func({}, None) == 1
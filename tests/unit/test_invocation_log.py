@@ -0,0 +1,115 @@
+import contextvars
+import json
+import logging
+import sys
+import threading
+
+from sapimo.mock.executer.invocation_log import \
+    InvocationStore, capture_invocation
+
+
+def invoke(store: InvocationStore, request_id: str, route: str,
+           function: str = "app.handler"):
+    capture = store.begin(request_id, route, function)
+    with capture_invocation(capture):
+        logging.getLogger("test_invocation_log").warning(f"log {request_id}")
+        print(f"print {request_id}")
+    capture.finish("ok")
+
+
+def test_capture(tmp_path):
+    store = InvocationStore(tmp_path, capacity=10)
+    store.start()
+    try:
+        capture = store.begin("req-1", "GET /a", "app.handler")
+        with capture_invocation(capture):
+            logger = logging.getLogger("test_capture")
+            # worker thread of the invocation (context is copied)
+            context = contextvars.copy_context()
+            thread = threading.Thread(
+                target=context.run, args=(logger.warning, "in thread"))
+            thread.start()
+            thread.join()
+            print("printed")
+        logger.warning("outside")
+        print("outside")
+        capture.finish("error", error="Traceback ...")
+    finally:
+        store.stop()
+    assert not hasattr(sys.stdout, "_stream")
+
+    record = store.get("req-1")
+    assert [log["message"] for log in record["logs"]] == ["in thread"]
+    assert record["stdout"] == "printed\n"
+    assert record["status"] == "error"
+    assert record["error"] == "Traceback ..."
+    assert store.get("req-2") is None
+
+
+def test_query_and_spill(tmp_path):
+    store = InvocationStore(tmp_path, capacity=2, segments=2)
+    store.start()
+    try:
+        for i in range(7):
+            invoke(store, f"req-{i}", "GET /a" if i % 2 else "POST /b")
+        store.join()
+        # memory: 5, 6  spilled: 2, 3 / 4  (segment of 0, 1 is removed)
+        assert store.get("req-0") is None
+        spilled = store.get("req-3")
+        assert spilled["stdout"] == "print req-3\n"
+        assert spilled["logs"][0]["message"] == "log req-3"
+
+        ids = [r["request_id"] for r in store.query()]
+        assert ids == ["req-6", "req-5", "req-4", "req-3", "req-2"]
+        ids = [r["request_id"] for r in store.query(route="GET /a")]
+        assert ids == ["req-5", "req-3"]
+        ids = [r["request_id"] for r in store.query(route="/b", limit=2)]
+        assert ids == ["req-6", "req-4"]
+        assert store.query(function="other.handler") == []
+        summary = store.query(limit=1)[0]
+        assert "logs" not in summary
+        assert store.query(limit=1, logs=True)[0]["logs"]
+    finally:
+        store.stop()
+
+
+def test_running_is_not_spilled(tmp_path):
+    store = InvocationStore(tmp_path, capacity=1)
+    store.start()
+    try:
+        running = store.begin("req-running", "GET /a", "app.handler")
+        for i in range(3):
+            invoke(store, f"req-{i}", "GET /a")
+        store.join()
+        assert [r["request_id"] for r in store.query()] == \
+            ["req-running", "req-2", "req-1", "req-0"]
+        running.finish("ok")
+        store.join()
+        assert store.get("req-running")["status"] == "ok"
+        assert store.get("req-2")["status"] == "ok"  # spilled
+    finally:
+        store.stop()
+    spilled = [json.loads(file.read_text())["request_id"]
+               for file in sorted(tmp_path.glob("*.jsonl"))]
+    assert spilled == ["req-0", "req-1", "req-2"]
+
+
+def test_query_by_index(tmp_path, mocker):
+    store = InvocationStore(tmp_path, capacity=2, segments=10)
+    store.start()
+    try:
+        for i in range(6):
+            invoke(store, f"req-{i}", "GET /a", "a.handler")
+        invoke(store, "req-b", "GET /b", "b.handler")
+        for i in range(6, 8):
+            invoke(store, f"req-{i}", "GET /a", "a.handler")
+        store.join()
+        read = mocker.spy(store, "_read")
+        ids = [r["request_id"] for r in store.query(function="b.handler")]
+        assert ids == ["req-b"]
+        assert read.call_count == 1  # spilled ones of "/a" are not read
+        ids = [r["request_id"] for r in store.query(route="/b")]
+        assert ids == ["req-b"]
+    finally:
+        store.stop()
+    assert store.query(route="GET /a", limit=3)[0]["request_id"] == "req-7"
@@ -0,0 +1,56 @@
+import hashlib
+
+from sapimo.parser import loader
+from sapimo.parser.loader import load_cached, parse_template
+
+TEMPLATE = """
+Resources:
+  Table:
+    Type: AWS::DynamoDB::Table
+    Properties:
+      TableName: !Sub "${AWS::StackName}-table"
+      Arn: !GetAtt Table.Arn
+      Names: !Split [",", "a,b"]
+"""
+
+
+def test_parse_template():
+    props = parse_template(TEMPLATE)["Resources"]["Table"]["Properties"]
+    assert props == {"TableName": {"Fn::Sub": "${AWS::StackName}-table"},
+                     "Arn": {"Fn::GetAtt": ["Table", "Arn"]},
+                     "Names": {"Fn::Split": [",", "a,b"]}}
+    assert parse_template('{"Resources": {}}') == {"Resources": {}}
+
+
+def test_load_cached(tmp_path):
+    calls = []
+
+    def parse_counted(text):
+        calls.append(text)
+        return parse_template(text)
+
+    path = tmp_path / "template.yaml"
+    path.write_text(TEMPLATE)
+    cache_dir = tmp_path / "cache"
+    first, digest = load_cached(path, parse_counted, cache_dir)
+    assert digest == hashlib.md5(TEMPLATE.encode()).hexdigest()
+    first["Resources"].clear()  # not shared with next caller
+
+    second, _ = load_cached(path, parse_counted, cache_dir)
+    loader._memory.clear()  # e.g. next run: restored from file
+    third, _ = load_cached(path, parse_counted, cache_dir)
+    assert len(calls) == 1
+    assert second == third == parse_template(TEMPLATE)
+
+    path.write_text(TEMPLATE.replace("Table", "Other"))
+    changed, _ = load_cached(path, parse_counted, cache_dir)
+    assert len(calls) == 2
+    assert "Other" in changed["Resources"]
+
+
+def test_no_cache_outside_project(tmp_path):
+    path = tmp_path / "template.yaml"
+    path.write_text(TEMPLATE)
+    cache_dir = tmp_path / "api_mock" / ".cache"
+    assert load_cached(path, parse_template, cache_dir)[0]
+    assert not (tmp_path / "api_mock").exists()
@@ -0,0 +1,105 @@
+import json
+import logging
+import threading
+
+from sapimo.log_backend import LogBackend, LogSampler, log_context, truncate
+
+
+def read_records(backend: LogBackend) -> list[dict]:
+    backend.stop()  # flush
+    with open(backend.file_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_lines_with_context(tmp_path):
+    backend = LogBackend(tmp_path)
+    logger = logging.getLogger("test_json_lines_with_context")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    backend.attach(logger)
+    backend.attach(logger)
+    assert len(logger.handlers) == 1
+
+    logger.info("outside %s", 1)
+    with log_context(request_id="req-1", route="GET /a"):
+        thread = threading.Thread(target=logger.info, args=("other",))
+        thread.start()
+        thread.join()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    logger.handlers.clear()
+
+    outside, other, failed = read_records(backend)
+    assert outside["message"] == "outside 1"
+    assert "request_id" not in outside
+    assert "request_id" not in other  # new thread has no context
+    assert failed["request_id"] == "req-1"
+    assert failed["route"] == "GET /a"
+    assert "ValueError: boom" in failed["exc"]
+
+
+def test_lambda_logger(tmp_path, capsys):
+    backend = LogBackend(tmp_path)
+    logger = logging.getLogger("test_lambda_logger")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    backend.attach(logger, lambda_log=True)
+    logger.debug("debug log")  # console only (file is INFO)
+    logger.info("info log")
+    logger.handlers.clear()
+
+    records = read_records(backend)
+    assert [r["message"] for r in records] == ["info log"]
+    assert records[0]["lambda"] is True
+
+
+def test_lambda_root_logger(tmp_path):
+    backend = LogBackend(tmp_path)
+    root = logging.getLogger()
+    backend.attach(root, lambda_log=True)
+    try:
+        library = logging.getLogger("test_lambda_root_logger")
+        library.warning("outside of invocation")
+        with log_context(request_id="req-1"):
+            root.warning("lambda log")
+    finally:
+        root.removeHandler(backend._root_lambda_handler)
+
+    records = read_records(backend)
+    assert [r["message"] for r in records] == ["lambda log"]
+    assert records[0]["lambda"] is True
+
+
+def test_sampler():
+    sampler = LogSampler(0.25)
+    assert sum(sampler.sample() for _ in range(100)) == 25
+    assert all(LogSampler(1.0).sample() for _ in range(10))
+    assert not any(LogSampler(0).sample() for _ in range(10))
+
+
+def test_truncate():
+    assert truncate({"a": 1}, 100) == '{"a": 1}'
+    assert truncate("x" * 10, 4) == "xxxx...(truncated 10 chars)"
+    assert truncate("x" * 10, None) == "x" * 10
+
+
+def test_file_created_by_first_record(tmp_path):
+    backend = LogBackend(tmp_path / "first")
+    logger = logging.getLogger("test_file_created_by_first_record")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    backend.attach(logger)
+    assert backend.file_path is None
+    assert not (tmp_path / "first").exists()
+
+    logger.info("first")
+    backend.stop()
+    assert backend.file_path.parent == tmp_path / "first"
+
+    backend.start()
+    backend.set_log_dir(tmp_path / "second")
+    logger.info("second")
+    assert [r["message"] for r in read_records(backend)] == ["second"]
+    assert backend.file_path.parent == tmp_path / "second"
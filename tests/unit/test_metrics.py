@@ -0,0 +1,33 @@
+from sapimo.mock.metrics import Metrics
+
+
+def test_summary():
+    metrics = Metrics()
+    for i in range(1, 101):
+        metrics.observe("GET /hello", "handler", i / 1000)
+    metrics.observe("GET /hello", "event", 0.001)
+    res = metrics.to_dict()["routes"]["GET /hello"]
+    assert list(res.keys()) == ["event", "handler"]
+    assert res["handler"]["count"] == 100
+    assert res["handler"]["p50_ms"] == 50
+    assert res["handler"]["p95_ms"] == 95
+    assert res["handler"]["p99_ms"] == 99
+    assert res["handler"]["max_ms"] == 100
+
+
+def test_prometheus():
+    metrics = Metrics()
+    metrics.observe("GET /hello", "handler", 0.007)
+    metrics.observe("GET /hello", "handler", 3)
+    text = metrics.to_prometheus()
+    labels = 'route="GET /hello",phase="handler"'
+    assert f'sapimo_phase_duration_seconds_bucket{{{labels},le="0.005"}} 0' \
+        in text
+    assert f'sapimo_phase_duration_seconds_bucket{{{labels},le="0.01"}} 1' \
+        in text
+    assert f'sapimo_phase_duration_seconds_bucket{{{labels},le="+Inf"}} 2' \
+        in text
+    assert f"sapimo_phase_duration_seconds_count{{{labels}}} 2" in text
+
+    metrics.reset()
+    assert metrics.to_dict() == {"routes": {}}
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+import boto3
+import yaml
+
+from sapimo.mock.mock_manager import MockManager, S3Mock, DynamoMock
+
+
+@pytest.fixture
+def project(tmp_path, working_dir):
+    config = {
+        "paths": {},
+        "s3": {"test-bucket": {}},
+        "dynamodb": {"test-table": {
+            "TableName": "test-table",
+            "AttributeDefinitions": [
+                {"AttributeName": "pk", "AttributeType": "S"}],
+            "KeySchema": [{"AttributeName": "pk", "KeyType": "HASH"}],
+            "BillingMode": "PAY_PER_REQUEST"}}
+    }
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(yaml.dump(config))
+    (tmp_path / "s3/test-bucket").mkdir(parents=True)
+    (tmp_path / "s3/test-bucket/a.txt").write_text("a")
+    (tmp_path / "dynamodb/test-table").mkdir(parents=True)
+    (tmp_path / "dynamodb/test-table/data.json").write_text(
+        json.dumps([{"pk": "a"}]))
+    return config_file
+
+
+def run_and_stop(config_file, snapshot_file, action=None):
+    manager = MockManager(config_file)
+    manager.start()
+    manager.init_data(snapshot_file)
+    if action:
+        action()
+    manager.sync()
+    manager.flush()
+    manager.save_snapshot(snapshot_file)
+    manager.stop()
+
+
+def test_snapshot(project, tmp_path, mocker):
+    snapshot_file = tmp_path / "snapshot.pickle"
+
+    def put():
+        boto3.client("s3").put_object(Bucket="test-bucket", Key="b.txt",
+                                      Body=b"b")
+        boto3.resource("dynamodb").Table("test-table").put_item(
+            Item={"pk": "b"})
+    run_and_stop(project, snapshot_file, put)
+    assert snapshot_file.exists()
+
+    s3_init = mocker.spy(S3Mock, "init_data")
+    dynamo_init = mocker.spy(DynamoMock, "init_data")
+
+    def check():
+        keys = [o["Key"] for o in boto3.client("s3").list_objects_v2(
+            Bucket="test-bucket")["Contents"]]
+        assert keys == ["a.txt", "b.txt"]
+        items = boto3.resource("dynamodb").Table("test-table").scan()["Items"]
+        assert sorted(i["pk"] for i in items) == ["a", "b"]
+    run_and_stop(project, snapshot_file, check)
+    assert s3_init.call_count == 0
+    assert dynamo_init.call_count == 0
+
+    # changed fixture is loaded from local dir (onto the restored backend)
+    (tmp_path / "s3/test-bucket/c.txt").write_text("c")
+    upload = mocker.spy(S3Mock, "_upload_file")
+    run_and_stop(project, snapshot_file)
+    assert s3_init.call_count == 1
+    assert dynamo_init.call_count == 0
+    assert [c.args[2] for c in upload.call_args_list] == ["c.txt"]
@@ -0,0 +1,177 @@
+import asyncio
+import sys
+import time
+
+import boto3
+import pytest
+
+pytest.importorskip("moto.server")
+from sapimo.mock.executer.process_pool import \
+    ProcessPool, _use_endpoint  # noqa: E402
+from sapimo.mock.executer.invoke_info import InvokeInfo  # noqa: E402
+from sapimo.mock.executer.invocation_log import \
+    InvocationCapture, capture_invocation  # noqa: E402
+from sapimo.mock.executer.s3_trigger import request_chain  # noqa: E402
+from sapimo.mock.s3_journal import S3ChangeJournal  # noqa: E402
+from sapimo.exceptions import \
+    LambdaInvokeError, LambdaTimeoutError  # noqa: E402
+
+
+@pytest.fixture
+def functions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ["proc_fn_a", "proc_fn_b"]:
+        code = tmp_path / name
+        code.mkdir()
+        (code / "app.py").write_text(
+            "import os\n"
+            "import time\n"
+            "def handler(event, context):\n"
+            "    if event.get('fail'):\n"
+            "        raise ValueError('failed')\n"
+            "    time.sleep(event.get('sleep', 0))\n"
+            "    return [os.environ['NAME'], os.getpid()]\n")
+    yield {name: InvokeInfo({"Properties": {
+        "CodeUri": f"{name}/", "Handler": "app.handler",
+        "Timeout": 1, "Environment": {"Variables": {"NAME": name}}}})
+        for name in ["proc_fn_a", "proc_fn_b"]}
+    for name in [m for m in sys.modules if m.startswith("proc_fn")]:
+        del sys.modules[name]
+
+
+def invoke(pool, props, event=None):
+    async def _run():
+        res, report = await pool.run(props.function_key, props,
+                                     props.environ, event or {})
+        assert report.max_memory_used > 0
+        return res
+    return asyncio.run(_run())
+
+
+def test_isolated_env(functions):
+    pool = ProcessPool(workers_per_function=1)
+    try:
+        a, b = functions["proc_fn_a"], functions["proc_fn_b"]
+        name_a, pid_a = invoke(pool, a)
+        name_b, pid_b = invoke(pool, b)
+        assert (name_a, name_b) == ("proc_fn_a", "proc_fn_b")
+        assert pid_a != pid_b
+        assert invoke(pool, a)[1] == pid_a  # warm worker is reused
+
+        with pytest.raises(LambdaInvokeError):
+            invoke(pool, a, {"fail": True})
+
+        # worker is killed and restarted when timed out
+        with pytest.raises(LambdaTimeoutError):
+            invoke(pool, a, {"sleep": 3})
+        new_pid = invoke(pool, a)[1]
+        assert new_pid != pid_a
+        pid_a = new_pid
+
+        # worker is restarted when code is changed
+        assert pool.invalidate(["proc_fn_a/"]) == ["proc_fn_a.app"]
+        assert invoke(pool, a)[1] != pid_a
+        assert invoke(pool, b)[1] == pid_b
+    finally:
+        pool.stop()
+
+
+def test_chain_header(tmp_path, monkeypatch, aws_env):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    code = tmp_path / "proc_fn_s3"
+    code.mkdir()
+    (code / "app.py").write_text(
+        "import boto3\n"
+        "def handler(event, context):\n"
+        "    boto3.client('s3').put_object(\n"
+        "        Bucket='chain-bucket', Key='out.txt', Body=b'x')\n")
+    props = InvokeInfo({"Properties": {"CodeUri": "proc_fn_s3/",
+                                       "Handler": "app.handler"}})
+    environ = {"AWS_ACCESS_KEY_ID": "testing",
+               "AWS_SECRET_ACCESS_KEY": "testing",
+               "AWS_DEFAULT_REGION": "us-east-1"}
+    chains = []
+    journal = S3ChangeJournal()
+    journal.add_listener(lambda *_: chains.append(request_chain()))
+    journal.start()
+    pool = ProcessPool()
+    pool.start()
+    try:
+        boto3.client("s3", endpoint_url=pool.endpoint_url)\
+            .create_bucket(Bucket="chain-bucket")
+        # s3 write of triggered lambda on worker process carries its chain
+        asyncio.run(pool.run(props.function_key, props, environ, {},
+                             ("fn.app", "proc_fn_s3.app")))
+    finally:
+        pool.stop()
+        journal.stop()
+    assert chains == [("fn.app", "proc_fn_s3.app")]
+
+
+def test_worker_output_is_captured(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    code = tmp_path / "proc_fn_log"
+    code.mkdir()
+    (code / "app.py").write_text(
+        "import logging\n"
+        "logger = logging.getLogger()\n"
+        "logger.setLevel(logging.INFO)\n"
+        "def handler(event, context):\n"
+        "    print('hello')\n"
+        "    logger.info('info log')\n"
+        "    if event.get('fail'):\n"
+        "        raise ValueError('failed')\n")
+    props = InvokeInfo({"Properties": {"CodeUri": "proc_fn_log/",
+                                       "Handler": "app.handler"}})
+
+    async def run(capture, event):
+        with capture_invocation(capture):
+            await pool.run(props.function_key, props, {}, event)
+    pool = ProcessPool()
+    try:
+        capture = InvocationCapture("req-1", "GET /a", props.import_path)
+        asyncio.run(run(capture, {}))
+        assert "".join(capture.stdout) == "hello\n"
+        assert [r["message"] for r in capture.logs] == ["info log"]
+
+        capture = InvocationCapture("req-2", "GET /a", props.import_path)
+        with pytest.raises(LambdaInvokeError):
+            asyncio.run(run(capture, {"fail": True}))
+        assert "ValueError: failed" in capture.error
+    finally:
+        pool.stop()
+
+
+def test_wait_idle_worker_on_loop(functions):
+    # busy function doesn't hold dispatch threads of other functions
+    pool = ProcessPool(workers_per_function=1, size=2)
+    try:
+        a, b = functions["proc_fn_a"], functions["proc_fn_b"]
+        invoke(pool, a)
+        invoke(pool, b)
+        finished = {}
+
+        async def run(name, props, event):
+            await pool.run(props.function_key, props, props.environ, event)
+            finished[name] = time.perf_counter()
+
+        async def _run():
+            await asyncio.gather(*[run(f"a{i}", a, {"sleep": 0.5})
+                                   for i in range(3)], run("b", b, {}))
+        asyncio.run(_run())
+        assert finished["b"] < min(finished[f"a{i}"] for i in range(3))
+    finally:
+        pool.stop()
+
+
+def test_use_endpoint(monkeypatch, aws_env):
+    from botocore.session import Session
+    monkeypatch.setattr(Session, "create_client", Session.create_client)
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    _use_endpoint("http://127.0.0.1:5000")
+    assert boto3.client("s3").meta.endpoint_url == "http://127.0.0.1:5000"
+    assert boto3.client("s3", endpoint_url="http://other:1")\
+        .meta.endpoint_url == "http://other:1"
@@ -0,0 +1,30 @@
+import tracemalloc
+
+from sapimo.mock.executer.report import InvocationReport, MemoryTracer, MB
+
+
+def test_report_line():
+    report = InvocationReport("req-1", 0.0123, 128, 200 * MB, 0.5)
+    assert str(report) == \
+        "REPORT RequestId: req-1\tDuration: 12.30 ms\tBilled Duration: 13 ms"\
+        "\tMemory Size: 128 MB\tMax Memory Used: 200 MB"\
+        "\tInit Duration: 500.00 ms"
+    assert report.memory_exceeded
+    assert not InvocationReport("req-2", 0.0001, 128).memory_exceeded
+
+
+def test_memory_tracer():
+    tracer = MemoryTracer()
+    token = tracer.begin()
+    data = bytearray(4 * MB)
+    assert tracer.end(token) >= 4 * MB
+    assert not tracemalloc.is_tracing()
+
+    # peak is process wide: overlapped invocations are not reported
+    first = tracer.begin()
+    second = tracer.begin()
+    assert tracer.end(second) is None
+    assert tracemalloc.is_tracing()
+    assert tracer.end(first) is None
+    assert not tracemalloc.is_tracing()
+    del data
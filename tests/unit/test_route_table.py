@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+import yaml
+
+from sapimo.mock.executer.invoke_info import ApiInfo, ApiV2Info
+from sapimo.mock.executer.lambda_invoker import LambdaInvoker
+
+
+def api(event_type="APIGW", timeout=3, responses=None):
+    src = {"Properties": {"CodeUri": "hello/", "Handler": "app.handler",
+                          "EventType": event_type, "AuthType": "NONE",
+                          "Timeout": timeout}}
+    if responses:
+        src["responses"] = responses
+    return src
+
+
+class FakeRoute:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeRequest:
+    def __init__(self, path, method):
+        self.scope = {"route": FakeRoute(path)}
+        self.method = method
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    def _config_file(paths: dict):
+        path = tmp_path / "config.yaml"
+        path.write_text(yaml.safe_dump({"paths": paths,
+                                        "settings": {"WatchCode": False}}))
+        return path
+    return _config_file
+
+
+def test_compiled_once(config_file):
+    invoker = LambdaInvoker(config_file({
+        "/hello": {"GET": api(), "POST": api("APIGW_V2")}}))
+    get = invoker._get_api_info(FakeRequest("/hello", "GET"))
+    post = invoker._get_api_info(FakeRequest("/hello", "POST"))
+    assert type(get) is ApiInfo and type(post) is ApiV2Info
+    assert get is invoker._get_api_info(FakeRequest("/hello", "GET"))
+    assert get.route == "GET /hello"
+    assert not hasattr(get, "__dict__")
+    assert invoker._get_api_info(FakeRequest("/hello", "PUT")) is None
+
+
+def test_reload(config_file):
+    path = config_file({"/hello": {"GET": api(timeout=3)}})
+    invoker = LambdaInvoker(path)
+    old = invoker._get_api_info(FakeRequest("/hello", "GET"))
+    config_file({"/hello": {"GET": api(timeout=10)}})
+    invoker.reload()
+    new = invoker._get_api_info(FakeRequest("/hello", "GET"))
+    assert new is not old
+    assert (old.timeout, new.timeout) == (3, 10)
+
+
+class FakeProcesses:
+    def __init__(self):
+        self.discarded = []
+
+    def discard(self, keys):
+        self.discarded += keys
+        return []
+
+
+def test_reload_config_and_workers(config_file):
+    path = config_file({"/a": {"GET": api(timeout=3)},
+                        "/b": {"GET": dict(api(), Properties=dict(
+                            api()["Properties"], CodeUri="other/"))}})
+    invoker = LambdaInvoker(path)
+    config = invoker._config
+    invoker._processes = FakeProcesses()
+    key_a = invoker._env_key(invoker._get_api_info(FakeRequest("/a", "GET")))
+    config_file({"/a": {"GET": api(timeout=10)},
+                 "/b": {"GET": dict(api(), Properties=dict(
+                     api()["Properties"], CodeUri="other/"))}})
+    invoker.reload()
+    # config shared with MockManager is not changed
+    assert config.apis["/a"]["get"]["Properties"]["Timeout"] == 3
+    assert invoker._config is not config
+    assert invoker._processes.discarded == [key_a]  # only changed one
+
+
+def test_example(config_file):
+    invoker = LambdaInvoker(config_file({"/hello": {"GET": api(responses={
+        200: {"content": {"application/json": {"example": {"a": 1}}}},
+        404: {"description": "not found"}})}}))
+    req = FakeRequest("/hello", "GET")
+    res = asyncio.run(invoker.get_example(req, 200))
+    assert (res.status_code, json.loads(res.body)) == (200, {"a": 1})
+    res = asyncio.run(invoker.get_example(req, 404))
+    assert (res.status_code, json.loads(res.body)) == (404, {})
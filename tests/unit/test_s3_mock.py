@@ -0,0 +1,150 @@
+import pytest
+import boto3
+
+from sapimo.mock.mock_manager import S3Mock
+
+
+@pytest.fixture
+def s3_mock(aws_mock):
+    def _s3_mock(files: dict, settings=None):
+        return aws_mock(S3Mock, files, {"test-bucket": {}}, settings or {})
+    return _s3_mock
+
+
+@pytest.mark.parametrize("mode", ["journal", "scan"])
+def test_sync_no_change(s3_mock, mode):
+    mock = s3_mock({"test-bucket/a.txt": b"a"}, {"S3SyncMode": mode})
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+
+
+@pytest.mark.parametrize("mode", ["journal", "scan"])
+def test_sync_put_and_delete(s3_mock, tmp_path, mode):
+    mock = s3_mock({"test-bucket/a.txt": b"a",
+                    "test-bucket/dir/b.txt": b"b"}, {"S3SyncMode": mode})
+    client = boto3.client("s3")
+    client.put_object(Bucket="test-bucket", Key="new/c.txt", Body=b"c")
+    client.put_object(Bucket="test-bucket", Key="a.txt", Body=b"a")  # same
+    client.delete_object(Bucket="test-bucket", Key="dir/b.txt")
+
+    assert mock.sync() == {"updated": {"test-bucket": ["new/c.txt"]},
+                           "deleted": {"test-bucket": ["dir/b.txt"]}}
+    assert (tmp_path / "s3/test-bucket/new/c.txt").read_bytes() == b"c"
+    assert not (tmp_path / "s3/test-bucket/dir/b.txt").exists()
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+
+
+def test_journal_copy_and_new_bucket(s3_mock, tmp_path):
+    mock = s3_mock({"test-bucket/a.txt": b"a"})
+    client = boto3.client("s3")
+    client.create_bucket(Bucket="other-bucket")
+    client.copy_object(Bucket="other-bucket", Key="copied.txt",
+                       CopySource={"Bucket": "test-bucket", "Key": "a.txt"})
+
+    assert mock.sync() == {"updated": {"other-bucket": ["copied.txt"]},
+                           "deleted": {}}
+    assert (tmp_path / "s3/other-bucket/copied.txt").read_bytes() == b"a"
+
+
+def test_scan_downloads_only_changed(s3_mock, mocker):
+    mock = s3_mock({"test-bucket/a.txt": b"a", "test-bucket/b.txt": b"b"},
+                   {"S3SyncMode": "scan"})
+    boto3.client("s3").put_object(Bucket="test-bucket", Key="b.txt",
+                                  Body=b"bb")
+    get_object = mocker.spy(mock._client, "get_object")
+
+    assert mock.sync() == {"updated": {"test-bucket": ["b.txt"]},
+                           "deleted": {}}
+    assert get_object.call_count == 1
+    mock.sync()
+    assert get_object.call_count == 1
+
+
+def test_seed_multipart(s3_mock, tmp_path):
+    size = 5 * 1024 * 1024
+    data = b"0123456789" * (size // 10) + b"tail"
+    mock = s3_mock({"test-bucket/big.bin": data, "test-bucket/a.txt": b"a"},
+                   {"S3MultipartThreshold": size,
+                    "S3MultipartChunksize": size})
+    client = boto3.client("s3")
+    assert client.get_object(Bucket="test-bucket",
+                             Key="big.bin")["Body"].read() == data
+    # locally calculated ETag is same as backend's one
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+    mock._sync_mode = "scan"
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+
+
+def test_manifest(s3_mock, tmp_path):
+    mock = s3_mock({"test-bucket/a.txt": b"a"})
+    assert not mock.fixtures_changed()
+    boto3.client("s3").put_object(Bucket="test-bucket", Key="b.txt",
+                                  Body=b"b")
+    mock.sync()
+    assert not mock.fixtures_changed()  # synced file is in manifest
+    mock.flush()
+
+    restarted = S3Mock({"test-bucket": {}}, {})
+    assert set(restarted._manifest.keys()) == {"test-bucket/a.txt",
+                                               "test-bucket/b.txt"}
+    (tmp_path / "s3/test-bucket/c.txt").write_bytes(b"c")
+    assert restarted.fixtures_changed()
+
+
+def test_event_names(s3_mock):
+    mock = s3_mock({"test-bucket/a.txt": b"a"})
+    events = []
+    mock.add_listener(lambda name, bucket, key, _: events.append((name, key)))
+    client = boto3.client("s3")
+    client.put_object(Bucket="test-bucket", Key="b.txt", Body=b"b")
+    client.copy_object(Bucket="test-bucket", Key="c.txt",
+                       CopySource={"Bucket": "test-bucket", "Key": "a.txt"})
+    upload = client.create_multipart_upload(Bucket="test-bucket", Key="d.txt")
+    part = client.upload_part(Bucket="test-bucket", Key="d.txt", PartNumber=1,
+                              UploadId=upload["UploadId"], Body=b"d")
+    client.complete_multipart_upload(
+        Bucket="test-bucket", Key="d.txt", UploadId=upload["UploadId"],
+        MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": part["ETag"]}]})
+    client.delete_object(Bucket="test-bucket", Key="b.txt")
+    assert events == [("ObjectCreated:Put", "b.txt"),
+                      ("ObjectCreated:Copy", "c.txt"),
+                      ("ObjectCreated:CompleteMultipartUpload", "d.txt"),
+                      ("ObjectRemoved:Delete", "b.txt")]
+
+
+def test_init_data_reads_only_changed(s3_mock, tmp_path, mocker):
+    mock = s3_mock({"test-bucket/a.txt": b"a", "test-bucket/b.txt": b"b"})
+    (tmp_path / "s3/test-bucket/b.txt").write_bytes(b"bb")
+    (tmp_path / "s3/test-bucket/c.txt").write_bytes(b"c")
+    upload = mocker.spy(mock, "_upload_file")
+    mock.init_data()
+    assert sorted(c.args[1] for c in upload.call_args_list) == ["b.txt",
+                                                                "c.txt"]
+    assert not mock.fixtures_changed()
+    assert set(mock._index["test-bucket"]) == {"a.txt", "b.txt", "c.txt"}
+
+    (tmp_path / "s3/test-bucket/a.txt").unlink()
+    mock.init_data()
+    keys = [o["Key"] for o in boto3.client("s3").list_objects_v2(
+        Bucket="test-bucket")["Contents"]]
+    assert keys == ["b.txt", "c.txt"]
+
+
+def test_journal_kept_on_failure(s3_mock, tmp_path, mocker):
+    mock = s3_mock({"test-bucket/a.txt": b"a"})
+    client = boto3.client("s3")
+    client.put_object(Bucket="test-bucket", Key="b.txt", Body=b"b")
+    client.put_object(Bucket="test-bucket", Key="c.txt", Body=b"c")
+    write_local = mock._write_local
+
+    def fail_c(bucket_path, key, *args):
+        if key == "c.txt":
+            raise OSError("disk full")
+        write_local(bucket_path, key, *args)
+    mocker.patch.object(mock, "_write_local", side_effect=fail_c)
+    with pytest.raises(OSError):
+        mock.sync()
+
+    mocker.patch.object(mock, "_write_local", side_effect=write_local)
+    assert mock.sync() == {"updated": {"test-bucket": ["c.txt"]},
+                           "deleted": {}}
+    assert (tmp_path / "s3/test-bucket/c.txt").read_bytes() == b"c"
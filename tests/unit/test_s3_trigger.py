@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from urllib.parse import unquote_plus
+
+from sapimo.mock.executer.invoke_info import S3TriggerInfo
+from sapimo.mock.executer.s3_trigger import \
+    S3TriggerDispatcher, build_s3_event, trigger_chain
+
+PROPS = {"CodeUri": "fn/", "Handler": "app.handler"}
+
+
+def trigger(events=None, prefix=None, suffix=None, code_uri="fn/"):
+    src = {"Properties": dict(PROPS, CodeUri=code_uri)}
+    if events:
+        src["Events"] = events
+    rules = []
+    if prefix:
+        rules.append({"Name": "prefix", "Value": prefix})
+    if suffix:
+        rules.append({"Name": "suffix", "Value": suffix})
+    if rules:
+        src["Filter"] = {"S3Key": {"Rules": rules}}
+    return src
+
+
+def test_match():
+    info = S3TriggerInfo("bucket", trigger("s3:ObjectCreated:*",
+                                           prefix="in/", suffix=".csv"))
+    assert info.match("ObjectCreated:Put", "in/a.csv")
+    assert not info.match("ObjectCreated:Put", "out/a.csv")
+    assert not info.match("ObjectCreated:Put", "in/a.txt")
+    assert not info.match("ObjectRemoved:Delete", "in/a.csv")
+    removed = S3TriggerInfo("bucket", trigger(["s3:ObjectRemoved:Delete"]))
+    assert removed.match("ObjectRemoved:Delete", "a.txt")
+
+
+def test_build_event():
+    event = build_s3_event("ObjectCreated:Put", "bucket", "in/a b.csv",
+                           10, '"abc"')
+    record = event["Records"][0]
+    assert record["eventName"] == "ObjectCreated:Put"
+    assert record["s3"]["bucket"]["arn"] == "arn:aws:s3:::bucket"
+    assert record["s3"]["object"]["key"] == "in%2Fa+b.csv"
+    assert record["s3"]["object"]["size"] == 10
+    assert record["s3"]["object"]["eTag"] == "abc"
+    deleted = build_s3_event("ObjectRemoved:Delete", "bucket", "a")
+    assert "size" not in deleted["Records"][0]["s3"]["object"]
+
+
+def test_dispatch_and_loop_detection():
+    invoked = []
+
+    async def invoke(props, event, chain):
+        invoked.append((props.import_path, chain))
+        key = unquote_plus(event["Records"][0]["s3"]["object"]["key"])
+
+        # triggered lambda writes an object to the same bucket (loop)
+        def write():
+            with trigger_chain(chain):
+                dispatcher.notify("ObjectCreated:Put", "bucket", key + "x")
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+
+    dispatcher = S3TriggerDispatcher(
+        {"bucket": [trigger(prefix="in/", code_uri="fn/"),
+                    trigger(prefix="other/", code_uri="other/")]},
+        invoke, max_depth=3)
+
+    async def run():
+        dispatcher.start()
+        dispatcher.notify("ObjectCreated:Put", "bucket", "in/a")
+        dispatcher.notify("ObjectCreated:Put", "unknown", "in/a")
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            await dispatcher.join()
+        assert not dispatcher.busy()
+        dispatcher.stop()
+    asyncio.run(run())
+    assert invoked == [("fn.app", ("fn.app",)),
+                       ("fn.app", ("fn.app", "fn.app")),
+                       ("fn.app", ("fn.app", "fn.app", "fn.app"))]
@@ -0,0 +1,73 @@
+import json
+
+from sapimo.parser import source_index
+from sapimo.parser.cdk_parser import CdkCfParser
+from sapimo.parser.source_index import SourceIndex
+
+HANDLER = "def handler(event, context):\n    return {'statusCode': 200}\n"
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def create_repo(root):
+    write(root / "cdk.out" / "asset.abc" / "app.py", HANDLER)
+    write(root / "cdk.out" / "template.json", json.dumps({"Resources": {}}))
+    write(root / "src" / "fn" / "app.py", HANDLER)
+    # same content but skipped
+    write(root / "node_modules" / "pkg" / "app.py", HANDLER)
+    write(root / "generated" / "app.py", HANDLER)
+    write(root / "vendor" / "app.py", HANDLER)
+    write(root / ".gitignore", "# comment\n/generated\n")
+    write(root / "src" / ".gitignore", "*.txt\n")
+    # same size, other content
+    write(root / "src" / "other" / "app.py", HANDLER.replace("200", "201"))
+    write(root / "src" / "fn" / "notes.txt", HANDLER)
+
+
+def test_find(tmp_path):
+    create_repo(tmp_path)
+    cache_file = tmp_path / "cache.json"
+    asset = tmp_path / "cdk.out" / "asset.abc" / "app.py"
+    index = SourceIndex(tmp_path, excludes=["vendor"],
+                        skip_dirs=[tmp_path / "cdk.out"],
+                        cache_file=cache_file)
+    assert index.find(asset) == "src/fn/app.py"
+    files = [path for group in index._files.values() for _, path in group]
+    assert sorted(files) == ["src/fn/app.py", "src/other/app.py"]
+
+    # restored from cache (file is not read again)
+    hashed = []
+    md5 = source_index._md5
+    source_index._md5 = lambda path: hashed.append(path) or md5(path)
+    try:
+        index = SourceIndex(tmp_path, excludes=["vendor"],
+                            cache_file=cache_file)
+        assert index.find(asset) == "src/fn/app.py"
+        assert hashed == [str(asset)]
+    finally:
+        source_index._md5 = md5
+
+    write(tmp_path / "cdk.out" / "asset.abc" / "app.py", "x = 1\n")
+    assert index.find(asset) is None
+
+
+def test_cdk_code_uri(tmp_path, cache_dir):
+    create_repo(tmp_path)
+    parser = CdkCfParser(tmp_path / "cdk.out" / "template.json",
+                         excludes=["vendor"])
+    assert parser._search_code_uri("asset.abc", "app") == "src/fn"
+    assert parser._search_code_uri("asset.abc", "") == "src/fn"
+    assert (cache_dir / source_index.CACHE_FILE).exists()
+
+
+def test_generic_names_excluded_at_root(tmp_path):
+    for path in ["build", "dist", "env", "src/build", "src/env", "src/dist"]:
+        write(tmp_path / path / "app.py", HANDLER)
+    index = SourceIndex(tmp_path, cache_file=tmp_path / "cache.json")
+    index._list()
+    files = [path for group in index._files.values() for _, path in group]
+    assert sorted(files) == ["src/build/app.py", "src/dist/app.py",
+                             "src/env/app.py"]
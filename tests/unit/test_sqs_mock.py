@@ -0,0 +1,90 @@
+import json
+
+import pytest
+import boto3
+
+from sapimo.mock.mock_manager import SqsMock
+
+
+@pytest.fixture
+def sqs_mock(aws_mock):
+    def _sqs_mock(files: dict):
+        return aws_mock(SqsMock, files, {"test-queue": {}})
+    return _sqs_mock
+
+
+def bodies(tmp_path) -> list[str]:
+    """ bodies of local files in queue order (sqs_index.json) """
+    with open(tmp_path / "sqs_index.json") as f:
+        names = list(json.load(f)["queues"]["test-queue"].values())
+    queue_path = tmp_path / "sqs/test-queue"
+    assert sorted(names) == sorted(f.name for f in queue_path.iterdir())
+    return [(queue_path / name).read_text() for name in names]
+
+
+def test_seed_keeps_files(sqs_mock, tmp_path):
+    mock = sqs_mock({"test-queue/0000.txt": "a", "test-queue/0001.txt": "b"})
+    assert bodies(tmp_path) == ["a", "b"]
+    assert sorted(f.name for f in (tmp_path / "sqs/test-queue").iterdir())\
+        == ["0000.txt", "0001.txt"]  # fixtures are not renamed
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+
+    url = boto3.client("sqs").get_queue_url(QueueName="test-queue")
+    res = boto3.client("sqs").receive_message(QueueUrl=url["QueueUrl"],
+                                              MaxNumberOfMessages=10)
+    assert [m["Body"] for m in res["Messages"]] == ["a", "b"]
+
+
+def test_sync_all_messages(sqs_mock, tmp_path):
+    mock = sqs_mock({})
+    client = boto3.client("sqs")
+    url = client.get_queue_url(QueueName="test-queue")["QueueUrl"]
+    for i in range(25):
+        client.send_message(QueueUrl=url, MessageBody=f"m{i:02d}")
+    # in-flight message is mirrored and stays invisible
+    received = client.receive_message(QueueUrl=url, VisibilityTimeout=60)
+    received = received["Messages"][0]
+
+    changed = mock.sync()
+    assert len(changed["updated"]["test-queue"]) == 25
+    assert bodies(tmp_path) == [f"m{i:02d}" for i in range(25)]
+    res = client.receive_message(QueueUrl=url, MaxNumberOfMessages=10)
+    assert received["MessageId"] not in [m["MessageId"]
+                                         for m in res["Messages"]]
+
+
+def test_sync_writes_only_changes(sqs_mock, tmp_path):
+    mock = sqs_mock({"test-queue/0000.txt": "a", "test-queue/0001.txt": "b"})
+    client = boto3.client("sqs")
+    url = client.get_queue_url(QueueName="test-queue")["QueueUrl"]
+    first = client.receive_message(QueueUrl=url)["Messages"][0]
+    client.delete_message(QueueUrl=url, ReceiptHandle=first["ReceiptHandle"])
+    sent = client.send_message(QueueUrl=url, MessageBody="c")
+
+    queue_path = tmp_path / "sqs/test-queue"
+    kept = sorted(queue_path.iterdir())[1]
+    kept.touch()
+    mtime = kept.stat().st_mtime_ns
+    assert mock.sync() == {"updated": {"test-queue": [sent["MessageId"]]},
+                           "deleted": {"test-queue": [first["MessageId"]]}}
+    assert kept.stat().st_mtime_ns == mtime
+    assert bodies(tmp_path) == ["b", "c"]
+    assert mock.sync() == {"updated": {}, "deleted": {}}
+
+
+def test_delayed_message_and_restart(sqs_mock, tmp_path):
+    mock = sqs_mock({"test-queue/b.txt": "b"})
+    client = boto3.client("sqs")
+    url = client.get_queue_url(QueueName="test-queue")["QueueUrl"]
+    client.send_message(QueueUrl=url, MessageBody="a", DelaySeconds=60)
+    assert len(mock.sync()["updated"]["test-queue"]) == 1
+    assert bodies(tmp_path) == ["b", "a"]
+    mock.stop()
+
+    # sent in the order of the index (not in name order)
+    mock.start()
+    mock.init_data()
+    url = client.get_queue_url(QueueName="test-queue")["QueueUrl"]
+    res = client.receive_message(QueueUrl=url, MaxNumberOfMessages=10)
+    assert [m["Body"] for m in res["Messages"]] == ["b", "a"]
+    assert mock.sync() == {"updated": {}, "deleted": {}}
@@ -0,0 +1,100 @@
+import asyncio
+
+import boto3
+import pytest
+from moto import mock_sqs
+
+from sapimo.mock.executer.invoke_info import SqsTriggerInfo
+from sapimo.mock.executer.sqs_poller import SqsPoller
+
+PROPS = {"CodeUri": "fn/", "Handler": "app.handler"}
+
+
+@pytest.fixture
+def queue(aws_env):
+    with mock_sqs():
+        client = boto3.client("sqs")
+        url = client.create_queue(QueueName="test-queue")["QueueUrl"]
+        for i in range(15):
+            client.send_message(
+                QueueUrl=url, MessageBody=f"m{i}",
+                MessageAttributes={"n": {"DataType": "Number",
+                                         "StringValue": str(i)}})
+        yield client, url
+
+
+def run_poller(poller, seconds=0.5):
+    async def _run():
+        poller.start()
+        await asyncio.sleep(seconds)
+        poller.stop()
+    asyncio.run(_run())
+
+
+def test_batch_and_partial_failure(queue):
+    client, url = queue
+    batches = []
+
+    async def invoke(props, event):
+        records = event["Records"]
+        batches.append([r["body"] for r in records])
+        assert records[0]["eventSource"] == "aws:sqs"
+        assert records[0]["eventSourceARN"].endswith(":test-queue")
+        assert records[0]["messageAttributes"]["n"]["dataType"] == "Number"
+        return {"batchItemFailures": [{"itemIdentifier": r["messageId"]}
+                                      for r in records if r["body"] == "m3"]}
+
+    props = SqsTriggerInfo("test-queue", {
+        "BatchSize": 4, "FunctionResponseTypes": ["ReportBatchItemFailures"],
+        "ScalingConfig": {"MaximumConcurrency": 1}, "Properties": PROPS})
+    run_poller(SqsPoller(props, invoke, poll_interval=0.05))
+    assert [len(b) for b in batches] == [4, 4, 4, 3]
+    assert sorted(sum(batches, []), key=lambda b: int(b[1:])) == \
+        [f"m{i}" for i in range(15)]
+
+    # failed message is kept (invisible until visibility timeout)
+    attrs = client.get_queue_attributes(QueueUrl=url,
+                                        AttributeNames=["All"])["Attributes"]
+    assert attrs["ApproximateNumberOfMessages"] == "0"
+    assert attrs["ApproximateNumberOfMessagesNotVisible"] == "1"
+
+
+def test_failure_keeps_batch(queue):
+    client, url = queue
+
+    async def invoke(props, event):
+        raise Exception("error")
+
+    props = SqsTriggerInfo("test-queue", {"BatchSize": 10,
+                                          "Properties": PROPS})
+    run_poller(SqsPoller(props, invoke, poll_interval=0.05), 0.3)
+    attrs = client.get_queue_attributes(QueueUrl=url,
+                                        AttributeNames=["All"])["Attributes"]
+    assert attrs["ApproximateNumberOfMessagesNotVisible"] == "15"
+
+
+def test_busy(queue):
+    client, url = queue
+    processed = []
+
+    async def invoke(props, event):
+        await asyncio.sleep(0.01)
+        processed.extend(r["body"] for r in event["Records"])
+
+    # one poller (receive_message of moto is not thread safe)
+    props = SqsTriggerInfo("test-queue", {
+        "BatchSize": 5, "ScalingConfig": {"MaximumConcurrency": 1},
+        "Properties": PROPS})
+    poller = SqsPoller(props, invoke, poll_interval=0.05)
+
+    async def _run():
+        assert not await poller.busy()  # not started
+        poller.start()
+        while not poller._url:
+            await asyncio.sleep(0.01)
+        assert await poller.busy()
+        while await poller.busy():
+            await asyncio.sleep(0.01)
+        poller.stop()
+    asyncio.run(_run())
+    assert len(processed) == 15
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from sapimo.mock.sync_scheduler import SyncScheduler
+
+
+class FakeManager:
+    service_names = ["s3"]
+
+    def __init__(self):
+        self.count = 0
+
+    def sync(self):
+        self.count += 1
+
+    def get_change(self, service):
+        return {"updated": {"bucket": [f"key{self.count}"]}}
+
+
+def test_coalesce():
+    manager = FakeManager()
+    changes = []
+    scheduler = SyncScheduler(manager, debounce=0.1, max_staleness=5)
+    scheduler.add_listener(changes.append)
+    scheduler.start()
+    try:
+        for _ in range(5):
+            scheduler.request()
+            time.sleep(0.02)
+        time.sleep(0.3)
+        assert manager.count == 1
+        assert changes == [{"s3": {"updated": {"bucket": ["key1"]}}}]
+    finally:
+        scheduler.stop()
+
+
+def test_max_staleness():
+    manager = FakeManager()
+    scheduler = SyncScheduler(manager, debounce=0.1, max_staleness=0.25)
+    scheduler.start()
+    try:
+        # requests keep coming, but sync is not postponed forever
+        for _ in range(20):
+            scheduler.request()
+            time.sleep(0.05)
+        assert manager.count >= 2
+    finally:
+        scheduler.stop()
+
+
+def test_flush():
+    manager = FakeManager()
+    scheduler = SyncScheduler(manager, debounce=10, max_staleness=10)
+    scheduler.start()
+    try:
+        scheduler.request()
+        assert scheduler.flush() == {"s3": {"updated": {"bucket": ["key1"]}}}
+        time.sleep(0.1)
+        assert manager.count == 1  # pending request is consumed by flush
+    finally:
+        scheduler.stop()
+
+
+class FailingManager(FakeManager):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def sync(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super().sync()
+
+
+def test_retry_after_failure():
+    manager = FailingManager(failures=1)
+    scheduler = SyncScheduler(manager, debounce=0.05, max_staleness=0.2)
+    scheduler.start()
+    try:
+        scheduler.request()
+        time.sleep(0.5)
+        assert manager.failures == 0
+        assert manager.count == 1  # retried without a new request
+    finally:
+        scheduler.stop()
+
+
+def test_flush_raises_failure():
+    manager = FailingManager(failures=1)
+    scheduler = SyncScheduler(manager, debounce=10, max_staleness=10)
+    with pytest.raises(OSError):
+        scheduler.flush()
+    assert scheduler.flush() == {"s3": {"updated": {"bucket": ["key1"]}}}
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from sapimo.mock.executer.worker_pool import WorkerPool
+from sapimo.exceptions import LambdaTimeoutError, PoolSaturatedError
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = set()
+        self.overlapped = set()
+        self.entered = []
+
+    @contextmanager
+    def context(self, key):
+        self.entered.append(key)
+        yield
+
+    def work(self, key):
+        with self.lock:
+            if self.active - {key}:
+                self.overlapped.add(key)
+            self.active.add(key)
+        time.sleep(0.1)
+        with self.lock:
+            self.active.discard(key)
+        return key
+
+
+def run_all(pool, recorder, keys):
+    async def _run():
+        return await asyncio.gather(*[
+            pool.run(key, lambda key=key: recorder.context(key),
+                     recorder.work, key)
+            for key in keys])
+    return asyncio.run(_run())
+
+
+def test_same_env_runs_concurrently():
+    pool = WorkerPool(size=4)
+    recorder = Recorder()
+    started = time.perf_counter()
+    assert run_all(pool, recorder, ["a"] * 4) == ["a"] * 4
+    assert time.perf_counter() - started < 0.3
+    assert recorder.entered == ["a"]  # env is set only once
+    pool.shutdown()
+
+
+def test_different_env_is_not_mixed():
+    pool = WorkerPool(size=4)
+    recorder = Recorder()
+    run_all(pool, recorder, ["a", "b", "a", "b"])
+    assert not recorder.overlapped
+    pool.shutdown()
+
+
+def test_saturated():
+    pool = WorkerPool(size=1, max_pending=1)
+    recorder = Recorder()
+    with pytest.raises(PoolSaturatedError):
+        run_all(pool, recorder, ["a"] * 3)
+    pool.shutdown()
+
+
+def test_timeout():
+    pool = WorkerPool(size=2)
+    recorder = Recorder()
+
+    async def _run():
+        return await pool.run("a", lambda: recorder.context("a"),
+                              time.sleep, 0.3, timeout=0.1)
+    with pytest.raises(LambdaTimeoutError):
+        asyncio.run(_run())
+    pool.shutdown()
+
+
+def test_timed_out_thread_releases_env():
+    pool = WorkerPool(size=4)
+    recorder = Recorder()
+
+    async def _run():
+        slow = pool.run("a", lambda: recorder.context("a"),
+                        time.sleep, 2, timeout=0.2)
+        fast = pool.run("b", lambda: recorder.context("b"),
+                        recorder.work, "b", timeout=1.0)
+        return await asyncio.gather(slow, fast, return_exceptions=True)
+    started = time.perf_counter()
+    slow, fast = asyncio.run(_run())
+    assert isinstance(slow, LambdaTimeoutError)
+    assert fast == "b"
+    assert time.perf_counter() - started < 1.0
+    pool.shutdown()
+
+
+def test_gate_wait_is_counted_as_timeout():
+    pool = WorkerPool(size=1)
+    recorder = Recorder()
+
+    async def _run():
+        first = pool.run("a", lambda: recorder.context("a"),
+                         recorder.work, "a")
+        second = pool.run("b", lambda: recorder.context("b"),
+                          recorder.work, "b", timeout=0.05)
+        return await asyncio.gather(first, second, return_exceptions=True)
+    first, second = asyncio.run(_run())
+    assert first == "a"
+    assert isinstance(second, LambdaTimeoutError)
+    assert recorder.entered == ["a"]  # "b" is not run after its timeout
+    pool.shutdown()